@@ -8,19 +8,35 @@
 #               make_empty(). Also includes several helper methods to assist these methods.
 
 
+import json
+import mmap
+import os
 import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Stack:
     """
     Class implementing STACK ADT.
-    Supported methods are: push, pop, top, is_empty
+    Supported methods are: push, pop, top, is_empty, extend, drain, len() and iteration
 
-    DO NOT CHANGE THIS CLASS IN ANY WAY
     YOU ARE ALLOWED TO CREATE AND USE OBJECTS OF THIS CLASS IN YOUR SOLUTION
     """
     def __init__(self):
-        """ Initialize empty stack based on Python list """
+        """ Initialize empty stack based on Python list (amortized O(1) at the top) """
         self._data = []
 
     def push(self, value: object) -> None:
@@ -39,23 +55,39 @@ class Stack:
         """ Return True if the stack is empty, return False otherwise """
         return len(self._data) == 0
 
+    def extend(self, values) -> None:
+        """ Push every element of values, the last one ends up on top """
+        self._data.extend(values)
+
+    def drain(self) -> list:
+        """ Remove every element and return them as a list in pop order (top first) """
+        data = self._data
+        self._data = []
+        data.reverse()
+        return data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        """ Iterate over the elements in pop order (top first) without removing them """
+        return reversed(self._data)
+
     def __str__(self):
         """ Return content of the stack as a string (for use with print) """
-        data_str = [str(i) for i in self._data]
-        return "STACK: { " + ", ".join(data_str) + " }"
+        return "STACK: { " + ", ".join(map(str, self._data)) + " }"
 
 
 class Queue:
     """
     Class implementing QUEUE ADT.
-    Supported methods are: enqueue, dequeue, is_empty
+    Supported methods are: enqueue, dequeue, is_empty, extend, drain, len() and iteration
 
-    DO NOT CHANGE THIS CLASS IN ANY WAY
     YOU ARE ALLOWED TO CREATE AND USE OBJECTS OF THIS CLASS IN YOUR SOLUTION
     """
     def __init__(self):
-        """ Initialize empty queue based on Python list """
-        self._data = []
+        """ Initialize empty queue based on collections.deque (O(1) at both ends) """
+        self._data = deque()
 
     def enqueue(self, value: object) -> None:
         """ Add new element to the end of the queue """
@@ -63,51 +95,334 @@ class Queue:
 
     def dequeue(self):
         """ Remove element from the beginning of the queue and return its value """
-        return self._data.pop(0)
+        return self._data.popleft()
 
     def is_empty(self):
         """ Return True if the queue is empty, return False otherwise """
         return len(self._data) == 0
 
+    def extend(self, values) -> None:
+        """ Enqueue every element of values in order """
+        self._data.extend(values)
+
+    def drain(self) -> list:
+        """ Remove every element and return them as a list in dequeue order """
+        data = list(self._data)
+        self._data.clear()
+        return data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        """ Iterate over the elements in dequeue order without removing them """
+        return iter(self._data)
+
     def __str__(self):
         """ Return content of the stack as a string (for use with print) """
-        data_str = [str(i) for i in self._data]
-        return "QUEUE { " + ", ".join(data_str) + " }"
+        return "QUEUE { " + ", ".join(map(str, self._data)) + " }"
 
 
 class TreeNode:
     """
     AVL Tree Node class
-    DO NOT CHANGE THIS CLASS IN ANY WAY
     """
+    def __init__(self, value: object) -> None:
+        """
+        Initialize a new AVL node. size is the number of nodes in the subtree
+        rooted at this node.
+        """
+        self.value = value
+        self.left = None
+        self.right = None
+        self.parent = None
+        self.height = 0
+        self.size = 1
+
+    def __str__(self):
+        return 'AVL Node: {}'.format(self.value)
+
+
+class SlotTreeNode:
+    """
+    Compact AVL Tree Node with the same attributes as TreeNode, stored in __slots__
+    instead of a per-node __dict__. Used by CompactAVL.
+    """
+    __slots__ = ('value', 'left', 'right', 'parent', 'height', 'size')
+
     def __init__(self, value: object) -> None:
         """
         Initialize a new AVL node
-        DO NOT CHANGE THIS METHOD IN ANY WAY
         """
         self.value = value
         self.left = None
         self.right = None
         self.parent = None
         self.height = 0
+        self.size = 1
 
     def __str__(self):
         return 'AVL Node: {}'.format(self.value)
 
 
+class AVLInvariantError(ValueError):
+    """
+    Raised by AVL.validate() for the first node that breaks an invariant. invariant is
+    one of 'parent', 'ordering', 'height', 'balance' or 'size' and node is the
+    offending node.
+    """
+    def __init__(self, invariant, node, message) -> None:
+        super().__init__('{} invariant broken at {}: {}'.format(invariant, node, message))
+        self.invariant = invariant
+        self.node = node
+
+
+class AVLProfiler:
+    """
+    Collects per operation statistics from an AVL with profiling enabled (see
+    AVL.enable_profiling()). For every add/remove/contains call it records
+
+        comparisons    value comparisons made by find()
+        nodes_visited  nodes find() walked through
+        height_updates nodes rebalance() visited (AVL.last_touched)
+        rotations      rotations done, also counted by type (LL, RR, LR, RL)
+        time_ns        wall time of the call
+
+    Each metric is aggregated per operation into a histogram with power of two buckets.
+    to_dict()/to_json() export everything for a metrics pipeline.
+    """
+    METRICS = ('comparisons', 'nodes_visited', 'height_updates', 'rotations', 'time_ns')
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops everything recorded so far
+        """
+        self._histograms = {}
+        self.rotation_types = {'LL': 0, 'RR': 0, 'LR': 0, 'RL': 0}
+        self._current = dict.fromkeys(self.METRICS, 0)
+
+    def _begin(self) -> None:
+        """
+        Called at the start of a profiled operation
+        """
+        current = self._current
+        for metric in current:
+            current[metric] = 0
+
+    def _rotation(self, kind) -> None:
+        """
+        Called by rebalance() for every single (LL, RR) or double (LR, RL) rotation
+        """
+        self.rotation_types[kind] += 1
+        self._current['rotations'] += 1
+
+    def _end(self, op, time_ns, height_updates) -> None:
+        """
+        Called at the end of a profiled operation, adds its metrics to the histograms
+        """
+        current = self._current
+        current['time_ns'] = time_ns
+        current['height_updates'] = height_updates
+        histograms = self._histograms.get(op)
+        if histograms is None:
+            histograms = self._histograms[op] = {metric: [0, 0, 0, {}] for metric in self.METRICS}
+        for metric, value in current.items():
+            #count, sum, max, {bucket: count}
+            histogram = histograms[metric]
+            histogram[0] += 1
+            histogram[1] += value
+            if value > histogram[2]:
+                histogram[2] = value
+            bucket = value.bit_length()
+            histogram[3][bucket] = histogram[3].get(bucket, 0) + 1
+
+    def to_dict(self) -> dict:
+        """
+        Returns the statistics as plain dicts. Every histogram has count, sum, max, mean
+        and buckets, where buckets maps the inclusive upper bound of each power of two
+        bucket ("0", "1", "3", "7", ...) to how many calls fell in it.
+        """
+        operations = {}
+        for op, histograms in self._histograms.items():
+            operations[op] = {}
+            for metric, (count, total, largest, buckets) in histograms.items():
+                operations[op][metric] = {
+                    'count': count,
+                    'sum': total,
+                    'max': largest,
+                    'mean': total / count if count else 0.0,
+                    'buckets': {str((1 << bucket) - 1): buckets[bucket] for bucket in sorted(buckets)},
+                }
+        return {'operations': operations, 'rotation_types': dict(self.rotation_types)}
+
+    def to_json(self, **kwargs) -> str:
+        """
+        Returns to_dict() as a JSON string, kwargs are passed on to json.dumps()
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class LookupCache:
+    """
+    Bounded cache of contains() answers, positive and negative, used by an AVL with
+    the lookup cache enabled (see AVL.enable_lookup_cache()). Entries are kept in least
+    recently used order and the tree keeps them exact: adding or removing a cached
+    value updates its entry and rebuilding the tree clears the cache.
+
+    Eviction policies
+    - 'lru': a new entry always replaces the least recently used one
+    - 'tinylfu': a new entry replaces the least recently used one only if it was looked
+      up more often recently. Lookups are counted per value and every count is halved
+      each 10 * capacity lookups, so at most 10 * capacity counts are kept. A burst of
+      one-off lookups can't flush the hot values.
+    """
+    POLICIES = ('lru', 'tinylfu')
+
+    def __init__(self, capacity=1024, policy='lru') -> None:
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        if policy not in self.POLICIES:
+            raise ValueError('policy must be one of {}'.format(', '.join(self.POLICIES)))
+        self.capacity = capacity
+        self.policy = policy
+        self._entries = OrderedDict()
+        self._frequency = None
+        if policy == 'tinylfu':
+            self._frequency = {}
+            self._lookups = 0
+        self.reset_stats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def reset_stats(self) -> None:
+        """
+        Sets every counter of stats() back to zero
+        """
+        self.hits = self.misses = self.evictions = self.rejections = self.invalidations = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss statistics as a dict
+        """
+        lookups = self.hits + self.misses
+        return {'policy': self.policy, 'capacity': self.capacity, 'size': len(self._entries),
+                'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'rejections': self.rejections,
+                'invalidations': self.invalidations}
+
+    def lookup(self, key):
+        """
+        Returns the cached answer for key, or None on a miss
+        """
+        frequency = self._frequency
+        if frequency is not None:
+            frequency[key] = frequency.get(key, 0) + 1
+            self._lookups += 1
+            if self._lookups >= 10 * self.capacity:
+                self._age()
+        answer = self._entries.get(key)
+        if answer is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return answer
+
+    def store(self, key, answer) -> None:
+        """
+        Caches answer for key after a miss, evicting (or, with tinylfu, rejecting) to
+        stay within capacity
+        """
+        entries = self._entries
+        if len(entries) >= self.capacity:
+            victim = next(iter(entries))
+            frequency = self._frequency
+            if frequency is not None and frequency.get(key, 0) <= frequency.get(victim, 0):
+                self.rejections += 1
+                return
+            del entries[victim]
+            self.evictions += 1
+        entries[key] = answer
+
+    def update(self, key, answer) -> None:
+        """
+        Replaces the answer for key if it is cached, called by the tree when key is
+        added or removed
+        """
+        try:
+            if key in self._entries:
+                self._entries[key] = answer
+                self.invalidations += 1
+        except TypeError:
+            #unhashable values are never cached
+            pass
+
+    def clear(self) -> None:
+        """
+        Drops every entry, called by the tree when it is rebuilt as a whole
+        """
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def _age(self) -> None:
+        """
+        Helper that halves every lookup count once 10 * capacity lookups have been
+        counted, dropping the values whose count reaches zero
+        """
+        self._lookups = 0
+        self._frequency = {key: count >> 1 for key, count in self._frequency.items() if count > 1}
+
+
 class AVL:
-    def __init__(self, start_tree=None) -> None:
+    # node type used for every value stored in the tree
+    _node_class = TreeNode
+    # AVLProfiler receiving statistics, None while profiling is disabled
+    _profiler = None
+    # LookupCache in front of contains(), None while the cache is disabled
+    _lookup_cache = None
+    # add_many()/remove_many() rebuild the tree instead of updating it one value at a
+    # time when the batch has at least this many values per value in the tree
+    _rebuild_ratio = 0.25
+    # nodes holding the smallest and largest value, None when not known yet (they are
+    # found again by the next find_min()/find_max() after the tree was rebuilt)
+    _min_node = None
+    _max_node = None
+    # True if nodes carry prev/next links to their sorted neighbors (ThreadedAVL)
+    _threaded = False
+    # lowest node whose subtree the last add()/remove() changed, where validate() with
+    # incremental=True starts. None after the tree was rebuilt as a whole.
+    _last_changed = None
+
+    def __init__(self, start_tree=None, bulk=False) -> None:
         """
-        Initialize a new AVL tree
-        DO NOT CHANGE THIS METHOD IN ANY WAY
+        Initialize a new AVL tree. If bulk is True the initial values are loaded in
+        one linear pass (see from_sorted()) instead of one add() call per value.
         """
         self.root = None
+        # number of nodes rebalance() visited during the last add() or remove()
+        self.last_touched = 0
 
         # populate AVL with initial values (if provided)
-        # before using this feature, implement add() method
         if start_tree is not None:
-            for value in start_tree:
-                self.add(value)
+            if bulk:
+                self._bulk_load(start_tree)
+            else:
+                for value in start_tree:
+                    self.add(value)
+
+    @classmethod
+    def from_sorted(cls, iterable):
+        """
+        Builds a perfectly balanced tree from the values in iterable. Sorted input is
+        linked in O(n); unsorted input is sorted first. Duplicates are dropped the same
+        way add() drops them (the first occurrence is kept).
+        """
+        return cls(iterable, bulk=True)
 
     def __str__(self) -> str:
         """
@@ -120,13 +435,193 @@ class AVL:
 
     def _str_helper(self, cur, values):
         """
-        Helper method for __str__. Does pre-order traversal
-        DO NOT CHANGE THIS METHOD IN ANY WAY
+        Helper method for __str__. Does pre-order traversal with an explicit stack
+        """
+        stack = [cur]
+        while stack:
+            cur = stack.pop()
+            if cur:
+                values.append(str(cur.value))
+                stack.append(cur.right)
+                stack.append(cur.left)
+
+    def __len__(self) -> int:
+        """
+        Return the number of values in the tree, O(1) from the size of the root
+        """
+        return self.root.size if self.root is not None else 0
+
+    def __iter__(self):
+        """
+        Iterate over the values in sorted order without building a Queue first
+        """
+        return self.irange()
+
+    def __reversed__(self):
+        """
+        Iterate over the values in descending order
+        """
+        return self.irange(reverse=True)
+
+    def __contains__(self, value: object) -> bool:
+        """
+        Support for the in operator, same as contains()
+        """
+        return self.contains(value)
+
+    def enable_profiling(self, profiler=None):
+        """
+        Starts recording statistics for add(), remove() and contains() into profiler (a
+        new AVLProfiler if None) and returns it. Profiling works by shadowing those
+        methods and find() on this instance, so a tree that never enables it pays
+        nothing, and disable_profiling() restores the plain methods.
+        """
+        if profiler is None:
+            profiler = AVLProfiler()
+        self.disable_profiling()
+        self._profiler = profiler
+        self._push_layer(self._wrap_profiling, profiler)
+        return profiler
+
+    def disable_profiling(self) -> None:
+        """
+        Stops recording statistics
+        """
+        if self.__dict__.pop('_profiler', None) is not None:
+            self._pop_layer(self._wrap_profiling)
+
+    def _wrap_profiling(self, profiler):
+        """
+        Layer installed by enable_profiling(), returns the wrappers by attribute name
+        """
+        wrappers = {'find': self._find_counted}
+        for name in ('add', 'remove', 'contains'):
+            wrappers[name] = self._profiled(name, getattr(self, name), profiler)
+        return wrappers
+
+    def _profiled(self, name, method, profiler):
+        """
+        Helper for enable_profiling(). Wraps method so every call is timed and reported
+        to the profiler as operation name.
+        """
+        clock = time.perf_counter_ns
+
+        def profiled(*args):
+            profiler._begin()
+            self.last_touched = 0
+            start = clock()
+            result = method(*args)
+            profiler._end(name, clock() - start, self.last_touched)
+            return result
+        profiled.__doc__ = method.__doc__
+        return profiled
+
+    def enable_lookup_cache(self, capacity=1024, policy='lru'):
+        """
+        Puts a LookupCache of the given capacity and eviction policy ('lru' or
+        'tinylfu') in front of contains() and returns it. Like profiling this shadows
+        contains() and the helpers every mutation goes through on this instance, so a
+        tree without the cache pays nothing. add()/remove() (and everything built on
+        them) update the entry of the value they change, rebuilding the tree or
+        make_empty() clear the cache, so it never returns a stale answer.
+        """
+        self.disable_lookup_cache()
+        cache = LookupCache(capacity, policy)
+        self._lookup_cache = cache
+        self._push_layer(self._wrap_lookup_cache, cache)
+        return cache
+
+    def disable_lookup_cache(self) -> None:
+        """
+        Removes the lookup cache
+        """
+        if self.__dict__.pop('_lookup_cache', None) is not None:
+            self._pop_layer(self._wrap_lookup_cache)
+
+    def _wrap_lookup_cache(self, cache):
+        """
+        Layer installed by enable_lookup_cache(), returns the wrappers by attribute name
         """
-        if cur:
-            values.append(str(cur.value))
-            self._str_helper(cur.left, values)
-            self._str_helper(cur.right, values)
+        #contains() may already be shadowed by profiling, keep it underneath
+        contains = self.contains
+        insert, before_unlink, after_rebuild = self._insert, self._before_unlink, self._after_rebuild
+
+        def cached_contains(value):
+            try:
+                answer = cache.lookup(value)
+            except TypeError:
+                #unhashable values are never cached
+                return contains(value)
+            if answer is None:
+                answer = contains(value)
+                cache.store(value, answer)
+            return answer
+        cached_contains.__doc__ = contains.__doc__
+
+        def cached_insert(value, start=None):
+            node, created = insert(value, start)
+            if created:
+                cache.update(value, True)
+            return node, created
+
+        def cached_before_unlink(node):
+            before_unlink(node)
+            cache.update(node.value, False)
+
+        def cached_after_rebuild():
+            after_rebuild()
+            cache.clear()
+
+        return {'contains': cached_contains, '_insert': cached_insert,
+                '_before_unlink': cached_before_unlink, '_after_rebuild': cached_after_rebuild}
+
+    def _push_layer(self, wrap, state) -> None:
+        """
+        Installs an instance level layer (profiling, the lookup cache) on top of the
+        ones already there. wrap(state) returns the wrappers to shadow by attribute name,
+        each built around what the attribute is at that moment.
+        """
+        layers = self.__dict__.setdefault('_layers', [])
+        wrappers = wrap(state)
+        layers.append((wrap, state, tuple(wrappers)))
+        for name, wrapper in wrappers.items():
+            setattr(self, name, wrapper)
+
+    def _pop_layer(self, wrap) -> None:
+        """
+        Removes the layer installed by wrap wherever it is in the stack: every shadowed
+        attribute is dropped and the layers left are installed again in their order
+        """
+        layers = self.__dict__.pop('_layers', [])
+        for _, _, names in layers:
+            for name in names:
+                self.__dict__.pop(name, None)
+        for other, state, _ in layers:
+            if other != wrap:
+                self._push_layer(other, state)
+
+    def _find_counted(self, node, value, tof = True):
+        """
+        find() that also counts comparisons and visited nodes, used while profiling
+        """
+        current = self._profiler._current
+        if node is None:
+            return None
+        while True:
+            current['nodes_visited'] += 1
+            current['comparisons'] += 1
+            if node.value > value:
+                if node.left is None:
+                    return node
+                node = node.left
+            else:
+                if not tof:
+                    current['comparisons'] += 1
+                    if node.value == value:
+                        return node
+                if node.right is None:
+                    return node
+                node = node.right
 
     def is_valid_avl(self) -> bool:
         """
@@ -167,320 +662,453 @@ class AVL:
                 s.push(node.left)
         return True
 
+    def validate(self, incremental=False) -> None:
+        """
+        Checks the AVL invariants and raises AVLInvariantError naming the first node
+        that breaks one and which: 'parent' (parent/child links out of sync), 'ordering'
+        (a value outside the range its ancestors allow), 'height' (stored height wrong),
+        'balance' (children heights differ by more than one) or 'size' (stored subtree
+        size wrong). Returns None if the tree is valid.
+
+        The full check walks every node, O(n). With incremental=True only the nodes on
+        the path from where the last add()/remove() changed the tree up to the root are
+        checked, with their children, which covers every node that rebalancing and the
+        rotations touched in O(log n). After the tree was rebuilt as a whole (bulk
+        loads, set operations, join/split) the incremental check only sees the root.
+        """
+        root = self.root
+        if root is None:
+            return
+        if root.parent is not None:
+            raise AVLInvariantError('parent', root, 'root has a parent')
+        check = self._violation
+        if not incremental:
+            stack = [(root, None, None)]
+            pop, push = stack.pop, stack.append
+            while stack:
+                node, lo, hi = pop()
+                violation = check(node, lo, hi)
+                if violation is not None:
+                    self._raise_violation(node, *violation)
+                if node.right is not None:
+                    push((node.right, node.value, hi))
+                if node.left is not None:
+                    push((node.left, lo, node.value))
+            return
+        #the path from the last change up to the root, which must end at the root
+        path = []
+        node = self._last_changed if self._last_changed is not None else root
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        if path[-1] is not root:
+            raise AVLInvariantError('parent', path[-1], 'last changed node is not connected to the root')
+        #walk it top down so every node is checked against the range its ancestors allow.
+        #A rotation pushes nodes down off the path, but only ever to a child of a path
+        #node, so the children off the path are checked too
+        lo = hi = None
+        parent = None
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            below = path[i - 1] if i else None
+            if parent is not None:
+                if node is parent.left:
+                    hi = parent.value
+                else:
+                    lo = parent.value
+            violation = check(node, lo, hi)
+            if violation is not None:
+                self._raise_violation(node, *violation)
+            for child, child_lo, child_hi in ((node.left, lo, node.value), (node.right, node.value, hi)):
+                if child is not None and child is not below:
+                    violation = check(child, child_lo, child_hi)
+                    if violation is not None:
+                        self._raise_violation(child, *violation)
+            parent = node
+
+    def _violation(self, node, lo, hi):
+        """
+        Helper for validate(). Checks node against its children and against the open
+        range (lo, hi) its ancestors allow (None for an open end). Returns a tuple
+        (invariant, message) for the first broken invariant, None if there is none.
+        """
+        left, right = node.left, node.right
+        if (left is not None and left.parent is not node) or (right is not None and right.parent is not node):
+            return 'parent', 'child does not point back to it'
+        value = node.value
+        if (lo is not None and not lo < value) or (hi is not None and not value < hi):
+            return 'ordering', 'value outside ({}, {})'.format(lo, hi)
+        if (left is not None and not left.value < value) or (right is not None and not value < right.value):
+            return 'ordering', 'child on the wrong side'
+        l = left.height if left is not None else -1
+        r = right.height if right is not None else -1
+        if node.height != (l if l > r else r) + 1:
+            return 'height', 'height {}, children {} and {}'.format(node.height, l, r)
+        if l - r > 1 or r - l > 1:
+            return 'balance', 'balance factor {}'.format(r - l)
+        if node.size != (left.size if left is not None else 0) + (right.size if right is not None else 0) + 1:
+            return 'size', 'size {} does not match its children'.format(node.size)
+        return None
+
+    def _raise_violation(self, node, invariant, message):
+        """
+        Helper for validate() that raises AVLInvariantError. A wrong height or size
+        also shows at every ancestor, so for those the subtree of node is searched
+        (children first) for the lowest node that is itself inconsistent.
+        """
+        if invariant in ('height', 'balance', 'size'):
+            stack = [(node, False)]
+            while stack:
+                cur, children_done = stack.pop()
+                if not children_done:
+                    stack.append((cur, True))
+                    stack.extend((child, False) for child in (cur.right, cur.left) if child is not None)
+                    continue
+                found = self._violation(cur, None, None)
+                if found is not None and found[0] in ('height', 'balance', 'size'):
+                    node, (invariant, message) = cur, found
+                    break
+        raise AVLInvariantError(invariant, node, message)
+
     # -----------------------------------------------------------------------
 
+    def _bulk_load(self, values):
+        """
+        Helper for the bulk constructor. Sorts values only if they are not already in
+        order, drops duplicates and links the result into a balanced tree.
+        """
+        self._relink([self._node_class(value) for value in self._sorted_unique(values)])
+
+    def _sorted_unique(self, values):
+        """
+        Helper that returns values as a sorted list without duplicates, keeping the first
+        of equal values like add() does. Already sorted input is detected in one pass and
+        not sorted again. NumPy arrays are converted to lists of Python scalars.
+        """
+        values = values.tolist() if hasattr(values, 'tolist') else list(values)
+        for i in range(1, len(values)):
+            if values[i] < values[i - 1]:
+                values.sort()
+                break
+        #Drop duplicates
+        unique = []
+        for value in values:
+            if not unique or unique[-1] != value:
+                unique.append(value)
+        return unique
+
+    def _relink(self, nodes):
+        """
+        Helper that makes the sorted list of nodes the whole content of the tree, linked
+        into a balanced shape in O(n)
+        """
+        self.root = self._link_sorted(nodes, 0, len(nodes) - 1, None)
+        self._after_rebuild()
+
+    def _after_rebuild(self):
+        """
+        Helper called after the tree was restructured as a whole (rebuilds, joins,
+        splits, set operations). Drops the cached min and max nodes.
+        """
+        self._min_node = self._max_node = self._last_changed = None
+
+    def _link_sorted(self, nodes, lo, hi, parent):
+        """
+        Links the sorted nodes[lo..hi] into a balanced subtree below parent and returns
+        its root. The middle node becomes the root so both halves differ by at most one.
+        """
+        if lo > hi:
+            return None
+        mid = (lo + hi + 1) // 2
+        node = nodes[mid]
+        node.parent = parent
+        node.left = self._link_sorted(nodes, lo, mid - 1, node)
+        node.right = self._link_sorted(nodes, mid + 1, hi, node)
+        l = node.left.height if node.left is not None else -1
+        r = node.right.height if node.right is not None else -1
+        node.height = (l if l > r else r) + 1
+        node.size = hi - lo + 1
+        return node
+
     def updateHeight(self, node):
         """
-        Helper method that takes in a node and updates the height of the node and 
-        ancestors before it. Calculated by using max(node.left.height + node.right.height) + 1, 
-        for non-leaf. For leaves height = 0
+        Helper method that recalculates the height of a single node from its children,
+        max(node.left.height, node.right.height) + 1 (leaves have height 0). Returns True
+        if the stored height changed. Ancestors are left to rebalance(), which stops as
+        soon as a height stays the same.
         """
-        #update node based on if it has children or not.
-        if node.left is not None and node.right is not None:
-            #If left heavy, use height from left
-            if node.left.height > node.right.height:
-                node.height = node.left.height + 1
-            #If right heavy, use height from right
-            else:
-                node.height = node.right.height + 1
-        #If a leaf, height = 0
-        elif node.left is None and node.right is None:
-            node.height = 0
-        #If no left children, use height from right +1
-        elif node.left is None:  
-            node.height = node.right.height + 1
-        #If no right children, use height from left +1
-        elif node.right is None:
-            node.height = node.left.height + 1
-        
-        while node.parent is not None:
-            # parents are at least of height one
-            parent = node.parent
-            left, right = parent.left, parent.right
-            #If have both parents, use height from parent with largest height
-            if left is not None and right is not None:
-                if left.height > right.height:
-                    parent.height = left.height + 1
-                else:
-                    parent.height = right.height + 1
-            #If no right parent, use height from left
-            elif right is None:
-                parent.height = left.height + 1
-            #If we get here, then we have no left parent, so use right parents height
-            else:
-                parent.height = right.height + 1
+        l = node.left.height if node.left is not None else -1
+        r = node.right.height if node.right is not None else -1
+        height = (l if l > r else r) + 1
+        if node.height != height:
+            node.height = height
+            return True
+        return False
+
+    def _size(self, node):
+        """
+        Helper method that returns the number of nodes in the subtree rooted at node
+        """
+        return node.size if node is not None else 0
+
+    def _adjust_size(self, node, delta):
+        """
+        Helper method that adds delta to the size of node and every ancestor of node
+        """
+        while node is not None:
+            node.size += delta
             node = node.parent
 
+    def _replace_child(self, parent, old, new):
+        """
+        Helper method that makes parent (or the root if parent is None) point to new
+        where it used to point to old.
+        """
+        if new is not None:
+            new.parent = parent
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
     def rotateRight(self, node):
         """
         Takes in a node and performs a right rotation assuming that all pre-conditions 
-        are met. Updates the parent for all nodes involved. 
+        are met. Updates the parent for all nodes involved and the heights of the two
+        nodes that moved. Returns the new root of the rotated subtree.
         """
-        # point the parents to the node 
-        parent = None
-        if node.parent is not None:
-            parent = node.parent
         leftNode = node.left
         node.left = leftNode.right
         #Point left nodes parent to node
         if node.left is not None:
             node.left.parent = node
+        #left child takes the place of node, node becomes its right child
+        self._replace_child(node.parent, node, leftNode)
         leftNode.right = node
-        #If parent is none, left child becomes the root
-        if parent is None:
-            self.root = leftNode
-            self.root.parent = None
-        else:
-            leftNode.parent = parent
-            if parent.right == node:
-                parent.right = leftNode
-            else:
-                parent.left = leftNode
-        #update parent to the left child
         node.parent = leftNode
         self.updateHeight(node)
+        self.updateHeight(leftNode)
+        #left child now holds the whole subtree, node lost the left childs left subtree
+        leftNode.size = node.size
+        node.size = self._size(node.left) + self._size(node.right) + 1
+        return leftNode
 
-    def rotateLeft(self,node):
+    def rotateLeft(self, node):
         """
         Takes in a node and performs a left rotation assuming that all pre-conditions 
-        are met. Updates the parent for all nodes involved. 
+        are met. Updates the parent for all nodes involved and the heights of the two
+        nodes that moved. Returns the new root of the rotated subtree.
         """
-        # Like a linked list! 
-        parent = None
-        #point parents to node
-        if node.parent is not None:
-            parent = node.parent 
         rightNode = node.right
         node.right = rightNode.left
         #point right nodes parent to node
         if node.right is not None:
             node.right.parent = node
+        #right child takes the place of node, node becomes its left child
+        self._replace_child(node.parent, node, rightNode)
         rightNode.left = node
-        #If parent is none, right node become the root
-        if parent is None:
-            self.root = rightNode
-            self.root.parent = None
-        else:
-            rightNode.parent = parent
-            if parent.right == node:
-                parent.right = rightNode
-            else:
-                parent.left = rightNode 
-        #update parent to right child
         node.parent = rightNode
         self.updateHeight(node)
+        self.updateHeight(rightNode)
+        #right child now holds the whole subtree, node lost the right childs right subtree
+        rightNode.size = node.size
+        node.size = self._size(node.left) + self._size(node.right) + 1
+        return rightNode
 
     def rebalance(self, node):
         """
-        Takes in a node and rebalances the node starting from that node and all parents involved
-        Everything below that node is assumed to already be balanced.
+        Takes in the lowest node whose subtree changed and walks up towards the root,
+        fixing heights and rotating where a node is out of balance. Everything below node
+        is assumed to already be balanced, and node.height must still hold the height the
+        subtree had before the change. The walk stops at the first node whose height ends
+        up the same as before, since nothing above it can have changed. The number of
+        nodes visited is stored in self.last_touched.
         """
-        # Starting from the node we just added in, so everything below that should already be balanced. 
-        # We mainly need to focus on the case where node.left and node.right are both not None.
+        self._last_changed = node
+        touched = 0
+        while node is not None:
+            touched += 1
+            old_height = node.height
+            l = node.left.height if node.left is not None else -1
+            r = node.right.height if node.right is not None else -1
+            #If right heavy, check if RR or RL
+            if r - l > 1:
+                child = node.right
+                cl = child.left.height if child.left is not None else -1
+                cr = child.right.height if child.right is not None else -1
+                if cl > cr:
+                    self.rotateRight(child)  # this step is required to make it RR heavy
+                node = self.rotateLeft(node)
+                if self._profiler is not None:
+                    self._profiler._rotation('RL' if cl > cr else 'RR')
+            #If left heavy, check if LL or LR
+            elif l - r > 1:
+                child = node.left
+                cl = child.left.height if child.left is not None else -1
+                cr = child.right.height if child.right is not None else -1
+                if cr > cl:
+                    self.rotateLeft(child)  # this step is required to make it LL heavy
+                node = self.rotateRight(node)
+                if self._profiler is not None:
+                    self._profiler._rotation('LR' if cr > cl else 'LL')
+            else:
+                node.height = (l if l > r else r) + 1
+            #Subtree height unchanged, so no ancestor needs to be looked at
+            if node.height == old_height:
+                break
+            node = node.parent
+        self.last_touched = touched
 
-        if node is not None:
-            #If we have both L&R children
-            if node.left is not None and node.right is not None:
-                height = node.right.height - node.left.height
-                #If right heavy, check if RR or RL
-                if height == 2: 
-                    if node.right.left is None or (node.right.right is not None and node.right.left.height <= node.right.right.height):
-                        self.rotateLeft(node) 
-                    else:  
-                        self.rotateRight(node.right)  # this step is required to make it RR heavy
-                        self.rotateLeft(node) 
-                #If left heavy, check if its LL or LR
-                elif height == -2: 
-                    if node.left.right is None or (node.left.left is not None or node.left.left.height >= node.left.right.height):
-                        self.rotateRight(node)
-                    #LR, rotate L then R
-                    else:  
-                        self.rotateLeft(node.left)  # this step is required to make it LL heavy
-                        self.rotateRight(node)
-            #If we have left child
-            elif node.right is None and node.height == 2:
-                # Make sure that it is left left 
-                if node.left.right is None or (node.left.left is not None and node.left.left.height >= node.left.right.height):
-                    self.rotateRight(node)
-                else:
-                    self.rotateLeft(node.left)  # required to make it LL heavy
-                    self.rotateRight(node)
-            #If we have right child
-            elif node.left is None and node.height == 2:
-                # we need to make sure that it is RR 
-                if node.right.left is None or (node.right.right is not None and node.right.right.height >= node.right.left.height): 
-                    self.rotateLeft(node)
-                else:
-                    self.rotateRight(node.right)  # required to make it RR heavy
-                    self.rotateLeft(node)
-            self.rebalance(node.parent)
-        
     def find(self, node, value, tof = True):
         """
         Takes in a value and returns the node which matches the value. If false it will 
         return the parent node or the node if already exists.
         """
-        if node is not None:
+        if node is None:
+            return None
+        while True:
             #If the value we're looking for is smaller than the nodes value, traverse left
             if node.value > value:
-                if node.left is not None:
-                    return self.find(node.left, value, tof)
-                else:
+                if node.left is None:
                     return node
+                node = node.left
             else:
                 #If false and values match, return node
                 if not tof and node.value == value:
                     return node
                 #traverse right
-                elif node.right is not None:
-                    return self.find(node.right, value, tof)
-                else:
-                    return node    
+                if node.right is None:
+                    return node
+                node = node.right
 
     def add(self, value: object) -> None:
         """
         Adds a node containing value to the AVL tree, if it doesn't already exist
         """
-        node = TreeNode(value)
+        self._insert(value)
+
+    def _insert(self, value, start=None):
+        """
+        Helper for add(). Returns a tuple (node, created) where node holds value and
+        created is False if value was already in the tree, in which case nothing changed.
+        The search starts at start instead of the root if value is known to belong in the
+        subtree of start.
+        """
+        self.last_touched = 0
         #If tree is empty, node becomes the root
         if self.root is None:
-            self.root = node
-            return
+            self.root = self._min_node = self._max_node = self._node_class(value)
+            self._last_changed = self.root
+            return self.root, True
         # If we get here, we are dealing with parents
-        parentNode = self.find(self.root, value, False)
+        parentNode = self.find(start if start is not None else self.root, value, False)
         #Duplicate values not allowed
         if parentNode.value == value: 
-            return
+            return parentNode, False
+        node = self._node_class(value)
         if parentNode.value > value:
             parentNode.left = node
         #If here, then parentNode.value < value
         else:
             parentNode.right = node
-        #update parent node
+        #update parent node, the new leaf already has the right height and size
         node.parent = parentNode
-        self.updateHeight(node)
-        self.rebalance(node)
+        #a new extreme is always a leaf, rotations never move values so the cached
+        #nodes stay valid through rebalance()
+        if self._min_node is not None and value < self._min_node.value:
+            self._min_node = node
+        elif self._max_node is not None and self._max_node.value < value:
+            self._max_node = node
+        if self._threaded:
+            self._thread(node)
+        self._adjust_size(parentNode, 1)
+        self.rebalance(parentNode)
+        return node, True
+
+    def _splice_successor(self, node):
+        """
+        Helper for removeRoot() and removeNonRoot() when node has two children. Moves the
+        inorder successor into the place of node and returns the lowest node whose subtree
+        lost a node, which is where rebalancing has to start.
+        """
+        #inorder successor is the leftmost node in the right subtree
+        succ = node.right
+        while succ.left is not None:
+            succ = succ.left
+        #the successors old position is the one that physically disappears
+        self._adjust_size(succ.parent, -1)
+        if succ is not node.right:
+            #successors parent adopts the successors right subtree
+            start = succ.parent
+            start.left = succ.right
+            if succ.right is not None:
+                succ.right.parent = start
+            succ.right = node.right
+            succ.right.parent = succ
+        else:
+            #successor keeps its own right subtree
+            start = succ
+        succ.left = node.left
+        succ.left.parent = succ
+        #successor inherits the old height and the size of the position it moved into
+        succ.height = node.height
+        succ.size = node.size
+        self._replace_child(node.parent, node, succ)
+        return start
+
+    def _before_unlink(self, node):
+        """
+        Helper for removeRoot() and removeNonRoot(), called before node is unlinked. If
+        node is the cached min (max) node its inorder successor (predecessor) takes over.
+        The min has no left child, so the successor is its right child (a leaf in an AVL
+        tree) or else its parent, and the other way around for the max. O(1)
+        """
+        if node is self._min_node:
+            self._min_node = node.right if node.right is not None else node.parent
+        if node is self._max_node:
+            self._max_node = node.left if node.left is not None else node.parent
 
     def removeRoot(self):
         """
         A helper method which removes a node that is a root.
         """
-        #If tree is empty
-        if self.root.left is None and self.root.right is None:
-            self.root = None 
+        root = self.root
+        self._before_unlink(root)
+        #If root has at most one child, that child (or None) becomes the root. The
+        #child subtree is already balanced so nothing needs rebalancing.
+        if root.left is None or root.right is None:
+            child = root.left if root.left is not None else root.right
+            self._replace_child(None, root, child)
+            self._last_changed = child
             return
-        #If no left child, make right child the root
-        elif self.root.left is None:
-            self.root = self.root.right
-        #If no right child, make left child root
-        elif self.root.right is None:
-            self.root = self.root.left
-        #If we have both right and left children
-        else: 
-            #inorder successor is the leftmost node in the right subtree
-            succ = self.root.right
-            while succ.left is not None:
-                succ = succ.left
-            succ.left = self.root.left
-            succ.left.parent = succ
-            parent = None
-            #find the parent
-            if succ.parent is not self.root:
-                parent = succ.parent
-                parent.left = succ.right
-                if parent.left is not None:
-                    parent.left.parent = parent
-                succ.right = self.root.right
-                succ.right.parent = succ
-            else:
-                succ.right = self.root.right.right
-                if succ.right is not None:
-                    succ.right.parent = succ
-            #successor becomes parent, remove roots parent
-            self.root = succ
-            self.root.parent = None 
-            if parent is not None:
-                self.updateHeight(parent)
-                self.rebalance(parent)
-                return
-        
-        self.root.parent = None
-        self.updateHeight(self.root)
-        self.rebalance(self.root)
+        #If we have both right and left children, successor becomes the root
+        self.rebalance(self._splice_successor(root))
 
     def removeNonRoot(self, node):
         """
         A helper method to remove a node if it is not a root.
         """
+        self._before_unlink(node)
         parent = node.parent
-        #If no children, parent node points to None
-        if node.left is None and node.right is None:
-            if node == parent.left:
-                parent.left = None 
-            else:
-                parent.right = None
-            #update and rebalance because everything below is already balanced
-            self.updateHeight(parent)  
-            self.rebalance(parent)    
-        #If only right child, update parent node to point to nodes child
-        elif node.left is None:
-            if node == parent.left:
-                parent.left = node.right
-            else:
-                parent.right = node.right
-            node.right.parent = parent
-            self.updateHeight(parent)
-            self.rebalance(parent)
-        #If only left child, update parent node to point to nodes child
-        elif node.right is None:
-            if node == parent.left:
-                parent.left = node.left
-            else:
-                parent.right = node.left
-            node.left.parent = parent
-            self.updateHeight(parent)
+        #If at most one child, parent node points to that child (or None)
+        if node.left is None or node.right is None:
+            child = node.left if node.left is not None else node.right
+            self._adjust_size(parent, -1)
+            self._replace_child(parent, node, child)
+            #rebalance because everything below parent is already balanced
             self.rebalance(parent)
         #node has both left and right children
-        else: 
-            #inorder successor is the leftmost node in the right subtree 
-            succ = node.right
-            #find inorder successor
-            while succ.left is not None:
-                succ = succ.left
-            succ.left = node.left
-            succ.left.parent = succ
-            succParent = None
-            #Find successors parent
-            if succ.parent is not node:
-                succParent = succ.parent
-                succ.parent.left = succ.right
-                if succParent.left is not None:
-                    succParent.left.parent = succParent
-            if node.right != succ:
-                succ.right = node.right
-            else:
-                succ.right = node.right.right
-            #update parent node to point to successor
-            if succ.right is not None:
-                succ.right.parent = succ
-            if parent.left == node:
-                parent.left = succ
-            else:
-                parent.right = succ
-            succ.parent = parent 
-            if succParent is not None:
-                self.updateHeight(succParent)
-                self.rebalance(succParent)
-            else:
-                self.updateHeight(succ)
-                self.rebalance(succ)
-        return
+        else:
+            self.rebalance(self._splice_successor(node))
 
     def remove(self, value: object) -> bool:
         """
         Removes a node containing value from the tree and returns True if it successfully removes
         the value. Otherwise it returns False.
         """
+        self.last_touched = 0
         #Returns false if tree is empty
         if self.root is None:
             return False 
@@ -488,13 +1116,28 @@ class AVL:
         #Returns false if no values match
         if node.value != value:
             return False
+        self._remove_node(node)
+        return True 
+
+    def _remove_node(self, node):
+        """
+        Helper that unlinks node, which must be in the tree, and rebalances
+        """
         #If the value we're looking for is the root, call the removeRoot method
-        if node == self.root:
+        if node is self.root:
             self.removeRoot()
         #If we get here, the value is in the tree but isn't the root. Call removeNonRoot method
         else:
             self.removeNonRoot(node)
-        return True 
+
+    def _find_node(self, value):
+        """
+        Helper that returns the node holding value, or None if value is not in the tree
+        """
+        if self.root is None:
+            return None
+        node = self.find(self.root, value, False)
+        return node if node.value == value else None
 
     def contains(self, value: object) -> bool:
         """
@@ -511,77 +1154,2340 @@ class AVL:
         else:
             return False
 
-    def inorder_traversal(self) -> Queue:
+    def add_many(self, values) -> None:
         """
-        Performs inorder traversal of tree and returns a Queue object that contains 
-        the values of the visited nodes, in the order they were visited.
+        Adds every value of an iterable (or NumPy array) that isn't already in the tree.
+        The batch is sorted once; if it is large compared to the tree it is merged with
+        the current values and the tree is rebuilt in O(n + k), otherwise the values are
+        inserted in order, each search starting from where the previous one ended.
         """
-        # If tree is empty, return empty Queue
+        values = self._sorted_unique(values)
+        if not values:
+            return
+        if len(values) >= len(self) * self._rebuild_ratio:
+            self._merge_rebuild(values)
+            return
+        finger = None
+        for value in values:
+            finger = self._insert(value, self._climb(finger, value))[0]
+
+    def remove_many(self, values) -> int:
+        """
+        Removes every value of an iterable (or NumPy array) from the tree and returns how
+        many were found. Large batches filter the values in one pass and rebuild the tree,
+        small ones are removed in order, each search starting from where the previous
+        one ended.
+        """
+        values = self._sorted_unique(values)
+        if len(values) >= len(self) * self._rebuild_ratio:
+            return self._filter_rebuild(values)
+        removed = 0
+        finger = None
+        for value in values:
+            node = self.find(self._climb(finger, value) or self.root, value, False)
+            if node is None or node.value != value:
+                finger = node
+                continue
+            #node goes away and rebalancing may move the nodes around it, but any node
+            #still in the tree with a value below the next one is a valid finger
+            finger = self._predecessor_node(node)
+            self._remove_node(node)
+            removed += 1
+        return removed
+
+    def _predecessor_node(self, node):
+        """
+        Helper for remove_many() that returns the node holding the largest value below
+        node's, or None if node holds the smallest value
+        """
+        if node.left is not None:
+            node = node.left
+            while node.right is not None:
+                node = node.right
+            return node
+        parent = node.parent
+        while parent is not None and parent.left is node:
+            node = parent
+            parent = node.parent
+        return parent
+
+    def contains_many(self, values):
+        """
+        Returns a list of booleans, one per value, saying whether the value is in the tree
+        (a NumPy bool array if values is a NumPy array). The values are probed in sorted
+        order so each search can start from where the previous one ended.
+        """
+        is_array = numpy is not None and isinstance(values, numpy.ndarray)
+        values = values.tolist() if hasattr(values, 'tolist') else list(values)
+        found = [False] * len(values)
+        if self.root is not None:
+            order = range(len(values))
+            if any(values[i] < values[i - 1] for i in range(1, len(values))):
+                order = sorted(order, key=values.__getitem__)
+            finger = None
+            for i in order:
+                value = values[i]
+                finger = self.find(self._climb(finger, value) or self.root, value, False)
+                found[i] = finger.value == value
+        return numpy.array(found, dtype=bool) if is_array else found
+
+    def _climb(self, finger, value):
+        """
+        Helper for the batch methods (finger search). finger is the last node the previous,
+        smaller or equal, value reached. Climbs from finger to the lowest ancestor whose
+        subtree must contain value and returns it, or None if there is no finger yet.
+        """
+        if finger is None:
+            return None
+        node = finger
+        parent = node.parent
+        #everything in the subtree is above the previous value, so only the upper bound
+        #has to be checked: stop once node is a left child of something bigger than value
+        while parent is not None and (parent.right is node or not parent.value > value):
+            node = parent
+            parent = node.parent
+        return node
+
+    def _merge_rebuild(self, values):
+        """
+        Helper for add_many(). Merges the sorted, duplicate free values with the nodes
+        already in the tree and rebuilds. Existing nodes are reused, so their identity and
+        any payload survive.
+        """
+        nodes = []
+        i, n = 0, len(values)
+        for node in self._iter_nodes():
+            while i < n and values[i] < node.value:
+                nodes.append(self._node_class(values[i]))
+                i += 1
+            if i < n and values[i] == node.value:
+                i += 1
+            nodes.append(node)
+        nodes.extend(self._node_class(value) for value in values[i:])
+        self._relink(nodes)
+
+    def _filter_rebuild(self, values):
+        """
+        Helper for remove_many(). Drops the nodes holding one of the sorted, duplicate free
+        values and rebuilds from the rest. Returns the number of nodes dropped.
+        """
+        nodes = []
+        i, n = 0, len(values)
+        for node in self._iter_nodes():
+            while i < n and values[i] < node.value:
+                i += 1
+            if i < n and values[i] == node.value:
+                i += 1
+            else:
+                nodes.append(node)
+        removed = len(self) - len(nodes)
+        if removed:
+            self._relink(nodes)
+        return removed
+
+    def dump(self, path, checksum=True) -> None:
+        """
+        Writes the values to path in a compact binary format (see BINARY FORMAT below):
+        a typed, versioned header followed by the sorted values. The values must all be
+        int (fitting in 64 bits), all float, all bytes or all str.
+        """
+        _write_dump(path, list(self), checksum)
+
+    @classmethod
+    def load(cls, path, verify=True):
+        """
+        Reads a file written by dump() and bulk builds a balanced tree from it in O(n).
+        Raises ValueError if the file is not a dump or its checksum does not match.
+        """
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        key_type, count = _read_header(buffer, verify)
+        return cls._from_unique(_PackedValues(buffer, key_type, count).tolist())
+
+    @classmethod
+    def _from_unique(cls, values):
+        """
+        Helper for load() and thaw(). Links sorted, duplicate free values into a new tree
+        with one _node_class node each. Goes through _relink() and not the constructor,
+        which takes something else than plain values in AVLMap.
+        """
+        tree = cls()
+        tree._relink([tree._node_class(value) for value in values])
+        return tree
+
+    def freeze(self, layout='sorted'):
+        """
+        Returns a FrozenAVL, a read-only NumPy copy of the values that answers whole
+        arrays of queries in one vectorized call. layout is 'sorted' or 'eytzinger'.
+        The values must be numeric (int, float or bool). Requires NumPy.
+        """
+        if numpy is None:
+            raise ImportError('AVL.freeze() requires NumPy')
+        keys = numpy.array(list(self))
+        if keys.dtype.kind not in 'biuf':
+            raise TypeError('AVL.freeze() needs numeric values, not {}'.format(keys.dtype))
+        return FrozenAVL(keys, layout, self.__class__)
+
+    def copy(self):
+        """
+        Returns a new tree of the same class holding the same values, built in O(n)
+        """
+        tree = self._new_tree()
+        tree._relink([self._clone_node(node) for node in self._iter_nodes()])
+        return tree
+
+    def _new_tree(self):
+        """
+        Helper for copy() and split() that returns a new, empty tree of the same class
+        and with the same settings as this one
+        """
+        return self.__class__()
+
+    def _clone_node(self, node):
+        """
+        Helper for copy() that returns a new, unlinked node holding the value of node
+        """
+        return self._node_class(node.value)
+
+    def _as_tree(self, other):
+        """
+        Helper for the set operations. Returns a private copy of other whose nodes can be
+        consumed, building one from any iterable of values.
+        """
+        if isinstance(other, AVL):
+            return other.copy()
+        return self.__class__(other, bulk=True)
+
+    def union(self, other):
+        """
+        Returns a new tree with the values that are in this tree or in other
+        """
+        tree = self.copy()
+        tree.update(other)
+        return tree
+
+    def intersection(self, other):
+        """
+        Returns a new tree with the values that are in both this tree and other
+        """
+        tree = self.copy()
+        tree.intersection_update(other)
+        return tree
+
+    def difference(self, other):
+        """
+        Returns a new tree with the values of this tree that are not in other
+        """
+        tree = self.copy()
+        tree.difference_update(other)
+        return tree
+
+    def symmetric_difference(self, other):
+        """
+        Returns a new tree with the values that are in exactly one of this tree and other
+        """
+        tree = self.copy()
+        tree.symmetric_difference_update(other)
+        return tree
+
+    def update(self, other) -> None:
+        """
+        Adds every value of other (an AVL or any iterable) to this tree. Works on whole
+        subtrees with split() and join(), O(m log(n/m + 1)) for m <= n values plus O(m)
+        to copy other, which is left unchanged.
+        """
+        self.root = self._union(self.root, self._as_tree(other).root)
+        self._after_rebuild()
+
+    def intersection_update(self, other) -> None:
+        """
+        Keeps only the values that are also in other
+        """
+        self.root = self._intersection(self.root, self._as_tree(other).root)
+        self._after_rebuild()
+
+    def difference_update(self, other) -> None:
+        """
+        Removes every value that is in other
+        """
+        self.root = self._difference(self.root, self._as_tree(other).root)
+        self._after_rebuild()
+
+    def symmetric_difference_update(self, other) -> None:
+        """
+        Keeps the values that are in exactly one of this tree and other
+        """
+        self.root = self._symmetric_difference(self.root, self._as_tree(other).root)
+        self._after_rebuild()
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+    __xor__ = symmetric_difference
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def split(self, value):
+        """
+        Splits the tree around value. Returns a tuple (smaller, found, larger) of two new
+        trees with the values below and above value, and whether value was in the tree.
+        This tree is left empty. O(log n)
+        """
+        left, node, right = self._split(self.root, value)
+        self.make_empty()
+        smaller, larger = self._new_tree(), self._new_tree()
+        smaller.root, larger.root = left, right
+        smaller._after_rebuild()
+        larger._after_rebuild()
+        return smaller, node is not None, larger
+
+    def join(self, value, other) -> None:
+        """
+        Appends value and then every value of the tree other to this tree, assuming all
+        values here are smaller than value and all values in other are larger. other is
+        left empty. O(|height difference|)
+        """
+        self.root = self._join(self.root, self._node_class(value), other.root)
+        self._after_rebuild()
+        other.make_empty()
+
+    def _detach(self, node):
+        """
+        Helper for the join based algorithms. Cuts node off from its children and returns
+        them as two detached subtrees (left, right).
+        """
+        left, right = node.left, node.right
+        node.left = node.right = None
+        if left is not None:
+            left.parent = None
+        if right is not None:
+            right.parent = None
+        return left, right
+
+    def _join(self, left, node, right):
+        """
+        Helper that joins the detached subtrees left and right, where every value in left
+        is smaller than node.value and every value in right is larger, with node between
+        them. Returns the root of the joined, balanced subtree. The node is hung where the
+        spine of the taller tree reaches the height of the shorter one, then the path
+        above it is rebalanced like after an insert.
+        """
+        hl = left.height if left is not None else -1
+        hr = right.height if right is not None else -1
+        #Heights close enough, node becomes the root
+        if -1 <= hl - hr <= 1:
+            node.left, node.right, node.parent = left, right, None
+            if left is not None:
+                left.parent = node
+            if right is not None:
+                right.parent = node
+            self.updateHeight(node)
+            node.size = self._size(left) + self._size(right) + 1
+            return node
+        #rebalance() and the rotations work on self.root, so borrow it for the subtree
+        saved = self.root
+        if hl > hr:
+            self.root = left
+            #walk down the right spine of left to a subtree no taller than right + 1
+            parent, cur = None, left
+            while cur is not None and cur.height > hr + 1:
+                parent, cur = cur, cur.right
+            node.left, node.right = cur, right
+            parent.right = node
+        else:
+            self.root = right
+            #walk down the left spine of right to a subtree no taller than left + 1
+            parent, cur = None, right
+            while cur is not None and cur.height > hl + 1:
+                parent, cur = cur, cur.left
+            node.left, node.right = left, cur
+            parent.left = node
+        node.parent = parent
+        if node.left is not None:
+            node.left.parent = node
+        if node.right is not None:
+            node.right.parent = node
+        self.updateHeight(node)
+        node.size = self._size(node.left) + self._size(node.right) + 1
+        self._adjust_size(parent, node.size - self._size(cur))
+        self.rebalance(parent)
+        root, self.root = self.root, saved
+        return root
+
+    def _join2(self, left, right):
+        """
+        Helper that joins the detached subtrees left and right (all of left smaller than
+        all of right) without a middle node, by borrowing the largest node of left
+        """
+        if left is None:
+            return right
+        if right is None:
+            return left
+        left, node = self._split_last(left)
+        return self._join(left, node, right)
+
+    def _split_last(self, root):
+        """
+        Helper for _join2(). Removes the largest node from the detached subtree root and
+        returns (rest of the subtree, largest node).
+        """
+        l, r = self._detach(root)
+        if r is None:
+            return l, root
+        r, last = self._split_last(r)
+        return self._join(l, root, r), last
+
+    def _split(self, root, value):
+        """
+        Helper that splits the detached subtree root around value. Returns a tuple
+        (left, node, right) of the detached subtree smaller than value, the node holding
+        value (or None) and the detached subtree larger than value.
+        """
+        if root is None:
+            return None, None, None
+        l, r = self._detach(root)
+        if root.value > value:
+            ll, node, lr = self._split(l, value)
+            return ll, node, self._join(lr, root, r)
+        if root.value == value:
+            return l, root, r
+        rl, node, rr = self._split(r, value)
+        return self._join(l, root, rl), node, rr
+
+    def _union(self, a, b):
+        """
+        Helper for update(). Returns the union of the detached subtrees a and b, keeping
+        the node of a where both hold the same value.
+        """
+        if a is None:
+            return b
+        if b is None:
+            return a
+        al, ar = self._detach(a)
+        bl, dup, br = self._split(b, a.value)
+        return self._join(self._union(al, bl), a, self._union(ar, br))
+
+    def _intersection(self, a, b):
+        """
+        Helper for intersection_update(). Returns the nodes of detached subtree a whose
+        values are also in detached subtree b.
+        """
+        if a is None or b is None:
+            return None
+        al, ar = self._detach(a)
+        bl, dup, br = self._split(b, a.value)
+        left, right = self._intersection(al, bl), self._intersection(ar, br)
+        if dup is not None:
+            return self._join(left, a, right)
+        return self._join2(left, right)
+
+    def _difference(self, a, b):
+        """
+        Helper for difference_update(). Returns the nodes of detached subtree a whose
+        values are not in detached subtree b.
+        """
+        if a is None or b is None:
+            return a
+        bl, br = self._detach(b)
+        al, dup, ar = self._split(a, b.value)
+        return self._join2(self._difference(al, bl), self._difference(ar, br))
+
+    def _symmetric_difference(self, a, b):
+        """
+        Helper for symmetric_difference_update(). Returns the nodes of the detached
+        subtrees a and b whose values are in only one of them.
+        """
+        if a is None:
+            return b
+        if b is None:
+            return a
+        al, ar = self._detach(a)
+        bl, dup, br = self._split(b, a.value)
+        left, right = self._symmetric_difference(al, bl), self._symmetric_difference(ar, br)
+        if dup is None:
+            return self._join(left, a, right)
+        return self._join2(left, right)
+
+    def inorder_traversal(self) -> Queue:
+        """
+        Performs inorder traversal of tree and returns a Queue object that contains 
+        the values of the visited nodes, in the order they were visited.
+        """
+        # If tree is empty, return empty Queue
         if self.root is None:
             return Queue()
 
-        # call recursive helper method to process a non-empty tree and return resulting Queue
-        return self.inorder_helper(self.root, Queue())
-        
+        # call helper method to process a non-empty tree and return resulting Queue
+        return self.inorder_helper(self.root, Queue())
+
+    def inorder_helper(self, node, q):
+        """
+        Helper to inorder_traversal(). Walks the subtree rooted at node with an explicit
+        stack of the ancestors still waiting to be visited.
+        """
+        stack = []
+        push, pop, enqueue = stack.append, stack.pop, q.enqueue
+        while True:
+            # traverse to node.left, remembering the way back
+            while node is not None:
+                push(node)
+                node = node.left
+            if not stack:
+                return q
+            # process current node then move on to its right subtree
+            node = pop()
+            enqueue(node.value)
+            node = node.right
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        Generator over the values between lo and hi in sorted order (descending if
+        reverse is True). A bound of None leaves that side open, and inclusive says
+        whether lo and hi themselves are included. Finding the first value takes
+        O(log n) and only O(log n) nodes are held at any time, so scanning k values
+        costs O(log n + k).
+        """
+        for node in self._iter_nodes(lo, hi, inclusive, reverse):
+            yield node.value
+
+    def _iter_nodes(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        Helper generator for irange() and the iterators. Yields the nodes whose values
+        are in range, using a stack of the ancestors that are still waiting to be visited.
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        stack = []
+        node = self.root
+        if not reverse:
+            #seek the first node >= lo (> lo if exclusive), stacking where we go left
+            while node is not None:
+                if lo is None or node.value > lo or (lo_inclusive and node.value == lo):
+                    stack.append(node)
+                    node = node.left
+                else:
+                    node = node.right
+            while stack:
+                node = stack.pop()
+                if hi is not None and (node.value > hi or (not hi_inclusive and node.value == hi)):
+                    return
+                yield node
+                #the next node is the leftmost node of the right subtree
+                node = node.right
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+        else:
+            #seek the last node <= hi (< hi if exclusive), stacking where we go right
+            while node is not None:
+                if hi is None or node.value < hi or (hi_inclusive and node.value == hi):
+                    stack.append(node)
+                    node = node.right
+                else:
+                    node = node.left
+            while stack:
+                node = stack.pop()
+                if lo is not None and (node.value < lo or (not lo_inclusive and node.value == lo)):
+                    return
+                yield node
+                #the previous node is the rightmost node of the left subtree
+                node = node.left
+                while node is not None:
+                    stack.append(node)
+                    node = node.right
+
+    def find_min(self) -> object:
+        """
+        This method returns the smallest value in the tree. O(1) while the min node is
+        cached, which add() and remove() keep up to date.
+        """
+        node = self._min()
+        #returns None if tree is empty
+        return node.value if node is not None else None
+
+    def find_max(self) -> object:
+        """
+        This method returns the highest value in the tree. O(1) while the max node is
+        cached, which add() and remove() keep up to date.
+        """
+        node = self._max()
+        #returns none if tree is empty
+        return node.value if node is not None else None
+
+    def _min(self):
+        """
+        Helper that returns the node holding the smallest value (None if the tree is
+        empty), walking down from the root only if it is not cached
+        """
+        node = self._min_node
+        if node is None:
+            node = self.root
+            if node is None:
+                return None
+            #traverse left, leftmost node holds the smallest value
+            while node.left is not None:
+                node = node.left
+            self._min_node = node
+        return node
+
+    def _max(self):
+        """
+        Helper that returns the node holding the largest value (None if the tree is
+        empty), walking down from the root only if it is not cached
+        """
+        node = self._max_node
+        if node is None:
+            node = self.root
+            if node is None:
+                return None
+            #Traverse right, rightmost node holds the largest value
+            while node.right is not None:
+                node = node.right
+            self._max_node = node
+        return node
+
+    def pop_min(self) -> object:
+        """
+        This method removes the smallest value from the tree and returns it, or returns
+        None if the tree is empty. The cached min node is unlinked directly, without a
+        search from the root.
+        """
+        self.last_touched = 0
+        node = self._min()
+        if node is None:
+            return None
+        self._remove_node(node)
+        return node.value
+
+    def pop_max(self) -> object:
+        """
+        This method removes the largest value from the tree and returns it, or returns
+        None if the tree is empty. The cached max node is unlinked directly, without a
+        search from the root.
+        """
+        self.last_touched = 0
+        node = self._max()
+        if node is None:
+            return None
+        self._remove_node(node)
+        return node.value
+    
+    def rank(self, value: object) -> int:
+        """
+        This method returns the number of values in the tree that are smaller than value,
+        which is also the index value has (or would have) in sorted order. O(log n)
+        """
+        return self._rank(value, False)
+
+    def _rank(self, value, inclusive):
+        """
+        Helper for rank() and count_range(). Counts the values smaller than value, or
+        smaller than or equal to value if inclusive is True.
+        """
+        count = 0
+        node = self.root
+        while node is not None:
+            if node.value > value:
+                node = node.left
+            elif node.value == value:
+                count += self._size(node.left)
+                return count + 1 if inclusive else count
+            #node and its left subtree are all smaller than value
+            else:
+                count += self._size(node.left) + 1
+                node = node.right
+        return count
+
+    def select(self, k: int) -> object:
+        """
+        This method returns the k-th smallest value in the tree (k = 0 is the smallest,
+        negative k counts from the largest like a list index). O(log n)
+        """
+        n = len(self)
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError('select index out of range')
+        node = self.root
+        while True:
+            left = self._size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node.value
+            #skip the left subtree and node itself
+            else:
+                k -= left + 1
+                node = node.right
+
+    def count_range(self, lo: object, hi: object, inclusive=(True, True)) -> int:
+        """
+        This method returns how many values lie between lo and hi, inclusive says whether
+        lo and hi themselves are counted (same as irange()). O(log n)
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        count = self._rank(hi, hi_inclusive) - self._rank(lo, not lo_inclusive)
+        return count if count > 0 else 0
+
+    def successor(self, value: object) -> object:
+        """
+        This method returns the smallest value in the tree that is larger than value, or
+        None if there is none. value itself does not have to be in the tree. O(log n)
+        """
+        node = self._ceiling_node(value, False)
+        return node.value if node is not None else None
+
+    def predecessor(self, value: object) -> object:
+        """
+        This method returns the largest value in the tree that is smaller than value, or
+        None if there is none. value itself does not have to be in the tree. O(log n)
+        """
+        node = self._floor_node(value, False)
+        return node.value if node is not None else None
+
+    def floor(self, value: object) -> object:
+        """
+        This method returns the largest value in the tree that is smaller than or equal
+        to value, or None if there is none. O(log n)
+        """
+        node = self._floor_node(value, True)
+        return node.value if node is not None else None
+
+    def ceiling(self, value: object) -> object:
+        """
+        This method returns the smallest value in the tree that is larger than or equal
+        to value, or None if there is none. O(log n)
+        """
+        node = self._ceiling_node(value, True)
+        return node.value if node is not None else None
+
+    def _ceiling_node(self, value, inclusive):
+        """
+        Helper for successor() and ceiling(). Returns the node with the smallest value
+        above value (or equal to it if inclusive is True), None if there is none.
+        """
+        best = None
+        node = self.root
+        while node is not None:
+            if node.value > value:
+                #node is a candidate, a closer one can only be in the left subtree
+                best = node
+                node = node.left
+            elif inclusive and node.value == value:
+                return node
+            else:
+                node = node.right
+        return best
+
+    def _floor_node(self, value, inclusive):
+        """
+        Helper for predecessor() and floor(). Returns the node with the largest value
+        below value (or equal to it if inclusive is True), None if there is none.
+        """
+        best = None
+        node = self.root
+        while node is not None:
+            if node.value < value:
+                #node is a candidate, a closer one can only be in the right subtree
+                best = node
+                node = node.right
+            elif inclusive and node.value == value:
+                return node
+            else:
+                node = node.left
+        return best
+
+    def is_empty(self) -> bool:
+        """
+        This method returns true if the tree is empty, otherwise returns false
+        """
+        #If the tree doesn't have a root, the tree is empty
+        if self.root is None:
+            return True
+        return False
+
+    def make_empty(self) -> None:
+        """
+        This method removes all of the nodes from the tree in O(1) by detaching the root,
+        the nodes are then reclaimed by the garbage collector
+        """
+        self.root = None
+        self._after_rebuild()
+
+
+class CompactAVL(AVL):
+    """
+    AVL tree that stores its values in SlotTreeNode objects. Same API as AVL, but
+    every node takes considerably less memory because it has no __dict__.
+    """
+    _node_class = SlotTreeNode
+
+
+class ThreadedNode(TreeNode):
+    """
+    AVL Tree Node that also links to the nodes holding the previous and next value in
+    sorted order (None at either end). Used by ThreadedAVL.
+    """
+    def __init__(self, value: object) -> None:
+        """
+        Initialize a new, unthreaded AVL node
+        """
+        super().__init__(value)
+        self.prev = None
+        self.next = None
+
+
+class ThreadedAVL(AVL):
+    """
+    AVL tree whose nodes form a doubly linked list in sorted order next to the tree.
+    add() threads a new node in between its parent and the parents neighbor and
+    remove() unthreads a node, both in O(1) on top of the usual work. Stepping from a
+    node (see node()) to its neighbor through prev/next is O(1), and iterating follows
+    the links without walking the tree.
+
+    Operations that restructure the tree as a whole (bulk loads, join, split, the set
+    operations) rethread every node in O(n).
+    """
+    _node_class = ThreadedNode
+    _threaded = True
+
+    def __iter__(self):
+        """
+        Iterates over the values in sorted order by following the next links
+        """
+        node = self._min()
+        while node is not None:
+            yield node.value
+            node = node.next
+
+    def __reversed__(self):
+        """
+        Iterates over the values in descending order by following the prev links
+        """
+        node = self._max()
+        while node is not None:
+            yield node.value
+            node = node.prev
+
+    def node(self, value: object):
+        """
+        Returns the node holding value, or None if value is not in the tree. Its prev and
+        next attributes lead to the neighboring nodes in O(1).
+        """
+        return self._find_node(value)
+
+    def _thread(self, node):
+        """
+        Helper for add() that threads a new leaf into the list before it is rebalanced.
+        The leaf sits right before its parent if it is a left child, right after it
+        otherwise.
+        """
+        parent = node.parent
+        if parent.left is node:
+            node.prev, node.next = parent.prev, parent
+        else:
+            node.prev, node.next = parent, parent.next
+        if node.prev is not None:
+            node.prev.next = node
+        if node.next is not None:
+            node.next.prev = node
+
+    def _before_unlink(self, node):
+        """
+        Helper for removeRoot() and removeNonRoot() that also unthreads node
+        """
+        super()._before_unlink(node)
+        if node.prev is not None:
+            node.prev.next = node.next
+        if node.next is not None:
+            node.next.prev = node.prev
+        node.prev = node.next = None
+
+    def _after_rebuild(self):
+        """
+        Helper that rethreads every node after the tree was restructured as a whole
+        """
+        super()._after_rebuild()
+        prev = None
+        for node in self._iter_nodes():
+            node.prev = prev
+            if prev is not None:
+                prev.next = node
+            prev = node
+        if prev is not None:
+            prev.next = None
+
+
+class TombstoneNode(TreeNode):
+    """
+    AVL Tree Node that can be marked dead instead of being unlinked. Used by
+    TombstoneAVL.
+    """
+    def __init__(self, value: object) -> None:
+        """
+        Initialize a new node. dead_count is the number of dead nodes in the subtree
+        rooted at this node. Both are set here, not left to class attributes, so every
+        node keeps the same attribute layout when it is marked later, which is much
+        faster to update.
+        """
+        super().__init__(value)
+        self.dead = False
+        self.dead_count = 0
+
+
+class TombstoneAVL(AVL):
+    """
+    AVL tree with lazy deletion. remove() only marks the node dead, one O(log n)
+    search with no unlinking or rebalancing, so delete bursts are cheap. Lookups,
+    iteration, len() and find_min()/find_max() skip dead nodes, and add() of a dead
+    value revives its node.
+
+    Once at least min_dead nodes and at least threshold of all nodes are dead, the tree
+    is compacted: the live values are linked into a new balanced tree in one linear
+    pass. With auto_compact that happens inside the remove() that crossed the
+    threshold, or, with background=True, in a compactor thread that remove() wakes up.
+    compact() compacts on demand. stats() reports the dead node count.
+
+    The compactor thread links new nodes and then swaps the root, so a reader walking
+    the old tree keeps seeing a consistent one. Mutations and compaction are
+    serialized by a lock.
+
+    Every node also counts the dead nodes in its subtree, kept up to date by rotations
+    and rebalancing like the subtree sizes. rank(), select() and count_range() subtract
+    them on the way down and stay O(log n) without compacting. split(), join() and the
+    set operations carry dead nodes along like live ones.
+    """
+    _node_class = TombstoneNode
+
+    def __init__(self, start_tree=None, bulk=False, threshold=0.25, min_dead=64,
+                 auto_compact=True, background=False) -> None:
+        """
+        Initialize a new tree. threshold is the fraction of dead nodes that triggers a
+        compaction, min_dead the smallest number of dead nodes worth compacting.
+        """
+        self.threshold = threshold
+        self.min_dead = min_dead
+        self.auto_compact = auto_compact
+        self.compactions = 0
+        self._dead = 0
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._compactor = None
+        super().__init__(start_tree, bulk)
+        if background:
+            self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+            self._compactor.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the compactor thread, if there is one
+        """
+        if self._compactor is not None:
+            self._closing = True
+            self._wakeup.set()
+            self._compactor.join()
+            self._compactor = None
+
+    def __len__(self) -> int:
+        """
+        Return the number of live values
+        """
+        return super().__len__() - self._dead
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+    def stats(self) -> dict:
+        """
+        Returns the live and dead node counts and the number of compactions so far
+        """
+        physical = super().__len__()
+        return {'live': physical - self._dead, 'dead': self._dead,
+                'dead_fraction': self._dead / physical if physical else 0.0,
+                'compactions': self.compactions}
+
+    # ------------------- MUTATIONS -----------------------------------------
+
+    def add(self, value: object) -> None:
+        """
+        Adds value to the tree, reviving its node if value was removed before
+        """
+        with self._lock:
+            node, created = self._insert(value)
+            if not created and node.dead:
+                self._mark(node, False)
+
+    def remove(self, value: object) -> bool:
+        """
+        Marks the node holding value dead. Returns True if value was in the tree,
+        False otherwise.
+        """
+        with self._lock:
+            self.last_touched = 0
+            node = self._find_node(value)
+            if node is None or node.dead:
+                return False
+            self._mark(node, True)
+            if self.auto_compact and self._needs_compaction():
+                if self._compactor is not None:
+                    self._wakeup.set()
+                else:
+                    self.compact()
+            return True
+
+    def add_many(self, values) -> None:
+        """
+        Adds every value like AVL.add_many(), reviving dead nodes on the way
+        """
+        with self._lock:
+            values = self._sorted_unique(values)
+            if not values:
+                return
+            if len(values) >= len(self) * self._rebuild_ratio:
+                self._merge_rebuild(values)
+                return
+            finger = None
+            for value in values:
+                finger, created = self._insert(value, self._climb(finger, value))
+                if not created and finger.dead:
+                    self._mark(finger, False)
+
+    def remove_many(self, values) -> int:
+        """
+        Removes every value and returns how many were found. Small batches mark nodes
+        dead, large ones rebuild without them (and without any earlier dead nodes).
+        """
+        with self._lock:
+            values = self._sorted_unique(values)
+            if len(values) >= len(self) * self._rebuild_ratio:
+                return self._filter_rebuild(values)
+            #marking never moves a node, so every search can start from the previous one
+            self.last_touched = 0
+            removed = 0
+            finger = None
+            for value in values:
+                finger = self.find(self._climb(finger, value) or self.root, value, False)
+                if finger is not None and finger.value == value and not finger.dead:
+                    self._mark(finger, True)
+                    removed += 1
+            if removed and self.auto_compact and self._needs_compaction():
+                if self._compactor is not None:
+                    self._wakeup.set()
+                else:
+                    self.compact()
+            return removed
+
+    def _mark(self, node, dead) -> None:
+        """
+        Helper that marks node dead, or alive again, and updates the dead counts of node
+        and its ancestors. Every change of a value's presence that doesn't link or
+        unlink a node goes through here, which is where the lookup cache hooks in.
+        """
+        node.dead = dead
+        delta = 1 if dead else -1
+        self._dead += delta
+        while node is not None:
+            node.dead_count += delta
+            node = node.parent
+
+    def _wrap_lookup_cache(self, cache):
+        """
+        AVL._wrap_lookup_cache() plus _mark(), so removing (reviving) a value updates its
+        cache entry even though no node is unlinked (linked)
+        """
+        wrappers = super()._wrap_lookup_cache(cache)
+        mark = self._mark
+
+        def cached_mark(node, dead):
+            mark(node, dead)
+            cache.update(node.value, not dead)
+        wrappers['_mark'] = cached_mark
+        return wrappers
+
+    def pop_min(self) -> object:
+        with self._lock:
+            return super().pop_min()
+
+    def pop_max(self) -> object:
+        with self._lock:
+            return super().pop_max()
+
+    def make_empty(self) -> None:
+        with self._lock:
+            super().make_empty()
+
+    # ------------------- COMPACTION ----------------------------------------
+
+    def _needs_compaction(self) -> bool:
+        dead = self._dead
+        return dead >= self.min_dead and dead >= self.threshold * super().__len__()
+
+    def compact(self) -> None:
+        """
+        Rebuilds the tree from its live nodes in one linear pass, dropping every dead
+        node. With a compactor thread the new tree is linked from new nodes before it
+        replaces the old root, so readers in other threads never see a half relinked
+        tree; otherwise the live nodes are relinked in place, which saves allocating them.
+        """
+        with self._lock:
+            if not self._dead:
+                return
+            if self._compactor is not None:
+                self._relink([self._node_class(value) for value in self.irange()])
+            else:
+                self._relink(list(self._iter_nodes()))
+            self.compactions += 1
+
+    def _compact_loop(self) -> None:
+        """
+        Compactor thread, compacts whenever remove() wakes it up until close()
+        """
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closing:
+                return
+            with self._lock:
+                if self._needs_compaction():
+                    self.compact()
+
+    def _after_rebuild(self):
+        """
+        Helper called after the tree was restructured as a whole. Rebuilds link only
+        live nodes, splits, joins and set operations may keep dead ones.
+        """
+        super()._after_rebuild()
+        self._dead = self.root.dead_count if self.root is not None else 0
+
+    # ------------------- DEAD COUNTS ---------------------------------------
+
+    def _count_dead(self, node) -> bool:
+        """
+        Helper that recalculates the dead count of node from its children. Returns True
+        if the stored count changed.
+        """
+        count = (node.left.dead_count if node.left is not None else 0) + \
+            (node.right.dead_count if node.right is not None else 0) + node.dead
+        if node.dead_count != count:
+            node.dead_count = count
+            return True
+        return False
+
+    def updateHeight(self, node):
+        """
+        AVL.updateHeight() that also recalculates the dead count. The rotations and
+        join() update every node they move through here.
+        """
+        self._count_dead(node)
+        return super().updateHeight(node)
+
+    def rebalance(self, node):
+        """
+        Brings the dead counts from node up to date (stopping at the first ancestor
+        whose count stays the same), then rebalances like AVL.rebalance()
+        """
+        cur = node
+        while cur is not None and self._count_dead(cur):
+            cur = cur.parent
+        super().rebalance(node)
+
+    def _splice_successor(self, node):
+        """
+        AVL._splice_successor(), the successor takes over the dead count of the
+        position it moves into, minus node itself
+        """
+        count = node.dead_count - node.dead
+        succ = node.right
+        while succ.left is not None:
+            succ = succ.left
+        start = super()._splice_successor(node)
+        succ.dead_count = count
+        return start
+
+    def _relink(self, nodes):
+        """
+        AVL._relink(). Every rebuild links only live nodes (new ones, or reused ones from
+        _iter_nodes()), so their dead counts are all zero afterwards.
+        """
+        for node in nodes:
+            node.dead_count = 0
+        super()._relink(nodes)
+
+    def _violation(self, node, lo, hi):
+        """
+        AVL._violation() plus the dead count of node against its children
+        """
+        found = super()._violation(node, lo, hi)
+        if found is None and node.dead_count != (node.left.dead_count if node.left is not None else 0) + \
+                (node.right.dead_count if node.right is not None else 0) + node.dead:
+            return 'size', 'dead count {} does not match its children'.format(node.dead_count)
+        return found
+
+    # ------------------- READS ---------------------------------------------
+
+    def contains(self, value: object) -> bool:
+        """
+        Returns True if value is in the tree and not removed
+        """
+        node = self._find_node(value)
+        return node is not None and not node.dead
+
+    def contains_many(self, values):
+        """
+        Like AVL.contains_many(), values whose node is dead are reported missing
+        """
+        if not hasattr(values, 'tolist'):
+            values = list(values)
+        found = super().contains_many(values)
+        if self._dead:
+            for i in range(len(found)):
+                if found[i] and self._find_node(values[i]).dead:
+                    found[i] = False
+        return found
+
+    def _iter_nodes(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        AVL._iter_nodes() without the dead nodes, which is what iteration, irange(),
+        copy() and the rebuilding batch methods go through
+        """
+        for node in super()._iter_nodes(lo, hi, inclusive, reverse):
+            if not node.dead:
+                yield node
+
+    def inorder_traversal(self) -> Queue:
+        """
+        Returns a Queue with the live values in sorted order
+        """
+        q = Queue()
+        q.extend(self.irange())
+        return q
+
+    def _min(self):
+        """
+        Helper that returns the node holding the smallest live value. Dead nodes found
+        at the low end are unlinked for good, so the next call doesn't meet them again.
+        """
+        node = super()._min()
+        if node is None or not node.dead:
+            return node
+        with self._lock:
+            node = super()._min()
+            while node is not None and node.dead:
+                self._mark(node, False)
+                self._remove_node(node)
+                node = super()._min()
+            return node
+
+    def _max(self):
+        """
+        Helper that returns the node holding the largest live value, unlinking dead
+        nodes at the high end like _min()
+        """
+        node = super()._max()
+        if node is None or not node.dead:
+            return node
+        with self._lock:
+            node = super()._max()
+            while node is not None and node.dead:
+                self._mark(node, False)
+                self._remove_node(node)
+                node = super()._max()
+            return node
+
+    def _step(self, node, forward):
+        """
+        Helper that returns the inorder neighbor of node (next if forward is True,
+        previous otherwise), dead or alive, or None at the end
+        """
+        child = node.right if forward else node.left
+        if child is not None:
+            #leftmost (rightmost) node of the subtree on that side
+            node = child
+            child = node.left if forward else node.right
+            while child is not None:
+                node = child
+                child = node.left if forward else node.right
+            return node
+        #climb until we come up from the other side
+        parent = node.parent
+        while parent is not None and (parent.right if forward else parent.left) is node:
+            node, parent = parent, parent.parent
+        return parent
+
+    def _live(self, node, forward):
+        """
+        Helper that returns node if it is alive, else the first live node after it in
+        the given direction
+        """
+        while node is not None and node.dead:
+            node = self._step(node, forward)
+        return node
+
+    def _ceiling_node(self, value, inclusive):
+        return self._live(super()._ceiling_node(value, inclusive), True)
+
+    def _floor_node(self, value, inclusive):
+        return self._live(super()._floor_node(value, inclusive), False)
+
+    # ------------------- ORDER STATISTICS ----------------------------------
+
+    def _live_size(self, node):
+        """
+        Helper that returns the number of live nodes in the subtree rooted at node
+        """
+        return node.size - node.dead_count if node is not None else 0
+
+    def _rank(self, value, inclusive):
+        """
+        AVL._rank() counting only live nodes
+        """
+        count = 0
+        node = self.root
+        while node is not None:
+            if node.value > value:
+                node = node.left
+            elif node.value == value:
+                count += self._live_size(node.left)
+                return count + 1 if inclusive and not node.dead else count
+            else:
+                count += self._live_size(node.left) + (not node.dead)
+                node = node.right
+        return count
+
+    def select(self, k: int) -> object:
+        """
+        AVL.select() over the live values, skipping dead nodes on the way down. O(log n)
+        """
+        n = len(self)
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError('select index out of range')
+        node = self.root
+        while True:
+            left = self._live_size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left and not node.dead:
+                return node.value
+            else:
+                k -= left + (not node.dead)
+                node = node.right
+
+    # ------------------- STRUCTURAL OPERATIONS -----------------------------
+    # Dead nodes move with their subtrees, _join() keeps the dead counts right through
+    # updateHeight() and rebalance()
+
+    def split(self, value):
+        with self._lock:
+            found = self.contains(value)
+            smaller, _, larger = super().split(value)
+            return smaller, found, larger
+
+    def join(self, value, other) -> None:
+        with self._lock:
+            super().join(value, other)
+
+    def update(self, other) -> None:
+        with self._lock:
+            super().update(other)
+
+    def intersection_update(self, other) -> None:
+        with self._lock:
+            super().intersection_update(other)
+
+    def difference_update(self, other) -> None:
+        with self._lock:
+            super().difference_update(other)
+
+    def symmetric_difference_update(self, other) -> None:
+        with self._lock:
+            super().symmetric_difference_update(other)
+
+    def _as_tree(self, other):
+        """
+        The set operations link nodes of other into this tree, so other is always copied
+        into a TombstoneAVL (holding only its live values)
+        """
+        tree = self._new_tree()
+        tree._bulk_load(other)
+        return tree
+
+    def _new_tree(self):
+        """
+        A new tree takes over threshold, min_dead and auto_compact (but never starts a
+        compactor thread of its own)
+        """
+        return self.__class__(threshold=self.threshold, min_dead=self.min_dead,
+                              auto_compact=self.auto_compact)
+
+    def _union(self, a, b):
+        """
+        AVL._union(), a dead node of a whose value is in b comes back to life
+        """
+        if a is None:
+            return b
+        if b is None:
+            return a
+        al, ar = self._detach(a)
+        bl, dup, br = self._split(b, a.value)
+        if dup is not None and a.dead:
+            a.dead = False
+        return self._join(self._union(al, bl), a, self._union(ar, br))
+
+    def _symmetric_difference(self, a, b):
+        """
+        AVL._symmetric_difference(), a dead node of a counts as missing, so the node of b
+        holding the same value is kept instead
+        """
+        if a is None:
+            return b
+        if b is None:
+            return a
+        al, ar = self._detach(a)
+        bl, dup, br = self._split(b, a.value)
+        left, right = self._symmetric_difference(al, bl), self._symmetric_difference(ar, br)
+        if dup is None:
+            return self._join(left, a, right)
+        if a.dead:
+            return self._join(left, dup, right)
+        return self._join2(left, right)
+
+
+class MapNode(TreeNode):
+    """
+    AVL Tree Node for AVLMap. value holds the key, data holds the payload stored under it.
+    """
+    def __init__(self, value: object, data: object = None) -> None:
+        """
+        Initialize a new map node
+        """
+        super().__init__(value)
+        self.data = data
+
+    def __str__(self):
+        return 'AVL Node: {}: {}'.format(self.value, self.data)
+
+
+# marks a missing default argument, since None is a valid default
+_MISSING = object()
+
+
+class AVLMap(AVL):
+    """
+    Ordered key/value map built on the AVL tree. Keys live in the tree exactly like
+    AVL values do and each node also carries the payload for its key, so a lookup
+    is a single descent. Assigning to an existing key only replaces the payload and
+    never restructures the tree. Iteration (keys(), values(), items(), iter())
+    is in key order.
+    """
+    _node_class = MapNode
+
+    def __init__(self, items=None, bulk=False) -> None:
+        """
+        Initialize a new map from a mapping or an iterable of (key, data) pairs. Later
+        pairs win over earlier ones with the same key, like a dict. If bulk is True the
+        pairs are sorted once and linked in a single pass.
+        """
+        super().__init__()
+        if items is None:
+            return
+        if hasattr(items, 'items'):
+            items = items.items()
+        if not bulk:
+            for key, data in items:
+                self[key] = data
+            return
+        #stable sort keeps equal keys in input order, so the last one seen wins
+        nodes = []
+        for key, data in sorted(items, key=lambda pair: pair[0]):
+            if nodes and nodes[-1].value == key:
+                nodes[-1].data = data
+            else:
+                nodes.append(self._node_class(key, data))
+        self._relink(nodes)
+
+    def __getitem__(self, key):
+        """
+        Return the data stored under key, raises KeyError if key is not in the map
+        """
+        node = self._find_node(key)
+        if node is None:
+            raise KeyError(key)
+        return node.data
+
+    def __setitem__(self, key, data) -> None:
+        """
+        Store data under key, replacing the data of an existing key in place
+        """
+        node = self._insert(key)[0]
+        node.data = data
+
+    def __delitem__(self, key) -> None:
+        """
+        Remove key and its data, raises KeyError if key is not in the map
+        """
+        node = self._find_node(key)
+        if node is None:
+            raise KeyError(key)
+        self._remove_node(node)
+
+    def get(self, key, default=None):
+        """
+        Return the data stored under key, or default if key is not in the map
+        """
+        node = self._find_node(key)
+        return default if node is None else node.data
+
+    def setdefault(self, key, default=None):
+        """
+        Return the data stored under key. If key is not in the map, store default under
+        it first. Either way the tree is only searched once.
+        """
+        node, created = self._insert(key)
+        if created:
+            node.data = default
+        return node.data
+
+    def pop(self, key, default=_MISSING):
+        """
+        Remove key and return its data. If key is not in the map return default, or
+        raise KeyError if no default was given.
+        """
+        node = self._find_node(key)
+        if node is None:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        self._remove_node(node)
+        return node.data
+
+    def keys(self):
+        """
+        Generator over the keys in sorted order
+        """
+        return self.irange()
+
+    def values(self):
+        """
+        Generator over the data in key order
+        """
+        for node in self._iter_nodes():
+            yield node.data
+
+    def _clone_node(self, node):
+        """
+        Helper for copy() that returns a new, unlinked node with the key and data of node
+        """
+        return self._node_class(node.value, node.data)
+
+    def dump(self, path, checksum=True) -> None:
+        """
+        Not supported: the dump format only holds the keys, the data would be lost.
+        AVLMap.load() still reads an AVL dump, every key gets None as its data.
+        """
+        raise TypeError('AVLMap.dump() would drop the data, dump an AVL of the keys instead')
+
+    def freeze(self, layout='sorted'):
+        """
+        Not supported: a FrozenAVL only holds the keys, thaw() would lose the data
+        """
+        raise TypeError('AVLMap.freeze() would drop the data, freeze an AVL of the keys instead')
+
+    def update(self, other) -> None:
+        """
+        Stores every key of other (a mapping, an AVLMap or an iterable of (key, data)
+        pairs) with its data, like dict.update(). Data from other wins for shared keys.
+        Merges whole subtrees with split() and join() like AVL.update().
+        """
+        if isinstance(other, AVL) and not isinstance(other, AVLMap):
+            raise TypeError('AVLMap.update() needs a mapping or (key, data) pairs, not {}'.format(
+                type(other).__name__))
+        if not isinstance(other, AVLMap):
+            other = AVLMap(other, bulk=True)
+        self.root = self._union(other.copy().root, self.root)
+        self._after_rebuild()
+
+    def _as_tree(self, other):
+        """
+        The other set operations work on keys: an AVLMap is copied with its data, a
+        mapping keeps its data, and any other iterable (a plain AVL too) gives its
+        values as keys with None as their data
+        """
+        if isinstance(other, AVLMap):
+            return other.copy()
+        if hasattr(other, 'items'):
+            return self.__class__(other, bulk=True)
+        return self._from_unique(self._sorted_unique(other))
+
+    def items(self):
+        """
+        Generator over (key, data) pairs in key order
+        """
+        for node in self._iter_nodes():
+            yield node.value, node.data
+
+
+class PersistentNode:
+    """
+    Immutable AVL Tree Node for PersistentAVL. There is no parent pointer, so a node
+    can be shared by any number of tree versions. Height and size are computed from
+    the children when the node is created and never change afterwards.
+    """
+    __slots__ = ('value', 'left', 'right', 'height', 'size')
+
+    def __init__(self, value: object, left=None, right=None) -> None:
+        """
+        Initialize a new node above the (already built) subtrees left and right
+        """
+        self.value = value
+        self.left = left
+        self.right = right
+        l = left.height if left is not None else -1
+        r = right.height if right is not None else -1
+        self.height = (l if l > r else r) + 1
+        self.size = (left.size if left is not None else 0) + \
+                    (right.size if right is not None else 0) + 1
+
+    def __str__(self):
+        return 'AVL Node: {}'.format(self.value)
+
+
+class PersistentAVL:
+    """
+    Persistent (path copying) AVL tree. A version is never modified: add() and remove()
+    return a new version that shares every untouched subtree with the old one and
+    allocates only the O(log n) nodes on the changed path (plus the rotated ones).
+    Old versions stay valid and can be read from other threads while new ones are made.
+    """
+    def __init__(self, start_tree=None, bulk=False) -> None:
+        """
+        Initialize a new tree version from the values in start_tree. If bulk is True
+        the values are sorted once and linked in O(n) instead of added one by one.
+        """
+        self.root = None
+        if start_tree is None:
+            return
+        if bulk:
+            values = []
+            for value in sorted(start_tree):
+                if not values or values[-1] != value:
+                    values.append(value)
+            self.root = self._link_sorted(values, 0, len(values) - 1)
+        else:
+            version = self
+            for value in start_tree:
+                version = version.add(value)
+            self.root = version.root
+
+    @classmethod
+    def _version(cls, root):
+        """
+        Helper that wraps root in a new tree version without copying anything
+        """
+        tree = cls()
+        tree.root = root
+        return tree
+
+    def _link_sorted(self, values, lo, hi):
+        """
+        Helper for the bulk constructor. Builds a balanced subtree from values[lo..hi]
+        """
+        if lo > hi:
+            return None
+        mid = (lo + hi + 1) // 2
+        return PersistentNode(values[mid], self._link_sorted(values, lo, mid - 1),
+                              self._link_sorted(values, mid + 1, hi))
+
+    def __str__(self) -> str:
+        """
+        Return content of the tree in human-readable form using pre-order traversal
+        """
+        values = []
+        stack = [self.root]
+        while stack:
+            cur = stack.pop()
+            if cur:
+                values.append(str(cur.value))
+                stack.append(cur.right)
+                stack.append(cur.left)
+        return "AVL pre-order { " + ", ".join(values) + " }"
+
+    def __len__(self) -> int:
+        return self.root.size if self.root is not None else 0
 
-    def inorder_helper(self, node, q):
+    def __iter__(self):
+        return self.irange()
+
+    def __reversed__(self):
+        return self.irange(reverse=True)
+
+    def __contains__(self, value: object) -> bool:
+        return self.contains(value)
+
+    def snapshot(self):
         """
-        Recursive helper to inorder_traversal()
+        Returns a version that will never change, in O(1). Versions are immutable, so
+        this is the version itself.
         """
-        if node is not None:
-            # traverse to node.left then process current node
-            self.inorder_helper(node.left, q)
-            q.enqueue(node.value)
-            #once leftmost node is processed, process right node
-            self.inorder_helper(node.right, q)
+        return self
+
+    def is_valid_avl(self) -> bool:
+        """
+        Returns False if any node has a wrong height or size, is out of balance or is
+        out of order
+        """
+        stack = [(self.root, None, None)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if node is None:
+                continue
+            if (lo is not None and not node.value > lo) or (hi is not None and not node.value < hi):
+                return False
+            l = node.left.height if node.left else -1
+            r = node.right.height if node.right else -1
+            if node.height != 1 + max(l, r) or abs(l - r) > 1:
+                return False
+            if node.size != (node.left.size if node.left else 0) + (node.right.size if node.right else 0) + 1:
+                return False
+            stack.append((node.left, lo, node.value))
+            stack.append((node.right, node.value, hi))
+        return True
+
+    # -----------------------------------------------------------------------
+
+    def _balance(self, value, left, right):
+        """
+        Helper that returns a new node holding value above left and right, rotating
+        (by building new nodes) if their heights differ by 2
+        """
+        hl = left.height if left is not None else -1
+        hr = right.height if right is not None else -1
+        #Left heavy, check if LL or LR
+        if hl - hr > 1:
+            ll = left.left.height if left.left is not None else -1
+            lr = left.right.height if left.right is not None else -1
+            if lr > ll:
+                pivot = left.right
+                return PersistentNode(pivot.value, PersistentNode(left.value, left.left, pivot.left),
+                                      PersistentNode(value, pivot.right, right))
+            return PersistentNode(left.value, left.left, PersistentNode(value, left.right, right))
+        #Right heavy, check if RR or RL
+        if hr - hl > 1:
+            rl = right.left.height if right.left is not None else -1
+            rr = right.right.height if right.right is not None else -1
+            if rl > rr:
+                pivot = right.left
+                return PersistentNode(pivot.value, PersistentNode(value, left, pivot.left),
+                                      PersistentNode(right.value, pivot.right, right.right))
+            return PersistentNode(right.value, PersistentNode(value, left, right.left), right.right)
+        return PersistentNode(value, left, right)
+
+    def _insert(self, node, value):
+        """
+        Helper for add(). Returns the new root of the subtree node with value added, or
+        node itself if value was already there.
+        """
+        if node is None:
+            return PersistentNode(value)
+        if node.value > value:
+            left = self._insert(node.left, value)
+            if left is node.left:
+                return node
+            return self._balance(node.value, left, node.right)
+        if node.value == value:
+            return node
+        right = self._insert(node.right, value)
+        if right is node.right:
+            return node
+        return self._balance(node.value, node.left, right)
+
+    def _delete(self, node, value):
+        """
+        Helper for remove(). Returns the new root of the subtree node without value, or
+        node itself if value was not there.
+        """
+        if node is None:
+            return None
+        if node.value > value:
+            left = self._delete(node.left, value)
+            if left is node.left:
+                return node
+            return self._balance(node.value, left, node.right)
+        if node.value == value:
+            if node.left is None:
+                return node.right
+            if node.right is None:
+                return node.left
+            #replace the value with its inorder successor
+            right, succ = self._delete_min(node.right)
+            return self._balance(succ.value, node.left, right)
+        right = self._delete(node.right, value)
+        if right is node.right:
+            return node
+        return self._balance(node.value, node.left, right)
+
+    def _delete_min(self, node):
+        """
+        Helper for _delete(). Returns (subtree without its smallest node, smallest node)
+        """
+        if node.left is None:
+            return node.right, node
+        left, smallest = self._delete_min(node.left)
+        return self._balance(node.value, left, node.right), smallest
+
+    def add(self, value: object):
+        """
+        Returns a version of the tree that also contains value (this version if value was
+        already in the tree)
+        """
+        root = self._insert(self.root, value)
+        return self if root is self.root else self._version(root)
+
+    def add_many(self, values):
+        """
+        Returns a version of the tree that also contains every value of values
+        """
+        root = self.root
+        for value in values:
+            root = self._insert(root, value)
+        return self if root is self.root else self._version(root)
+
+    def remove(self, value: object):
+        """
+        Returns a version of the tree without value (this version if value was not in
+        the tree)
+        """
+        root = self._delete(self.root, value)
+        return self if root is self.root else self._version(root)
+
+    def remove_many(self, values):
+        """
+        Returns a version of the tree without any of the values
+        """
+        root = self.root
+        for value in values:
+            root = self._delete(root, value)
+        return self if root is self.root else self._version(root)
+
+    def contains(self, value: object) -> bool:
+        """
+        This method returns True if the value parameter is in the tree or False if it is not
+        """
+        node = self.root
+        while node is not None:
+            if node.value > value:
+                node = node.left
+            elif node.value == value:
+                return True
+            else:
+                node = node.right
+        return False
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        Generator over the values between lo and hi in sorted order, same as AVL.irange()
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        stack = []
+        node = self.root
+        near, far = ('left', 'right') if not reverse else ('right', 'left')
+        #seek the first value in range, stacking the nodes still to be visited
+        while node is not None:
+            if not reverse:
+                inside = lo is None or node.value > lo or (lo_inclusive and node.value == lo)
+            else:
+                inside = hi is None or node.value < hi or (hi_inclusive and node.value == hi)
+            if inside:
+                stack.append(node)
+                node = getattr(node, near)
+            else:
+                node = getattr(node, far)
+        while stack:
+            node = stack.pop()
+            if not reverse:
+                if hi is not None and (node.value > hi or (not hi_inclusive and node.value == hi)):
+                    return
+            elif lo is not None and (node.value < lo or (not lo_inclusive and node.value == lo)):
+                return
+            yield node.value
+            node = getattr(node, far)
+            while node is not None:
+                stack.append(node)
+                node = getattr(node, near)
+
+    def inorder_traversal(self) -> Queue:
+        """
+        Returns a Queue with the values of the tree in sorted order
+        """
+        q = Queue()
+        for value in self:
+            q.enqueue(value)
         return q
 
     def find_min(self) -> object:
         """
-        This method returns the smallest value in the tree
+        This method returns the smallest value in the tree (None if the tree is empty)
         """
         node = self.root
-        #returns None if tree is empty
         if node is None:
             return
-        #traverse left, returning leftmost value
         while node.left is not None:
             node = node.left
         return node.value
-       
 
     def find_max(self) -> object:
         """
-        This method returns the highest value in the tree
+        This method returns the largest value in the tree (None if the tree is empty)
         """
         node = self.root
-        #returns none if tree is empty
         if node is None:
             return
-        #Traverse right, returning rightmost value
         while node.right is not None:
-            node = node.right   
+            node = node.right
         return node.value
-    
+
     def is_empty(self) -> bool:
         """
-        This method returns true if the tree is empty, otherwise returns false
+        This method returns True if the tree is empty, otherwise returns False
         """
-        #If the tree doesn't have a root, the tree is empty
-        if self.root is None:
-            return True
-        return False
+        return self.root is None
 
-    def make_empty(self) -> None:
+
+# ------------------- FROZEN INDEX ------------------------------------------
+
+
+class FrozenAVL:
+    """
+    Static, NumPy backed index over the values of a tree, made by AVL.freeze(). Every
+    query method takes an array (or anything NumPy turns into one) of query keys and
+    answers all of them in one vectorized call, no Python code runs per key.
+
+    Layouts
+    - 'sorted': the values in one sorted array, searched with numpy.searchsorted()
+    - 'eytzinger': the values additionally stored in BFS order of a complete binary
+      tree (node k has children 2k and 2k + 1), which every query descends level by
+      level. The top levels are shared by all queries and stay in the CPU cache.
+
+    thaw() turns the index back into a mutable tree.
+    """
+    LAYOUTS = ('sorted', 'eytzinger')
+
+    def __init__(self, keys, layout='sorted', tree_class=None) -> None:
         """
-        This method removes all of the nodes from the tree
+        keys must be a sorted NumPy array without duplicates
         """
-        if self.is_empty() == True:
-            return
-        #recursively remove the root until tree is empty
-        self.removeRoot()
-        self.make_empty()
-        
+        if layout not in self.LAYOUTS:
+            raise ValueError('layout must be one of {}'.format(', '.join(self.LAYOUTS)))
+        self.keys = keys
+        self.layout = layout
+        self._tree_class = tree_class or AVL
+        if layout == 'eytzinger':
+            self._build_eytzinger()
+
+    def _build_eytzinger(self) -> None:
+        """
+        Helper that fills self._eytzinger (1-based, slot 0 unused) with the keys in BFS
+        order and self._rank_of with the sorted position of the key in every slot (slot
+        0, meaning past the end, maps to len(keys))
+        """
+        n = len(self.keys)
+        slots = array('q')
+        #inorder walk of the implicit tree gives the slot of every sorted position
+        stack = []
+        k = 1
+        while stack or k <= n:
+            while k <= n:
+                stack.append(k)
+                k *= 2
+            k = stack.pop()
+            slots.append(k)
+            k = 2 * k + 1
+        slots = numpy.frombuffer(slots, dtype=numpy.int64)
+        self._eytzinger = numpy.empty(n + 1, dtype=self.keys.dtype)
+        self._eytzinger[slots] = self.keys
+        self._rank_of = numpy.empty(n + 1, dtype=numpy.int64)
+        self._rank_of[slots] = numpy.arange(n)
+        self._rank_of[0] = n
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys.tolist())
+
+    def __contains__(self, value: object) -> bool:
+        return bool(self.contains(value))
+
+    def thaw(self):
+        """
+        Returns a mutable tree (of the class that was frozen) with the same values, O(n)
+        """
+        return self._tree_class._from_unique(self.keys.tolist())
+
+    def _search(self, queries, right):
+        """
+        Helper that returns, for every query, how many keys are smaller than it (or
+        smaller than or equal to it if right is True)
+        """
+        queries = numpy.asarray(queries)
+        if self.layout == 'sorted':
+            return numpy.searchsorted(self.keys, queries, 'right' if right else 'left')
+        tree = self._eytzinger
+        n = len(tree) - 1
+        flat = queries.ravel()
+        k = numpy.ones(len(flat), dtype=numpy.int64)
+        #descend: go right while the slot is below the query (or equal, for right)
+        for _ in range(n.bit_length()):
+            inside = k <= n
+            keys = tree[numpy.where(inside, k, 1)]
+            step = keys <= flat if right else keys < flat
+            k = numpy.where(inside, 2 * k + step, k)
+        #k fell off the tree, the answer is where the last left turn was taken:
+        #strip the trailing one bits (right turns) and the zero bit before them
+        k //= 2 * (~k & (k + 1))
+        return self._rank_of[k].reshape(queries.shape)
+
+    def rank(self, queries):
+        """
+        Returns the number of keys smaller than each query (AVL.rank())
+        """
+        return self._search(queries, False)
+
+    def contains(self, queries):
+        """
+        Returns a bool array saying whether each query is a key
+        """
+        queries = numpy.asarray(queries)
+        n = len(self.keys)
+        if n == 0:
+            return numpy.zeros(queries.shape, dtype=bool)
+        position = self._search(queries, False)
+        return (position < n) & (self.keys[numpy.minimum(position, n - 1)] == queries)
+
+    def floor(self, queries):
+        """
+        Returns the largest key smaller than or equal to each query, as a masked array
+        with the queries that have no floor masked out (AVL.floor() returns None there)
+        """
+        return self._pick(self._search(queries, True) - 1)
+
+    def ceiling(self, queries):
+        """
+        Returns the smallest key larger than or equal to each query, as a masked array
+        with the queries that have no ceiling masked out
+        """
+        return self._pick(self._search(queries, False))
+
+    def successor(self, queries):
+        """
+        Returns the smallest key larger than each query, masked where there is none
+        """
+        return self._pick(self._search(queries, True))
+
+    def predecessor(self, queries):
+        """
+        Returns the largest key smaller than each query, masked where there is none
+        """
+        return self._pick(self._search(queries, False) - 1)
+
+    def _pick(self, positions):
+        """
+        Helper that returns the keys at positions as a masked array, masking the
+        positions outside the key array
+        """
+        n = len(self.keys)
+        missing = (positions < 0) | (positions >= n)
+        if n == 0:
+            return numpy.ma.masked_array(numpy.zeros(positions.shape, dtype=self.keys.dtype), mask=True)
+        return numpy.ma.masked_array(self.keys[numpy.clip(positions, 0, n - 1)], mask=missing)
+
+    def count_range(self, lo, hi, inclusive=(True, True)):
+        """
+        Returns how many keys lie between lo and hi for every pair of bounds (arrays or
+        scalars, broadcast against each other), like AVL.count_range()
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        count = self._search(hi, hi_inclusive) - self._search(lo, not lo_inclusive)
+        return numpy.maximum(count, 0)
+
+
+# ------------------- BINARY FORMAT -----------------------------------------
+#
+# AVL.dump() writes the values in sorted order behind a fixed 24 byte header:
+#
+#   magic   4s   b'AVLB'
+#   version u16  _FORMAT_VERSION
+#   type    u8   one of _KEY_TYPES
+#   flags   u8   _FLAG_CHECKSUM if checksum holds the CRC-32 of the payload
+#   count   u64  number of values
+#   crc     u32  CRC-32 of everything after the header (0 without checksum)
+#   (4 padding bytes, so the payload is 8 byte aligned for memory mapping)
+#
+# int and float values follow as count little-endian int64 / float64. bytes and str
+# (UTF-8) values follow as count + 1 uint64 offsets into the data that comes after.
+
+_MAGIC = b'AVLB'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHBBQI4x')
+_FLAG_CHECKSUM = 1
+_KEY_TYPES = {int: 1, float: 2, bytes: 3, str: 4}
+_KEY_CODES = {code: key_type for key_type, code in _KEY_TYPES.items()}
+
+
+def _encode_values(values):
+    """
+    Returns (type code, payload bytes) for a sorted list of values of one type
+    """
+    key_type = type(values[0]) if values else int
+    if key_type not in _KEY_TYPES or any(type(value) is not key_type for value in values):
+        raise TypeError('dump() needs values that are all int, all float, all bytes or all str')
+    if key_type in (int, float):
+        data = array('q' if key_type is int else 'd', values)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return _KEY_TYPES[key_type], data.tobytes()
+    if key_type is str:
+        values = [value.encode('utf-8') for value in values]
+    offsets = array('Q', [0])
+    total = 0
+    for value in values:
+        total += len(value)
+        offsets.append(total)
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    return _KEY_TYPES[key_type], offsets.tobytes() + b''.join(values)
+
+
+def _write_dump(path, values, checksum=True, sync=False):
+    """
+    Writes the sorted list values to path in the dump format. With sync the file is
+    flushed to disk before returning.
+    """
+    code, payload = _encode_values(values)
+    crc = zlib.crc32(payload) if checksum else 0
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, code,
+                          _FLAG_CHECKSUM if checksum else 0, len(values), crc)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_header(buffer, verify):
+    """
+    Checks the header at the start of buffer and that the payload has the size count
+    values need (and the checksum if verify is True). Returns (key type, count).
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError('not an AVL dump: file too short')
+    magic, version, code, flags, count, crc = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC:
+        raise ValueError('not an AVL dump: bad magic {!r}'.format(magic))
+    if version != _FORMAT_VERSION:
+        raise ValueError('unsupported AVL dump version {}'.format(version))
+    if code not in _KEY_CODES:
+        raise ValueError('unknown key type code {}'.format(code))
+    key_type = _KEY_CODES[code]
+    payload = len(buffer) - _HEADER.size
+    if key_type in (int, float):
+        if payload != 8 * count:
+            raise ValueError('AVL dump truncated: {} values need {} bytes, found {}'.format(
+                count, 8 * count, payload))
+    else:
+        #the offset table has to fit and its last offset has to end the data exactly
+        table = 8 * (count + 1)
+        if payload < table:
+            raise ValueError('AVL dump truncated: {} offsets need {} bytes, found {}'.format(
+                count + 1, table, payload))
+        first, last = struct.unpack_from('<Q', buffer, _HEADER.size)[0], \
+            struct.unpack_from('<Q', buffer, _HEADER.size + table - 8)[0]
+        if first != 0:
+            raise ValueError('not an AVL dump: offset table starts at {}'.format(first))
+        if last != payload - table:
+            raise ValueError('AVL dump truncated: offsets end at {}, data has {} bytes'.format(
+                last, payload - table))
+    if verify and flags & _FLAG_CHECKSUM and zlib.crc32(memoryview(buffer)[_HEADER.size:]) != crc:
+        raise ValueError('AVL dump checksum mismatch')
+    return key_type, count
+
+
+class _PackedValues:
+    """
+    Read-only sequence over the values of a dump held in buffer (bytes or a memory map).
+    Supports len() and indexing, which is all bisect needs, and decodes each value only
+    when it is looked at.
+    """
+    def __init__(self, buffer, key_type, count) -> None:
+        self._type = key_type
+        self._count = count
+        view = memoryview(buffer)[_HEADER.size:]
+        if key_type in (int, float):
+            self._numbers = view[:8 * count].cast('q' if key_type is int else 'd')
+            if sys.byteorder == 'big':
+                swapped = array(self._numbers.format, self._numbers.tobytes())
+                swapped.byteswap()
+                self._numbers = swapped
+        else:
+            self._numbers = None
+            offsets = view[:8 * (count + 1)].cast('Q')
+            if sys.byteorder == 'big':
+                offsets = array('Q', offsets.tobytes())
+                offsets.byteswap()
+            self._offsets = offsets
+            self._data = view[8 * (count + 1):]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if self._numbers is not None:
+            return self._numbers[i]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('index out of range')
+        value = bytes(self._data[self._offsets[i]:self._offsets[i + 1]])
+        return value.decode('utf-8') if self._type is str else value
+
+    def release(self) -> None:
+        """
+        Drops the views into the buffer so a memory map can be closed
+        """
+        for name in ('_numbers', '_offsets', '_data'):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+
+    def tolist(self):
+        if self._numbers is not None:
+            return self._numbers.tolist()
+        return [self[i] for i in range(self._count)]
+
+
+class MappedAVL:
+    """
+    Read-only view of a file written by AVL.dump(). The file is memory mapped and every
+    query is a binary search straight over the mapped, sorted values, so opening is
+    O(1) (O(n) with verify=True, which checks the checksum) and no node objects are
+    ever built. Pages are only read from disk when a query touches them.
+    """
+    def __init__(self, path, verify=False) -> None:
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #an empty file can't be mapped, _read_header() reports it
+            self._map = b''
+        try:
+            key_type, count = _read_header(self._map, verify)
+        except Exception:
+            #not a dump, don't leak the mapping and the file
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            self._file.close()
+            raise
+        self._values = _PackedValues(self._map, key_type, count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the file. The view can't be used afterwards.
+        """
+        self._values.release()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self):
+        return self.irange()
+
+    def __reversed__(self):
+        return self.irange(reverse=True)
+
+    def __contains__(self, value: object) -> bool:
+        return self.contains(value)
+
+    def contains(self, value: object) -> bool:
+        """
+        This method returns True if value is in the dump. O(log n)
+        """
+        i = bisect_left(self._values, value)
+        return i < len(self._values) and self._values[i] == value
+
+    def find_min(self) -> object:
+        return self._values[0] if len(self._values) else None
+
+    def find_max(self) -> object:
+        return self._values[-1] if len(self._values) else None
+
+    def is_empty(self) -> bool:
+        return len(self._values) == 0
+
+    def _bounds(self, lo, hi, inclusive):
+        """
+        Helper that returns the index range [start, stop) of the values between lo and hi
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        values = self._values
+        start = 0 if lo is None else (bisect_left if lo_inclusive else bisect_right)(values, lo)
+        stop = len(values) if hi is None else (bisect_right if hi_inclusive else bisect_left)(values, hi)
+        return start, max(start, stop)
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        Generator over the values between lo and hi in sorted order, same as AVL.irange()
+        """
+        start, stop = self._bounds(lo, hi, inclusive)
+        indexes = range(start, stop) if not reverse else range(stop - 1, start - 1, -1)
+        for i in indexes:
+            yield self._values[i]
+
+    def count_range(self, lo: object, hi: object, inclusive=(True, True)) -> int:
+        start, stop = self._bounds(lo, hi, inclusive)
+        return stop - start
+
+    def rank(self, value: object) -> int:
+        return bisect_left(self._values, value)
+
+    def select(self, k: int) -> object:
+        return self._values[k]
+
+    def thaw(self):
+        """
+        Returns a mutable AVL with the values of the dump, built in O(n)
+        """
+        return AVL._from_unique(self._values.tolist())
 
 
 # ------------------- BASIC TESTING -----------------------------------------
@@ -632,6 +3538,492 @@ if __name__ == '__main__':
             raise Exception("PROBLEM WITH ADD OPERATION")
     print('add() stress test finished')
 
+    print("\nmethod add() last_touched example")
+    print("---------------------------------")
+    for case in (range(1024), random.sample(range(1024), 1024)):
+        avl = AVL()
+        touched = 0
+        for value in case:
+            avl.add(value)
+            touched += avl.last_touched
+        print('height:', avl.root.height, 'average nodes touched per add():',
+              round(touched / len(case), 2))
+
+    print("\nTombstoneAVL example 1")
+    print("----------------------")
+    tree = TombstoneAVL([10, 20, 5, 15, 17, 7, 12], min_dead=3, threshold=0.4)
+    tree.remove(5)
+    tree.remove(17)
+    print(list(tree), len(tree), tree.contains(5), tree.find_min(), tree.successor(15), tree.stats())
+    tree.add(17)
+    tree.remove(10)
+    tree.remove(12)
+    print(list(tree), len(tree), tree.stats())
+
+    print("\nTombstoneAVL example 2")
+    print("----------------------")
+    for background in (False, True):
+        with TombstoneAVL(range(0, 2000, 2), bulk=True, min_dead=16, background=background) as tree:
+            expected = set(range(0, 2000, 2))
+            for step in range(3000):
+                value = random.randrange(2000)
+                if random.random() < 0.3:
+                    tree.add(value)
+                    expected.add(value)
+                else:
+                    if tree.remove(value) != (value in expected):
+                        raise Exception("PROBLEM WITH TOMBSTONEAVL")
+                    expected.discard(value)
+                if step % 100 == 0 and (len(tree) != len(expected) or
+                                        tree.find_max() != (max(expected) if expected else None)):
+                    raise Exception("PROBLEM WITH TOMBSTONEAVL")
+                if step % 100 == 50:
+                    ordered = sorted(expected)
+                    k = random.randrange(-len(ordered), len(ordered)) if ordered else None
+                    if tree.rank(value) != sum(1 for v in ordered if v < value) or \
+                            tree.count_range(500, 1500) != sum(1 for v in ordered if 500 <= v <= 1500) or \
+                            (k is not None and tree.select(k) != ordered[k]):
+                        raise Exception("PROBLEM WITH TOMBSTONEAVL")
+                    tree.validate()
+            if list(tree) != sorted(expected) or tree.rank(1000) != sum(1 for v in expected if v < 1000) or \
+                    not tree.is_valid_avl():
+                raise Exception("PROBLEM WITH TOMBSTONEAVL")
+            #dead nodes survive split/join and the set operations
+            other = set(random.sample(range(2000), 300))
+            for name, op in (('update', set.union), ('symmetric_difference_update', set.symmetric_difference),
+                             ('intersection_update', set.intersection), ('difference_update', set.difference)):
+                copy = TombstoneAVL(tree.irange(), bulk=True, auto_compact=False)
+                for v in random.sample(sorted(expected), len(expected) // 3):
+                    copy.remove(v)
+                alive = set(copy)
+                getattr(copy, name)(AVL(other))
+                copy.validate()
+                if list(copy) != sorted(op(alive, other)) or len(copy) != len(op(alive, other)):
+                    raise Exception("PROBLEM WITH TOMBSTONEAVL")
+            alive = list(copy)
+            copy.remove(1000)
+            copy.add(1001)
+            copy.remove(1001)
+            smaller, found, larger = copy.split(1001)
+            smaller.validate()
+            larger.validate()
+            if found or list(smaller) != [v for v in alive if v < 1000] or \
+                    list(larger) != [v for v in alive if v > 1001] or \
+                    len(smaller) + len(larger) != len([v for v in alive if v not in (1000, 1001)]):
+                raise Exception("PROBLEM WITH TOMBSTONEAVL")
+            smaller.join(1001, larger)
+            smaller.validate()
+            if list(smaller) != sorted(set(alive) - {1000} | {1001}):
+                raise Exception("PROBLEM WITH TOMBSTONEAVL")
+    #removing and reviving a value update its lookup cache entry
+    tree = TombstoneAVL([1, 2, 3], min_dead=100)
+    cache = tree.enable_lookup_cache()
+    if not tree.contains(2) or not tree.remove(2) or tree.contains(2) or \
+            tree.add(2) or not tree.contains(2) or cache.invalidations != 2:
+        raise Exception("PROBLEM WITH TOMBSTONEAVL")
+    #trees made by split(), copy() and the set operations keep the compaction settings
+    tree = TombstoneAVL(range(10), threshold=0.9, min_dead=2, auto_compact=False)
+    for made in tree.split(5)[::2] + (tree.copy(), tree | [20], tree._as_tree([1])):
+        if (made.threshold, made.min_dead, made.auto_compact) != (0.9, 2, False):
+            raise Exception("PROBLEM WITH TOMBSTONEAVL")
+    print('TombstoneAVL stress test finished')
+
+    print("\nmethod validate() example 1")
+    print("---------------------------")
+    tree = AVL([10, 20, 5, 15, 17, 7, 12])
+    tree.validate()
+    for corrupt in (lambda t: setattr(t.root.left, 'height', 5),
+                    lambda t: setattr(t.root.right.left, 'value', 3),
+                    lambda t: setattr(t.root.right.right, 'parent', t.root),
+                    lambda t: setattr(t.root.left, 'size', 1)):
+        tree = AVL([10, 20, 5, 15, 17, 7, 12])
+        corrupt(tree)
+        try:
+            tree.validate()
+        except AVLInvariantError as error:
+            print(error.invariant, '-', error)
+    tree = AVL(range(1, 8))
+    tree.root.left = None
+    tree.root.size = 4
+    try:
+        tree.validate()
+    except AVLInvariantError as error:
+        print(error.invariant, '-', error)
+
+    print("\nmethod validate() example 2")
+    print("---------------------------")
+    for _ in range(100):
+        tree = AVL()
+        for step in range(300):
+            value = random.randrange(1, 200)
+            if random.random() < 0.6:
+                tree.add(value)
+            elif random.random() < 0.9:
+                tree.remove(value)
+            else:
+                tree.pop_max()
+            tree.validate(incremental=True)
+        tree.validate()
+        #break the height of a node on the last changed path, the incremental check sees it
+        node = tree._last_changed or tree.root
+        if node is not None:
+            node.height += 2
+            try:
+                tree.validate(incremental=True)
+                raise Exception("PROBLEM WITH VALIDATE")
+            except AVLInvariantError as error:
+                if error.node is not node or error.invariant != 'height':
+                    raise Exception("PROBLEM WITH VALIDATE")
+
+    #a rotation that breaks the node it pushes down off the changed path is caught too
+    class BrokenRotation(AVL):
+        def rotateRight(self, node):
+            top = super().rotateRight(node)
+            node.height += 1
+            return top
+    for case in ((30, 20, 10), (50, 40, 60, 30, 45, 20)):
+        tree = BrokenRotation(case)
+        for incremental in (True, False):
+            try:
+                tree.validate(incremental)
+                raise Exception("PROBLEM WITH VALIDATE")
+            except AVLInvariantError as error:
+                if error.invariant != 'height':
+                    raise Exception("PROBLEM WITH VALIDATE")
+    print('validate() stress test finished')
+
+    print("\nmethod from_sorted() example 1")
+    print("------------------------------")
+    test_cases = (
+        (1, 2, 3),
+        (10, 20, 30, 40, 50),
+        (range(0, 30, 3)),
+        (5, 4, 6, 3, 7, 2, 8),
+        ('A', 'B', 'C', 'D', 'E'),
+        (1, 1, 1, 1),
+        (),
+    )
+    for case in test_cases:
+        avl = AVL.from_sorted(case)
+        print('INPUT  :', case)
+        print('RESULT :', avl)
+
+    print("\nmethod from_sorted() example 2")
+    print("------------------------------")
+    for _ in range(100):
+        case = [random.randrange(1, 20000) for _ in range(900)]
+        expected = AVL(case).inorder_traversal()
+        for avl in (AVL.from_sorted(case), AVL(sorted(case), bulk=True)):
+            if not avl.is_valid_avl() or str(avl.inorder_traversal()) != str(expected):
+                raise Exception("PROBLEM WITH BULK LOAD")
+    print('from_sorted() stress test finished')
+
+    print("\nCompactAVL add() example 1")
+    print("--------------------------")
+    for case in ((10, 20, 30, 40, 50), (30, 20, 10, 1, 5)):
+        print('INPUT  :', case)
+        print('RESULT :', CompactAVL(case))
+    for _ in range(100):
+        case = list(set(random.randrange(1, 20000) for _ in range(900)))
+        avl = CompactAVL(case)
+        for value in case[::2]:
+            avl.remove(value)
+        if not avl.is_valid_avl() or not isinstance(avl.root, SlotTreeNode):
+            raise Exception("PROBLEM WITH COMPACTAVL")
+    print('CompactAVL stress test finished')
+
+    print("\nAVLMap example 1")
+    print("----------------")
+    tree = AVLMap({10: 'a', 20: 'b', 5: 'c'})
+    tree[15] = 'd'
+    tree[10] = 'e'
+    print(tree, list(tree.items()))
+    print(tree[10], tree.get(7), tree.get(7, 'missing'), tree.setdefault(7, 'f'), tree.pop(20))
+    del tree[5]
+    print(list(tree.keys()), list(tree.values()), len(tree), 15 in tree)
+
+    print("\nAVLMap example 2")
+    print("----------------")
+    for _ in range(100):
+        case = [(random.randrange(1, 2000), random.random()) for _ in range(900)]
+        expected = dict(case)
+        for tree in (AVLMap(case), AVLMap(case, bulk=True)):
+            for key, _ in case[::2]:
+                if tree.pop(key, None) != expected.pop(key, None):
+                    raise Exception("PROBLEM WITH AVLMAP")
+            if not tree.is_valid_avl() or list(tree.items()) != sorted(expected.items()):
+                raise Exception("PROBLEM WITH AVLMAP")
+            expected = dict(case)
+    #the set operations other than update() take plain keys, data comes from the maps
+    tree = AVLMap({1: 'a', 2: 'b', 3: 'c'})
+    if list((tree & [1]).items()) != [(1, 'a')] or list(tree.difference([1, 2]).items()) != [(3, 'c')] or \
+            list((tree ^ AVL([3, 4])).items()) != [(1, 'a'), (2, 'b'), (4, None)] or \
+            list((tree - AVL([2])).items()) != [(1, 'a'), (3, 'c')] or \
+            list((tree | {4: 'd'}).items()) != [(1, 'a'), (2, 'b'), (3, 'c'), (4, 'd')]:
+        raise Exception("PROBLEM WITH AVLMAP")
+    try:
+        tree.update(AVL([5]))
+        raise Exception("PROBLEM WITH AVLMAP")
+    except TypeError:
+        pass
+    print('AVLMap stress test finished')
+
+    print("\nmethod add_many() / remove_many() / contains_many() example 1")
+    print("-------------------------------------------------------------")
+    tree = AVL(range(0, 100, 10))
+    tree.add_many([35, 5, 95, 35, 0])
+    print(tree)
+    print(tree.remove_many([35, 36, 5]), tree)
+    print(tree.contains_many([50, 51, 0, 95, -1]))
+
+    print("\nmethod add_many() / remove_many() / contains_many() example 2")
+    print("-------------------------------------------------------------")
+    for _ in range(100):
+        case = list(set(random.randrange(1, 20000) for _ in range(900)))
+        batch = [random.randrange(1, 20000) for _ in range(random.choice((10, 100, 1000)))]
+        tree = AVL(case)
+        tree.add_many(batch)
+        expected = set(case) | set(batch)
+        if not tree.is_valid_avl() or list(tree) != sorted(expected):
+            raise Exception("PROBLEM WITH ADD_MANY")
+        probes = [random.randrange(1, 20000) for _ in range(500)]
+        if tree.contains_many(probes) != [value in expected for value in probes]:
+            raise Exception("PROBLEM WITH CONTAINS_MANY")
+        batch = random.sample(sorted(expected), random.choice((10, 100, len(expected))))
+        if tree.remove_many(batch) != len(batch) or not tree.is_valid_avl() or \
+                list(tree) != sorted(expected - set(batch)):
+            raise Exception("PROBLEM WITH REMOVE_MANY")
+    print('add_many() / remove_many() / contains_many() stress test finished')
+
+    print("\nset operations example 1")
+    print("------------------------")
+    a, b = AVL([1, 2, 3, 4, 5, 6]), AVL([4, 5, 6, 7, 8])
+    print('union               :', list(a | b))
+    print('intersection        :', list(a & b))
+    print('difference          :', list(a - b))
+    print('symmetric_difference:', list(a ^ b))
+    a.update(range(10, 13))
+    print('update              :', list(a), list(b))
+    smaller, found, larger = a.split(5)
+    print('split(5)            :', list(smaller), found, list(larger), a.is_empty())
+    smaller.join(5, larger)
+    print('join(5)             :', list(smaller), smaller.is_valid_avl())
+
+    print("\nset operations example 2")
+    print("------------------------")
+    for _ in range(100):
+        x = set(random.randrange(1, 2000) for _ in range(random.choice((10, 300, 900))))
+        y = set(random.randrange(1, 2000) for _ in range(random.choice((10, 300, 900))))
+        for method, expected in (('union', x | y), ('intersection', x & y),
+                                 ('difference', x - y), ('symmetric_difference', x ^ y)):
+            a, b = AVL(x), AVL(y)
+            result = getattr(a, method)(b)
+            getattr(a, method + '_update' if method != 'union' else 'update')(b)
+            for tree in (result, a):
+                if list(tree) != sorted(expected) or not tree.is_valid_avl() or \
+                        len(tree) != len(expected) or list(b) != sorted(y):
+                    raise Exception("PROBLEM WITH SET OPERATIONS")
+        smaller, found, larger = AVL(x).split(1000)
+        if list(smaller) + ([1000] if found else []) + list(larger) != sorted(x) or \
+                not smaller.is_valid_avl() or not larger.is_valid_avl():
+            raise Exception("PROBLEM WITH SPLIT")
+    print('set operations stress test finished')
+
+    print("\nPersistentAVL example 1")
+    print("-----------------------")
+    v1 = PersistentAVL((10, 20, 30, 40, 50))
+    v2 = v1.add(35)
+    v3 = v2.remove(20)
+    snapshot = v3.snapshot()
+    print('v1:', v1, len(v1))
+    print('v2:', v2, len(v2))
+    print('v3:', v3, len(v3), list(v3), snapshot is v3)
+    print('shared subtree:', v1.root.right.right is v2.root.right.right, v1.add(10) is v1)
+
+    print("\nPersistentAVL example 2")
+    print("-----------------------")
+    for _ in range(100):
+        case = [random.randrange(1, 2000) for _ in range(900)]
+        versions = [PersistentAVL(case[:450], bulk=True)]
+        expected = [set(case[:450])]
+        for value in case[450:]:
+            versions.append(versions[-1].add(value) if value % 3 else versions[-1].remove(value - 1))
+            expected.append(expected[-1] | {value} if value % 3 else expected[-1] - {value - 1})
+        for version, values in zip(versions[::50], expected[::50]):
+            if list(version) != sorted(values) or not version.is_valid_avl():
+                raise Exception("PROBLEM WITH PERSISTENTAVL")
+    print('PersistentAVL stress test finished')
+
+    print("\nmethod dump() / load() example 1")
+    print("--------------------------------")
+    path = os.path.join(tempfile.mkdtemp(), 'tree.avl')
+    for case in ((10, 20, 5, 15, 17, 7, 12), (2.5, -1.0), ('b', 'a', 'ü'), (b'x', b'\x00y'), ()):
+        AVL(case).dump(path)
+        tree = AVL.load(path)
+        with MappedAVL(path, verify=True) as mapped:
+            print(list(tree), tree.is_valid_avl(), list(mapped), mapped.find_min(),
+                  mapped.find_max(), len(mapped))
+    with MappedAVL(path) as mapped:
+        pass
+    AVL(range(0, 100, 3)).dump(path)
+    with MappedAVL(path) as mapped:
+        print(mapped.contains(9), mapped.contains(10), list(mapped.irange(10, 20)),
+              mapped.count_range(10, 20), mapped.rank(10), mapped.select(-1))
+
+    print("\nmethod dump() / load() example 2")
+    print("--------------------------------")
+    for _ in range(20):
+        case = list(set(random.randrange(-2 ** 40, 2 ** 40) for _ in range(900)))
+        AVL(case, bulk=True).dump(path, checksum=random.random() < 0.5)
+        with MappedAVL(path) as mapped:
+            lo, hi = sorted(random.sample(case, 2))
+            if list(AVL.load(path)) != sorted(case) or list(mapped) != sorted(case) or \
+                    list(mapped.irange(lo, hi, (False, True), True)) != \
+                    [value for value in sorted(case, reverse=True) if lo < value <= hi]:
+                raise Exception("PROBLEM WITH DUMP / LOAD")
+    AVL(range(100)).dump(path)
+    with open(path, 'r+b') as f:
+        f.seek(30)
+        f.write(b'?')
+    try:
+        AVL.load(path)
+        raise Exception("PROBLEM WITH DUMP CHECKSUM")
+    except ValueError:
+        pass
+    try:
+        MappedAVL(path, verify=True)
+        raise Exception("PROBLEM WITH DUMP CHECKSUM")
+    except ValueError:
+        pass
+    #a cut off file is caught from the header's count even without the checksum
+    for case in (range(100), [str(value) for value in range(100)]):
+        AVL(case).dump(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for size in (len(data) // 2, len(data) // 2 + 3, len(data) - 1):
+            with open(path, 'wb') as f:
+                f.write(data[:size])
+            for reader in (lambda: MappedAVL(path), lambda: AVL.load(path, verify=False)):
+                try:
+                    reader()
+                    raise Exception("PROBLEM WITH DUMP / LOAD")
+                except ValueError:
+                    pass
+    #subclasses load through their own nodes, an AVLMap gets every key with None as data
+    AVL(range(5)).dump(path)
+    loaded = AVLMap.load(path)
+    if list(loaded.items()) != [(key, None) for key in range(5)] or not loaded.is_valid_avl() or \
+            list(TombstoneAVL.load(path)) != list(range(5)) or list(ThreadedAVL.load(path)) != list(range(5)):
+        raise Exception("PROBLEM WITH DUMP / LOAD")
+    for method in (lambda: AVLMap({1: 'a'}).dump(path), lambda: AVLMap({1: 'a'}).freeze()):
+        try:
+            method()
+            raise Exception("PROBLEM WITH DUMP / LOAD")
+        except TypeError:
+            pass
+    print('dump() / load() stress test finished')
+
+    if numpy is not None:
+        print("\nmethod freeze() example 1")
+        print("-------------------------")
+        tree = AVL([10, 20, 5, 15, 17, 7, 12])
+        frozen = tree.freeze()
+        queries = numpy.array([4, 5, 13, 20, 21])
+        print('contains:', frozen.contains(queries).tolist(), 'rank:', frozen.rank(queries).tolist())
+        print('floor:', frozen.floor(queries).tolist(), 'ceiling:', frozen.ceiling(queries).tolist())
+        print('count_range(7, 17):', int(frozen.count_range(7, 17)), 'thaw():', frozen.thaw())
+
+        print("\nmethod freeze() example 2")
+        print("-------------------------")
+        for _ in range(50):
+            tree = AVL(random.randrange(-1000, 1000) for _ in range(random.randrange(0, 300)))
+            queries = numpy.random.randint(-1100, 1100, size=500)
+            for layout in FrozenAVL.LAYOUTS:
+                frozen = tree.freeze(layout)
+                floors = frozen.floor(queries)
+                if frozen.contains(queries).tolist() != [tree.contains(q) for q in queries.tolist()] or \
+                        frozen.rank(queries).tolist() != [tree.rank(q) for q in queries.tolist()] or \
+                        floors.filled(-9999).tolist() != [tree.floor(q) if tree.floor(q) is not None
+                                                          else -9999 for q in queries.tolist()] or \
+                        list(frozen.thaw()) != list(tree):
+                    raise Exception("PROBLEM WITH FREEZE")
+        print('freeze() stress test finished')
+
+    print("\nmethod enable_profiling() example 1")
+    print("-----------------------------------")
+    tree = AVL()
+    profiler = tree.enable_profiling()
+    for value in (10, 20, 30, 40, 50, 25):
+        tree.add(value)
+    tree.contains(25)
+    tree.remove(10)
+    stats = profiler.to_dict()
+    print(stats['rotation_types'], sorted(stats['operations']))
+    print('add comparisons:', stats['operations']['add']['comparisons']['sum'],
+          'add rotations:', stats['operations']['add']['rotations']['sum'],
+          'contains nodes visited:', stats['operations']['contains']['nodes_visited']['sum'])
+    tree.disable_profiling()
+    tree.add(60)
+    print(tree, json.loads(profiler.to_json())['operations']['add']['time_ns']['count'])
+
+    print("\nmethod enable_lookup_cache() example 1")
+    print("--------------------------------------")
+    tree = AVL([10, 20, 5, 15])
+    cache = tree.enable_lookup_cache(capacity=2)
+    print(tree.contains(15), tree.contains(15), tree.contains(16), 16 in tree)
+    tree.add(16)
+    tree.remove(15)
+    print(tree.contains(15), tree.contains(16), tree.contains(10), cache.stats())
+
+    print("\nmethod enable_lookup_cache() example 2")
+    print("--------------------------------------")
+    for policy in LookupCache.POLICIES:
+        tree = AVL(random.randrange(1, 300) for _ in range(100))
+        cache = tree.enable_lookup_cache(capacity=32, policy=policy)
+        expected = set(tree)
+        for step in range(5000):
+            value = int(random.paretovariate(1.2)) if step % 3 else random.randrange(1, 300)
+            choice = random.randrange(20)
+            if choice == 0:
+                tree.add(value)
+                expected.add(value)
+            elif choice == 1:
+                tree.remove(value)
+                expected.discard(value)
+            elif choice == 2 and step % 100 == 0:
+                batch = [random.randrange(1, 300) for _ in range(50)]
+                tree.add_many(batch)
+                expected.update(batch)
+            elif choice == 3 and step % 100 == 1:
+                tree.make_empty()
+                expected.clear()
+            elif tree.contains(value) != (value in expected):
+                raise Exception("PROBLEM WITH LOOKUP CACHE")
+        if cache.hits == 0 or len(cache) > 32 or not tree.is_valid_avl():
+            raise Exception("PROBLEM WITH LOOKUP CACHE")
+    #profiling and the cache can be stacked and disabled in either order
+    for first in ('profiling', 'cache'):
+        tree = AVL([10, 20, 5])
+        if first == 'profiling':
+            profiler = tree.enable_profiling()
+            cache = tree.enable_lookup_cache()
+            tree.disable_profiling()
+        else:
+            cache = tree.enable_lookup_cache()
+            profiler = tree.enable_profiling()
+            tree.disable_lookup_cache()
+        calls = sum(op['time_ns']['count'] for op in profiler.to_dict()['operations'].values())
+        tree.contains(10)
+        tree.contains(10)
+        tree.remove(10)
+        after = sum(op['time_ns']['count'] for op in profiler.to_dict()['operations'].values())
+        if first == 'profiling' and (after != calls or cache.hits != 1 or tree.contains(10)):
+            raise Exception("PROBLEM WITH LOOKUP CACHE")
+        if first == 'cache' and (after != calls + 3 or cache.hits + cache.misses != 0 or
+                                 tree.contains(10) or '_layers' not in tree.__dict__):
+            raise Exception("PROBLEM WITH LOOKUP CACHE")
+    print('lookup cache stress test finished')
+
     print("\nPDF - method remove() example 1")
     print("-------------------------------")
     test_cases = (
@@ -714,6 +4106,66 @@ if __name__ == '__main__':
     tree = AVL([8, 10, -4, 5, -1])
     print(tree.inorder_traversal())
 
+    print("\nQueue / Stack example 1")
+    print("-----------------------")
+    q = AVL([10, 20, 5, 15, 17, 7, 12]).inorder_traversal()
+    print(q)
+    print(len(q), q.dequeue(), list(q))
+    print(q.drain(), q.is_empty())
+    st = Stack()
+    st.extend([1, 2, 3])
+    st.push(4)
+    print(st)
+    print(len(st), st.top(), list(st))
+    print(st.drain(), st.is_empty())
+
+    print("\nmethod irange() example 1")
+    print("-------------------------")
+    tree = AVL([10, 20, 5, 15, 17, 7, 12])
+    print(list(tree))
+    print(list(reversed(tree)))
+    print(list(tree.irange(7, 17)))
+    print(list(tree.irange(7, 17, inclusive=(False, False))))
+    print(list(tree.irange(8, 16, reverse=True)))
+    print(list(tree.irange(hi=12)), list(tree.irange(lo=100)))
+
+    print("\nmethod irange() example 2")
+    print("-------------------------")
+    for _ in range(100):
+        case = list(set(random.randrange(1, 20000) for _ in range(900)))
+        lo, hi = sorted(random.randrange(1, 20000) for _ in range(2))
+        tree = AVL(case)
+        expected = sorted(value for value in case if lo < value <= hi)
+        if list(tree.irange(lo, hi, (False, True))) != expected or \
+                list(tree.irange(lo, hi, (False, True), True)) != expected[::-1] or \
+                list(tree) != sorted(case):
+            raise Exception("PROBLEM WITH IRANGE")
+    print('irange() stress test finished')
+
+    print("\nmethod rank() / select() example 1")
+    print("----------------------------------")
+    tree = AVL([10, 20, 5, 15, 17, 7, 12])
+    print('len:', len(tree), 'rank(12):', tree.rank(12), 'rank(13):', tree.rank(13))
+    print('select(0):', tree.select(0), 'select(3):', tree.select(3), 'select(-1):', tree.select(-1))
+    print('count_range(7, 17):', tree.count_range(7, 17),
+          'count_range(7, 17, (False, False)):', tree.count_range(7, 17, (False, False)))
+
+    print("\nmethod rank() / select() example 2")
+    print("----------------------------------")
+    for _ in range(100):
+        case = list(set(random.randrange(1, 20000) for _ in range(900)))
+        tree = AVL(case)
+        for value in case[::3]:
+            tree.remove(value)
+        expected = sorted(case[i] for i in range(len(case)) if i % 3)
+        lo, hi = sorted(random.randrange(1, 20000) for _ in range(2))
+        if len(tree) != len(expected) or \
+                [tree.select(k) for k in range(len(tree))] != expected or \
+                [tree.rank(value) for value in expected] != list(range(len(expected))) or \
+                tree.count_range(lo, hi) != sum(1 for value in expected if lo <= value <= hi):
+            raise Exception("PROBLEM WITH RANK / SELECT")
+    print('rank() / select() stress test finished')
+
     print("\nPDF - method find_min() example 1")
     print("---------------------------------")
     tree = AVL([10, 20, 5, 15, 17, 7, 12])
@@ -738,6 +4190,98 @@ if __name__ == '__main__':
     print(tree)
     print("Maximum value is:", tree.find_max())
 
+    print("\nmethod pop_min() / pop_max() example 1")
+    print("--------------------------------------")
+    tree = AVL([10, 20, 5, 15, 17, 7, 12])
+    print('popped:', tree.pop_min(), tree.pop_max(), tree.pop_min(), 'left:', list(tree))
+    print('min / max:', tree.find_min(), tree.find_max(), tree.is_valid_avl())
+
+    print("\nmethod pop_min() / pop_max() example 2")
+    print("--------------------------------------")
+    for _ in range(100):
+        tree = AVL()
+        expected = set()
+        for step in range(300):
+            value = random.randrange(1, 500)
+            choice = random.randrange(7)
+            if choice < 2:
+                tree.add(value)
+                expected.add(value)
+            elif choice == 2:
+                tree.remove(value)
+                expected.discard(value)
+            elif choice == 3:
+                popped = tree.pop_min()
+                if popped != (min(expected) if expected else None):
+                    raise Exception("PROBLEM WITH POP_MIN")
+                expected.discard(popped)
+            elif choice == 4:
+                popped = tree.pop_max()
+                if popped != (max(expected) if expected else None):
+                    raise Exception("PROBLEM WITH POP_MAX")
+                expected.discard(popped)
+            elif choice == 5:
+                batch = [random.randrange(1, 500) for _ in range(random.choice((3, 200)))]
+                tree.add_many(batch)
+                expected.update(batch)
+            else:
+                smaller, found, larger = tree.split(value)
+                tree = smaller
+                if found:
+                    tree.join(value, larger)
+                else:
+                    tree.update(larger)
+            if tree.find_min() != (min(expected) if expected else None) or \
+                    tree.find_max() != (max(expected) if expected else None):
+                raise Exception("PROBLEM WITH FIND_MIN / FIND_MAX")
+        if list(tree) != sorted(expected) or not tree.is_valid_avl():
+            raise Exception("PROBLEM WITH POP_MIN / POP_MAX")
+    print('pop_min() / pop_max() stress test finished')
+
+    print("\nmethod successor() / floor() example 1")
+    print("--------------------------------------")
+    tree = AVL([10, 20, 5, 15, 17, 7, 12])
+    print('successor(12):', tree.successor(12), 'predecessor(12):', tree.predecessor(12),
+          'successor(20):', tree.successor(20))
+    print('floor(13):', tree.floor(13), 'floor(12):', tree.floor(12), 'floor(4):', tree.floor(4),
+          'ceiling(13):', tree.ceiling(13), 'ceiling(12):', tree.ceiling(12))
+    tree = ThreadedAVL([10, 20, 5, 15, 17, 7, 12])
+    node = tree.node(12)
+    print('threaded:', node.prev.value, node.value, node.next.value, list(reversed(tree)))
+
+    print("\nmethod successor() / floor() example 2")
+    print("--------------------------------------")
+    for _ in range(100):
+        tree = ThreadedAVL(random.randrange(1, 500) for _ in range(100))
+        expected = set(tree.irange())
+        for step in range(300):
+            value = random.randrange(1, 500)
+            choice = random.randrange(6)
+            if choice < 2:
+                tree.add(value)
+                expected.add(value)
+            elif choice < 4:
+                tree.remove(value)
+                expected.discard(value)
+            elif choice == 4:
+                expected.discard(tree.pop_min())
+            else:
+                smaller, found, larger = tree.split(value)
+                tree = smaller
+                tree.join(value, larger)
+                expected.add(value)
+            above = [v for v in expected if v > value]
+            below = [v for v in expected if v < value]
+            if tree.successor(value) != (min(above) if above else None) or \
+                    tree.predecessor(value) != (max(below) if below else None) or \
+                    tree.floor(value) != (value if value in expected else tree.predecessor(value)) or \
+                    tree.ceiling(value) != (value if value in expected else tree.successor(value)):
+                raise Exception("PROBLEM WITH SUCCESSOR / PREDECESSOR")
+        if list(tree) != sorted(expected) or list(reversed(tree)) != sorted(expected, reverse=True) or \
+                list(tree) != list(tree.irange()) or not tree.is_valid_avl():
+            raise Exception("PROBLEM WITH THREADEDAVL")
+    print('successor() / ThreadedAVL stress test finished')
+
     print("\nPDF - method is_empty() example 1")
     print("---------------------------------")
     tree = AVL([10, 20, 5, 15, 17, 7, 12])
@@ -762,3 +4306,8 @@ if __name__ == '__main__':
     tree.make_empty()
     print("Tree after make_empty(): ", tree)
 
+    print("\nmethod make_empty() example 3")
+    print("-----------------------------")
+    tree = AVL(range(100000), bulk=True)
+    tree.make_empty()
+    print("Tree is empty:", tree.is_empty())
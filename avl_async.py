@@ -0,0 +1,311 @@
+# Description: Asyncio front end for an AVL tree. Calls from many coroutines are queued
+#               and coalesced into one sorted micro-batch per event loop tick, which is
+#               applied to the tree in a single pass.
+
+
+import asyncio
+import random
+import time
+from collections import deque
+
+from avl import AVL
+
+
+_CONTAINS, _ADD, _REMOVE = 0, 1, 2
+
+
+class AsyncAVL:
+    """
+    Asyncio facade over an AVL (or any tree with contains_many/add_many/remove_many).
+
+    contains(), add() and remove() queue (operation, value) right away and return a
+    future with the answer, so a call that is never awaited is still applied. The
+    first call in a tick schedules a flush with call_soon(), so every call made before
+    the event loop gets back to it lands in the same batch.
+    The flush:
+    - sorts the batch by value (stable, so the calls on one key keep their order)
+    - looks up every distinct key once with contains_many()
+    - plays each key's calls against its membership to get every call's answer
+    - applies the net changes with one add_many() and one remove_many()
+    Calls on different keys commute, so the answers are the same as applying the calls
+    one by one in the order they were made.
+
+    Backpressure: at most max_pending calls can wait for a flush, further calls are
+    parked (in call order) and join the queue as answered calls make room. A flush
+    takes at most max_batch calls; the rest go to the next tick.
+
+    Everything runs on the event loop thread, so the tree needs no lock as long as it
+    is only changed through this facade.
+    """
+    def __init__(self, tree=None, max_pending=65536, max_batch=4096) -> None:
+        """
+        Wrap tree (a new AVL if not given)
+        """
+        self.tree = tree if tree is not None else AVL()
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._pending = []
+        self._scheduled = False
+        #calls admitted and not answered yet, calls parked waiting for room (FIFO)
+        self._admitted = 0
+        self._parked = deque()
+        self._idle = None
+        #metrics
+        self.batches = 0
+        self.ops = 0
+        self.largest_batch = 0
+        self.waits = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def stats(self) -> dict:
+        """
+        Returns the batch size and queue latency (seconds from the call to its answer)
+        statistics as a dict
+        """
+        return {'batches': self.batches, 'ops': self.ops, 'pending': len(self._pending),
+                'mean_batch': self.ops / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch, 'backpressure_waits': self.waits,
+                'mean_latency': self._latency_total / self.ops if self.ops else 0.0,
+                'max_latency': self._latency_max}
+
+    # ------------------- CALLS ---------------------------------------------
+
+    def contains(self, value: object):
+        return self._submit(_CONTAINS, value)
+
+    def add(self, value: object):
+        return self._submit(_ADD, value)
+
+    def remove(self, value: object):
+        return self._submit(_REMOVE, value)
+
+    async def flush(self) -> None:
+        """
+        Waits until every call queued (or parked) so far has been applied
+        """
+        while self._pending or self._parked:
+            if self._idle is None:
+                self._idle = asyncio.get_running_loop().create_future()
+            await asyncio.shield(self._idle)
+
+    def _submit(self, op, value):
+        """
+        Queues one call and returns the future of its answer. If max_pending calls are
+        queued already, the call is parked until an answered call makes room.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self._admitted < self.max_pending and not self._parked:
+            self._admitted += 1
+            self._enqueue(op, value, future)
+        else:
+            self.waits += 1
+            self._parked.append((op, value, future))
+        return future
+
+    def _enqueue(self, op, value, future) -> None:
+        self._pending.append((value, op, future, time.perf_counter()))
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    # ------------------- BATCHING ------------------------------------------
+
+    def _flush(self) -> None:
+        """
+        Applies up to max_batch queued calls to the tree and resolves their futures.
+        Reschedules itself if calls are left over.
+        """
+        batch = self._pending[:self.max_batch]
+        del self._pending[:self.max_batch]
+        try:
+            plan = self._plan(batch)
+        except Exception:
+            #a bad key (e.g. not comparable with the others) fails the sorted pass before
+            #the tree is touched, redo the batch one call at a time so only its own
+            #future gets the error
+            self._apply_each(batch)
+        else:
+            self._apply(*plan)
+        now = time.perf_counter()
+        for value, op, future, queued in batch:
+            latency = now - queued
+            self._latency_total += latency
+            if latency > self._latency_max:
+                self._latency_max = latency
+        self._release(len(batch))
+        self.batches += 1
+        self.ops += len(batch)
+        if len(batch) > self.largest_batch:
+            self.largest_batch = len(batch)
+
+        if self._pending:
+            asyncio.get_running_loop().call_soon(self._flush)
+            return
+        self._scheduled = False
+        if self._idle is not None:
+            self._idle.set_result(None)
+            self._idle = None
+
+    def _release(self, count) -> None:
+        """
+        Gives the room of count answered calls to the parked calls, oldest first, and
+        frees what is left. A parked call whose future was cancelled is dropped.
+        """
+        parked = self._parked
+        while count and parked:
+            op, value, future = parked.popleft()
+            if not future.done():
+                self._enqueue(op, value, future)
+                count -= 1
+        self._admitted -= count
+
+    def _plan(self, batch):
+        """
+        Works out the batch in one sorted pass without changing the tree (see the class
+        docstring). Returns (sorted batch, answers, keys to add, keys to remove).
+        """
+        batch = sorted(batch, key=lambda call: call[0])
+        keys = []
+        for call in batch:
+            if not keys or keys[-1] != call[0]:
+                keys.append(call[0])
+        present = self.tree.contains_many(keys)
+        added, removed, answers = [], [], []
+        k = -1
+        for value, op, future, queued in batch:
+            if k < 0 or keys[k] != value:
+                #state of the previous key is final, record its net change
+                if k >= 0 and state != present[k]:
+                    (added if state else removed).append(keys[k])
+                k += 1
+                state = present[k]
+            if op == _CONTAINS:
+                answers.append(state)
+            elif op == _ADD:
+                answers.append(None)
+                state = True
+            else:
+                answers.append(state)
+                state = False
+        if k >= 0 and state != present[k]:
+            (added if state else removed).append(keys[k])
+        return batch, answers, added, removed
+
+    def _apply(self, batch, answers, added, removed) -> None:
+        """
+        Applies the net changes of a planned batch and resolves its futures. If the tree
+        fails part way the batch can't be replayed on it, every call gets the error.
+        """
+        try:
+            if removed:
+                self.tree.remove_many(removed)
+            if added:
+                self.tree.add_many(added)
+        except Exception as exc:
+            for call in batch:
+                if not call[2].done():
+                    call[2].set_exception(exc)
+            return
+        for call, answer in zip(batch, answers):
+            if not call[2].done():
+                call[2].set_result(answer)
+
+    def _apply_each(self, batch) -> None:
+        """
+        Applies the calls one by one in the order they were made
+        """
+        methods = (self.tree.contains, self.tree.add, self.tree.remove)
+        for value, op, future, queued in batch:
+            try:
+                answer = methods[op](value)
+            except Exception as exc:
+                if not future.done():
+                    future.set_exception(exc)
+            else:
+                if not future.done():
+                    future.set_result(answer)
+
+
+# ------------------- BASIC TESTING -----------------------------------------
+
+
+if __name__ == '__main__':
+
+    async def example_1():
+        index = AsyncAVL(AVL([10, 20, 5]))
+        answers = await asyncio.gather(index.contains(10), index.add(7), index.contains(7),
+                                       index.remove(10), index.contains(10), index.add(10),
+                                       index.remove(99))
+        print(answers, list(index.tree), index.stats()['batches'], index.stats()['largest_batch'])
+
+    async def example_2():
+        for max_pending, max_batch in ((65536, 4096), (64, 32)):
+            index = AsyncAVL(max_pending=max_pending, max_batch=max_batch)
+            calls = []
+            answers = {}
+
+            async def client(seed):
+                rng = random.Random(seed)
+                for _ in range(300):
+                    op, value = rng.randrange(3), rng.randrange(200)
+                    seq = len(calls)
+                    calls.append((op, value))
+                    answers[seq] = await (index.contains, index.add, index.remove)[op](value)
+
+            await asyncio.gather(*[client(seed) for seed in range(20)])
+            await index.flush()
+            stats = index.stats()
+            if not index.tree.is_valid_avl() or stats['pending'] != 0 or stats['ops'] != 6000 or \
+                    stats['largest_batch'] > max_batch or (max_pending < 20) != (stats['backpressure_waits'] > 0):
+                raise Exception("PROBLEM WITH ASYNCAVL")
+            #parked calls keep their order, so the queue order is the call order:
+            #replaying the calls one at a time against a set must give the same answers
+            expected = set()
+            for seq, (op, value) in enumerate(calls):
+                if op == _CONTAINS:
+                    answer = value in expected
+                elif op == _ADD:
+                    answer = None
+                    expected.add(value)
+                else:
+                    answer = value in expected
+                    expected.discard(value)
+                if answers[seq] != answer:
+                    raise Exception("PROBLEM WITH ASYNCAVL")
+            if list(index.tree) != sorted(expected):
+                raise Exception("PROBLEM WITH ASYNCAVL")
+            #calls that are never awaited are applied too, even when they get parked
+            for value in range(1000, 1000 + 3 * max_pending):
+                index.add(value)
+            await index.flush()
+            if list(index.tree)[-3 * max_pending:] != list(range(1000, 1000 + 3 * max_pending)):
+                raise Exception("PROBLEM WITH ASYNCAVL")
+            #a key that can't be compared only fails its own call
+            answers = await asyncio.gather(index.contains(1), index.contains('x'), index.contains(2),
+                                           return_exceptions=True)
+            if not isinstance(answers[1], TypeError) or answers[0] != index.tree.contains(1) or \
+                    answers[2] != index.tree.contains(2):
+                raise Exception("PROBLEM WITH ASYNCAVL")
+        #a tree that fails while applying the net changes fails the whole batch instead
+        #of having it replayed on top of the half applied changes
+        class FailingAVL(AVL):
+            def add_many(self, values):
+                raise RuntimeError('disk full')
+        index = AsyncAVL(FailingAVL([1, 2]))
+        answers = await asyncio.gather(index.remove(1), index.add(3), index.contains(2),
+                                       return_exceptions=True)
+        if not all(isinstance(answer, RuntimeError) for answer in answers) or list(index.tree) != [2]:
+            raise Exception("PROBLEM WITH ASYNCAVL")
+        print('AsyncAVL stress test finished')
+
+    print("\nAsyncAVL example 1")
+    print("------------------")
+    asyncio.run(example_1())
+
+    print("\nAsyncAVL example 2")
+    print("------------------")
+    asyncio.run(example_2())
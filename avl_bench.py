@@ -0,0 +1,871 @@
+# Description: Benchmarks for the AVL tree in avl.py. Every benchmark is a subcommand,
+#               run `python avl_bench.py --help` to list them.
+
+
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avl import AVL, CompactAVL, FrozenAVL, LookupCache, Queue, TombstoneAVL
+from avl_async import AsyncAVL
+from avl_btree import BPlusTree
+from avl_concurrent import ConcurrentAVL
+from avl_shard import ShardedAVL
+from avl_wal import DurableAVL
+
+
+def timed(fn, *args):
+    """
+    Calls fn(*args) and returns a tuple of (seconds taken, result)
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def report(name, ops, seconds):
+    """
+    Prints one result line with the throughput of ops operations done in seconds
+    """
+    rate = ops / seconds if seconds > 0 else float('inf')
+    print('{:<40} {:>14,.0f} ops/sec  ({:.3f}s)'.format(name, rate, seconds))
+
+
+# ------------------- RECURSIVE REFERENCE -----------------------------------
+# The recursive versions of find(), inorder traversal and make_empty() the tree
+# used before they were rewritten as loops. They are kept here as the baseline.
+
+
+def recursive_find(node, value):
+    """
+    Recursive version of AVL.find(root, value, False)
+    """
+    if node.value > value:
+        return recursive_find(node.left, value) if node.left is not None else node
+    if node.value == value or node.right is None:
+        return node
+    return recursive_find(node.right, value)
+
+
+def recursive_inorder(node, q):
+    """
+    Recursive version of AVL.inorder_helper()
+    """
+    if node is not None:
+        recursive_inorder(node.left, q)
+        q.enqueue(node.value)
+        recursive_inorder(node.right, q)
+    return q
+
+
+class ListQueue:
+    """
+    The Queue as it used to be, on a Python list where dequeue() is pop(0) and so O(n)
+    """
+    def __init__(self):
+        self._data = []
+
+    def enqueue(self, value):
+        self._data.append(value)
+
+    def dequeue(self):
+        return self._data.pop(0)
+
+    def is_empty(self):
+        return len(self._data) == 0
+
+
+def repeated_remove_root(tree):
+    """
+    make_empty() as it used to work, one removeRoot() per node (without the recursion,
+    which overflowed the stack for more than about 1000 nodes)
+    """
+    while tree.root is not None:
+        tree.removeRoot()
+
+
+# ------------------- BENCHMARKS --------------------------------------------
+
+
+def bench_iterative(args):
+    """
+    Compares the iterative find, traversal and make_empty against the recursive ones
+    """
+    n = args.n
+    keys = list(range(n))
+    random.Random(args.seed).shuffle(keys)
+    probes = keys[:min(n, 100000)]
+
+    seconds, tree = timed(AVL, keys)
+    report('add() x{:,}'.format(n), n, seconds)
+
+    root = tree.root
+    seconds, _ = timed(lambda: [recursive_find(root, v) for v in probes])
+    report('find() recursive', len(probes), seconds)
+    seconds, _ = timed(lambda: [tree.find(root, v, False) for v in probes])
+    report('find() iterative', len(probes), seconds)
+    seconds, _ = timed(lambda: [tree.contains(v) for v in probes])
+    report('contains()', len(probes), seconds)
+
+    seconds, _ = timed(recursive_inorder, root, Queue())
+    report('inorder traversal recursive', n, seconds)
+    seconds, _ = timed(tree.inorder_traversal)
+    report('inorder_traversal() iterative', n, seconds)
+
+    seconds, _ = timed(repeated_remove_root, AVL(keys, bulk=True))
+    report('make_empty() by removeRoot()', n, seconds)
+    seconds, _ = timed(tree.make_empty)
+    report('make_empty() detach', n, seconds)
+
+
+def bench_drain(args):
+    """
+    Times inorder_traversal() followed by dequeuing every value, the way an export job
+    reads a tree, with the deque backed Queue and the old list backed one (only up to
+    --list-max keys, it is quadratic)
+    """
+    for n in args.sizes:
+        tree = AVL(range(n), bulk=True)
+
+        def dequeue_all(q):
+            values = []
+            while not q.is_empty():
+                values.append(q.dequeue())
+            return values
+
+        seconds, _ = timed(lambda: dequeue_all(tree.inorder_traversal()))
+        report('{:,} keys traversal + dequeue()'.format(n), n, seconds)
+        seconds, _ = timed(lambda: tree.inorder_traversal().drain())
+        report('{:,} keys traversal + drain()'.format(n), n, seconds)
+        if n <= args.list_max:
+            seconds, _ = timed(lambda: dequeue_all(tree.inorder_helper(tree.root, ListQueue())))
+            report('{:,} keys traversal + list dequeue()'.format(n), n, seconds)
+
+
+def bench_tombstone(args):
+    """
+    Times a burst of remove() calls on an AVL and on a TombstoneAVL, with compaction
+    deferred to one compact() call and with automatic compaction at each threshold
+    """
+    rng = random.Random(args.seed)
+    burst = rng.sample(range(args.n), int(args.n * args.fraction))
+    tree = AVL(range(args.n), bulk=True)
+    seconds, _ = timed(lambda: [tree.remove(v) for v in burst])
+    report('AVL remove()', len(burst), seconds)
+    tree = TombstoneAVL(range(args.n), bulk=True, auto_compact=False)
+    seconds, _ = timed(lambda: [tree.remove(v) for v in burst])
+    report('TombstoneAVL remove(), no compaction', len(burst), seconds)
+    seconds, _ = timed(tree.compact)
+    report('  then compact()', len(tree), seconds)
+    for threshold in args.thresholds:
+        tree = TombstoneAVL(range(args.n), bulk=True, threshold=threshold)
+        seconds, _ = timed(lambda: [tree.remove(v) for v in burst])
+        report('TombstoneAVL remove(), threshold {:.0%}'.format(threshold), len(burst), seconds)
+
+
+def bench_memory(args):
+    """
+    Reports the bytes each key costs in an AVL and in a CompactAVL. The keys are
+    allocated before measuring, so only the tree itself is counted.
+    """
+    for n in args.sizes:
+        keys = list(range(n))
+        for tree_class in (AVL, CompactAVL):
+            tracemalloc.start()
+            tree = tree_class(keys, bulk=True)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print('{:<12} {:>12,} keys {:>8.1f} bytes/key'.format(
+                tree_class.__name__, n, size / n))
+            del tree
+
+
+def bench_batch(args):
+    """
+    Compares add_many()/contains_many()/remove_many() against a loop over add(),
+    contains() and remove() for growing batch sizes against a tree of n keys
+    """
+    rng = random.Random(args.seed)
+    keys = rng.sample(range(args.n * 4), args.n)
+    for k in args.sizes:
+        batch = [rng.randrange(args.n * 4) for _ in range(k)]
+        print('batch of {:,} against {:,} keys'.format(k, args.n))
+
+        tree = AVL(keys, bulk=True)
+        seconds, _ = timed(lambda: [tree.add(v) for v in batch])
+        report('  add() loop', k, seconds)
+        tree = AVL(keys, bulk=True)
+        seconds, _ = timed(tree.add_many, batch)
+        report('  add_many()', k, seconds)
+
+        seconds, _ = timed(lambda: [tree.contains(v) for v in batch])
+        report('  contains() loop', k, seconds)
+        seconds, _ = timed(tree.contains_many, batch)
+        report('  contains_many()', k, seconds)
+
+        seconds, _ = timed(lambda: [tree.remove(v) for v in batch])
+        report('  remove() loop', k, seconds)
+        tree = AVL(keys, bulk=True)
+        tree.add_many(batch)
+        seconds, _ = timed(tree.remove_many, batch)
+        report('  remove_many()', k, seconds)
+
+
+class LockedAVL:
+    """
+    An AVL behind one global lock, the way the tree had to be shared before
+    ConcurrentAVL. Baseline for bench_concurrent().
+    """
+    def __init__(self, start_tree):
+        self._lock = threading.Lock()
+        self._tree = AVL(start_tree, bulk=True)
+
+    def add(self, value):
+        with self._lock:
+            self._tree.add(value)
+
+    def remove(self, value):
+        with self._lock:
+            return self._tree.remove(value)
+
+    def contains(self, value):
+        with self._lock:
+            return self._tree.contains(value)
+
+    def is_valid_avl(self):
+        return self._tree.is_valid_avl()
+
+
+def bench_concurrent(args):
+    """
+    Runs threads doing a mix of contains() and add()/remove() against ConcurrentAVL and
+    against an AVL behind a global lock, and checks the tree is valid after every run
+    """
+    keys = list(range(0, args.n * 2, 2))
+    for read_ratio in args.mixes:
+        for tree_class in (LockedAVL, ConcurrentAVL):
+            tree = tree_class(keys)
+
+            def worker(seed):
+                rng = random.Random(seed)
+                for _ in range(args.ops):
+                    value = rng.randrange(args.n * 2)
+                    if rng.random() < read_ratio:
+                        tree.contains(value)
+                    elif value & 2:
+                        tree.add(value)
+                    else:
+                        tree.remove(value)
+
+            threads = [threading.Thread(target=worker, args=(args.seed + i,))
+                       for i in range(args.threads)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - start
+            if not tree.is_valid_avl():
+                raise Exception('{} is not a valid AVL after the run'.format(tree_class.__name__))
+            report('{:<14} {:>3.0%} reads, {} threads'.format(
+                tree_class.__name__, read_ratio, args.threads), args.ops * args.threads, seconds)
+
+
+def bench_async(args):
+    """
+    Load generator: many asyncio clients each make a sequence of contains()/add()/
+    remove() calls, once against a shared AVL with an asyncio.Lock around every call
+    (with and without giving the event loop a turn per call) and once through
+    AsyncAVL, which coalesces the calls of a tick into one batch
+    """
+    keys = list(range(0, args.n * 2, 2))
+
+    async def run(make_call, clients):
+        async def client(seed):
+            rng = random.Random(seed)
+            for _ in range(args.ops):
+                value = rng.randrange(args.n * 2)
+                roll = rng.random()
+                op = 0 if roll < read_ratio else 1 if value & 2 else 2
+                await make_call(op, value)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client(args.seed + i) for i in range(clients)])
+        return time.perf_counter() - start
+
+    async def naive(clients):
+        tree = AVL(keys, bulk=True)
+        lock = asyncio.Lock()
+        methods = (tree.contains, tree.add, tree.remove)
+
+        async def call(op, value):
+            async with lock:
+                return methods[op](value)
+
+        return await run(call, clients), None
+
+    async def naive_yielding(clients):
+        #same, but every call gives the event loop one turn the way a handler awaiting
+        #I/O does, which is the round trip AsyncAVL adds to each call
+        tree = AVL(keys, bulk=True)
+        lock = asyncio.Lock()
+        methods = (tree.contains, tree.add, tree.remove)
+
+        async def call(op, value):
+            async with lock:
+                answer = methods[op](value)
+            await asyncio.sleep(0)
+            return answer
+
+        return await run(call, clients), None
+
+    async def coalesced(clients):
+        index = AsyncAVL(AVL(keys, bulk=True), max_pending=args.max_pending, max_batch=args.max_batch)
+        methods = (index.contains, index.add, index.remove)
+        seconds = await run(lambda op, value: methods[op](value), clients)
+        if not index.tree.is_valid_avl():
+            raise Exception('AsyncAVL tree is not a valid AVL after the run')
+        return seconds, index.stats()
+
+    print('{:<36} {:>14} {:>10} {:>12} {:>12}'.format('', 'ops/sec', 'mean batch', 'mean lat us',
+                                                     'max lat us'))
+    for read_ratio in args.mixes:
+        for clients in args.clients:
+            for name, fn in (('per-call', naive), ('per-call, yielding', naive_yielding),
+                             ('AsyncAVL', coalesced)):
+                seconds, stats = asyncio.run(fn(clients))
+                print('{:<36} {:>14,.0f} {:>10} {:>12} {:>12}'.format(
+                    '{} {:.0%} reads, {} clients'.format(name, read_ratio, clients),
+                    clients * args.ops / seconds,
+                    '{:.1f}'.format(stats['mean_batch']) if stats else '-',
+                    '{:.0f}'.format(stats['mean_latency'] * 1e6) if stats else '-',
+                    '{:.0f}'.format(stats['max_latency'] * 1e6) if stats else '-'))
+
+
+def bench_sharded(args):
+    """
+    Times batched add/contains/remove and a full ordered scan of a ShardedAVL with 1 up
+    to the given number of shards (worker processes), next to a single in-process AVL
+    """
+    rng = random.Random(args.seed)
+    keys = [rng.randrange(args.n * 10) for _ in range(args.n)]
+    probes = [rng.randrange(args.n * 10) for _ in range(args.n)]
+
+    tree = AVL()
+    seconds, _ = timed(tree.add_many, keys)
+    report('AVL add_many()', args.n, seconds)
+    seconds, _ = timed(tree.contains_many, probes)
+    report('AVL contains_many()', args.n, seconds)
+    seconds, _ = timed(list, tree)
+    report('AVL ordered scan', len(tree), seconds)
+
+    for shards in range(1, args.shards + 1):
+        bounds = [args.n * 10 * i // shards for i in range(1, shards)]
+        with ShardedAVL(shards=shards, bounds=bounds) as index:
+            seconds, _ = timed(index.add_many, keys)
+            report('{} shards add_many()'.format(shards), args.n, seconds)
+            seconds, _ = timed(index.contains_many, probes)
+            report('{} shards contains_many()'.format(shards), args.n, seconds)
+            seconds, _ = timed(list, index)
+            report('{} shards ordered scan'.format(shards), len(index), seconds)
+            seconds, _ = timed(index.remove_many, keys)
+            report('{} shards remove_many()'.format(shards), args.n, seconds)
+
+
+def bench_wal(args):
+    """
+    Times add() on a DurableAVL under different fsync policies, next to a plain AVL
+    """
+    rng = random.Random(args.seed)
+    keys = [rng.randrange(args.n * 10) for _ in range(args.n)]
+    tree = AVL()
+    seconds, _ = timed(lambda: [tree.add(v) for v in keys])
+    report('AVL (no log)', args.n, seconds)
+    policies = (
+        ('fsync every op', {'fsync_every': 1}),
+        ('fsync every 100 ops', {'fsync_every': 100}),
+        ('fsync every 10 ms', {'fsync_every': 0, 'fsync_interval': 10}),
+        ('no fsync', {'fsync_every': 0}),
+    )
+    for name, policy in policies:
+        directory = tempfile.mkdtemp(dir=args.dir)
+        try:
+            with DurableAVL(directory, **policy) as tree:
+                seconds, _ = timed(lambda: [tree.add(v) for v in keys])
+                report(name, args.n, seconds)
+        finally:
+            shutil.rmtree(directory)
+
+
+def bench_engines(args):
+    """
+    Runs the same workload against the AVL engines and the BPlusTree engine: inserting
+    shuffled keys one by one, contains() hits and misses, find_min()/find_max(), a full
+    ordered traversal and removing every key
+    """
+    engines = (
+        ('AVL', AVL),
+        ('CompactAVL', CompactAVL),
+        ('BPlusTree({})'.format(args.order), lambda: BPlusTree(order=args.order)),
+    )
+    for n in args.sizes:
+        rng = random.Random(args.seed)
+        keys = list(range(0, n * 2, 2))
+        rng.shuffle(keys)
+        probes = [rng.randrange(n * 2) for _ in range(min(n, 10 ** 5))]
+        print('{:,} keys'.format(n))
+        for name, engine in engines:
+            tree = engine()
+            seconds, _ = timed(lambda: [tree.add(v) for v in keys])
+            report('  {:<14} add()'.format(name), n, seconds)
+            seconds, _ = timed(lambda: [tree.contains(v) for v in probes])
+            report('  {:<14} contains()'.format(name), len(probes), seconds)
+            seconds, _ = timed(lambda: [(tree.find_min(), tree.find_max()) for _ in probes])
+            report('  {:<14} find_min()/find_max()'.format(name), len(probes) * 2, seconds)
+            seconds, _ = timed(tree.inorder_traversal)
+            report('  {:<14} inorder_traversal()'.format(name), n, seconds)
+            seconds, _ = timed(lambda: [tree.remove(v) for v in keys])
+            report('  {:<14} remove()'.format(name), n, seconds)
+
+
+# ------------------- SUITE -------------------------------------------------
+# Reproducible workload suite: every (workload, operation, size) cell is measured with
+# the same seed, written as JSON and optionally compared against a saved baseline.
+
+
+def workload_keys(name, n, rng):
+    """
+    Returns the key sequence of a workload with n keys
+    - sequential: 0 .. n-1 in order
+    - random: a shuffled permutation
+    - zipfian: n draws of a Zipf(1.1) distribution over n keys, hot keys repeat
+    - sawtooth: runs of about sqrt(n) keys, alternately ascending and descending
+    - alternating: a shuffled permutation, used for the insert/delete mix
+    """
+    if name == 'sequential':
+        return list(range(n))
+    if name in ('random', 'alternating'):
+        keys = list(range(n))
+        rng.shuffle(keys)
+        return keys
+    if name == 'zipfian':
+        ranked = list(range(n))
+        rng.shuffle(ranked)
+        weights, total = [], 0.0
+        for rank in range(1, n + 1):
+            total += rank ** -1.1
+            weights.append(total)
+        return rng.choices(ranked, cum_weights=weights, k=n)
+    if name == 'sawtooth':
+        run = max(1, int(n ** 0.5))
+        keys = []
+        for start in range(0, n, run):
+            block = range(start, min(start + run, n))
+            keys.extend(block if (start // run) % 2 == 0 else reversed(block))
+        return keys
+    raise ValueError('unknown workload {}'.format(name))
+
+
+WORKLOADS = ('sequential', 'random', 'zipfian', 'sawtooth', 'alternating')
+
+
+def latencies(fn, values):
+    """
+    Calls fn(value) for every value and returns (seconds taken, per call latencies in
+    ns). The throughput includes the cost of reading the clock around every call.
+    """
+    clock = time.perf_counter_ns
+    samples = array('q')
+    append = samples.append
+    start = time.perf_counter()
+    for value in values:
+        before = clock()
+        fn(value)
+        append(clock() - before)
+    return time.perf_counter() - start, samples
+
+
+def summarize(ops, seconds, samples=None, peak=None):
+    """
+    Returns the result record of one measurement
+    """
+    result = {'ops': ops, 'seconds': seconds,
+              'ops_per_sec': ops / seconds if seconds > 0 else None,
+              'p50_ns': None, 'p99_ns': None, 'peak_bytes': peak}
+    if samples:
+        ordered = sorted(samples)
+        result['p50_ns'] = ordered[len(ordered) // 2]
+        result['p99_ns'] = ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)]
+    return result
+
+
+def prepare_workload(name, n, seed, probes):
+    """
+    Returns (keys, probe keys, rounds) for one workload at size n. Every cell makes at
+    least about probes calls: the per-key cells (construction, add, remove) are
+    repeated rounds times on fresh trees, and the lookups cycle over the probe keys.
+    """
+    rng = random.Random('{}/{}/{}'.format(seed, name, n))
+    keys = workload_keys(name, n, rng)
+    probe_keys = keys[:probes] if name != 'sequential' else rng.sample(keys, min(n, probes))
+    return keys, probe_keys, max(1, probes // max(n, 1))
+
+
+def peak_memory(keys):
+    """
+    Returns the peak bytes allocated while building an AVL from keys with add()
+    """
+    tracemalloc.start()
+    AVL(keys)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def merge_runs(runs):
+    """
+    Merges several runs of one workload (see run_workload()) into a dict of operation
+    name to result record (see summarize()). Each cell reports its median run, which
+    a single slow or fast stretch of a busy machine can't move, and keeps the fastest
+    run next to it as best_ops_per_sec.
+    """
+    results = {}
+    for op in runs[0]:
+        measured = sorted((run[op] for run in runs), key=lambda m: m[1])
+        ops, seconds, samples = measured[len(measured) // 2]
+        results[op] = summarize(ops, seconds, samples)
+        best = measured[0][1]
+        results[op]['best_ops_per_sec'] = ops / best if best > 0 else None
+        results[op]['repeats'] = len(measured)
+    return results
+
+
+def run_workload(name, keys, probe_keys, probes, rounds):
+    """
+    Times every operation of one workload once (see prepare_workload()). Returns a dict
+    of operation name to (ops, seconds, per call latencies or None).
+    """
+    n = len(keys)
+    results = {}
+    trees = []
+
+    def measure(cell, fn):
+        #fn() returns (ops, seconds, samples). Parent pointers make every tree a cycle,
+        #so the cyclic GC would run at random points of a cell scanning every tree
+        #built so far; like timeit, keep it off while timing.
+        gc.collect()
+        gc.disable()
+        try:
+            results[cell] = fn()
+        finally:
+            gc.enable()
+
+    def build(bulk):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            AVL(keys, bulk)
+        return n * rounds, time.perf_counter() - start, None
+
+    def per_key(make_tree, method):
+        #one pass over the keys per round, each on a fresh tree from make_tree()
+        total, samples = 0.0, array('q')
+        for _ in range(rounds):
+            tree = make_tree()
+            seconds, part = latencies(getattr(tree, method), keys)
+            total += seconds
+            samples.extend(part)
+        trees.append(tree)
+        return n * rounds, total, samples
+
+    def add_remove():
+        #slide a window over the keys: every add() of a new key is followed by the
+        #remove() of the oldest one, so both ends of the tree keep rotating
+        window = keys[:n // 2]
+        total, samples = 0.0, array('q')
+        for _ in range(rounds):
+            tree = AVL(window)
+            steps = []
+            for i, value in enumerate(keys[n // 2:]):
+                steps.append((tree.add, value))
+                steps.append((tree.remove, window[i]))
+            seconds, part = latencies(lambda step: step[0](step[1]), steps)
+            total += seconds
+            samples.extend(part)
+            if not tree.is_valid_avl():
+                raise Exception('alternating is not a valid AVL after add()/remove()')
+        return len(steps) * rounds, total, samples
+
+    measure('construct', lambda: build(False))
+    measure('construct_bulk', lambda: build(True))
+    measure('add', lambda: per_key(AVL, 'add'))
+    tree = trees.pop()
+    if not tree.is_valid_avl():
+        raise Exception('{} is not a valid AVL after add()'.format(name))
+    lookups = (probe_keys * (probes // max(len(probe_keys), 1) + 1))[:probes]
+    measure('contains', lambda: (len(lookups),) + latencies(tree.contains, lookups))
+    calls = range(probes)
+    measure('find_min', lambda: (len(calls),) + latencies(lambda _: tree.find_min(), calls))
+    measure('find_max', lambda: (len(calls),) + latencies(lambda _: tree.find_max(), calls))
+    traversals = range(max(3, rounds))
+    measure('inorder_traversal', lambda: (len(tree) * len(traversals),) +
+            latencies(lambda _: tree.inorder_traversal(), traversals))
+    if name == 'alternating':
+        measure('add_remove', add_remove)
+    measure('remove', lambda: per_key(lambda: AVL(keys), 'remove'))
+    if not trees.pop().is_empty():
+        raise Exception('{} is not empty after removing every key'.format(name))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the lines describing every cell of results that is slower (ops/sec) or
+    uses more memory (peak bytes) than the same cell of baseline by more than tolerance
+    """
+    problems = []
+    for cell, result in sorted(results.items()):
+        old = baseline.get(cell)
+        if old is None:
+            continue
+        if old.get('ops_per_sec') and result['ops_per_sec'] is not None and \
+                result['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            problems.append('{:<40} {:>14,.0f} ops/sec, baseline {:,.0f}'.format(
+                cell, result['ops_per_sec'], old['ops_per_sec']))
+        if old.get('peak_bytes') and result['peak_bytes'] is not None and \
+                result['peak_bytes'] > old['peak_bytes'] * (1 + tolerance):
+            problems.append('{:<40} {:>14,} peak bytes, baseline {:,}'.format(
+                cell, result['peak_bytes'], old['peak_bytes']))
+    return problems
+
+
+def bench_suite(args):
+    """
+    Runs the workloads at every size, prints a table, writes the JSON results and fails
+    (exit status 1) if any cell regressed against the baseline.
+
+    The whole suite is run warmup times untimed and then repeats times, one complete
+    pass after the other, so the runs of a cell are spread over the length of the suite
+    instead of falling into the same slow (or fast) stretch of a busy machine.
+    """
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    plans = [(n, name, prepare_workload(name, n, args.seed, args.probes))
+             for n in args.sizes for name in args.workloads]
+    runs = {}
+    for repeat in range(args.warmup + args.repeats):
+        for n, name, (keys, probe_keys, rounds) in plans:
+            run = run_workload(name, keys, probe_keys, args.probes, rounds)
+            if repeat >= args.warmup:
+                runs.setdefault((n, name), []).append(run)
+
+    results = {}
+    print('{:<40} {:>14} {:>10} {:>10} {:>12}'.format('cell', 'ops/sec', 'p50 ns', 'p99 ns', 'peak bytes'))
+    for n, name, (keys, probe_keys, rounds) in plans:
+        merged = merge_runs(runs[n, name])
+        if not args.no_memory:
+            merged['construct']['peak_bytes'] = peak_memory(keys)
+        for op, result in merged.items():
+            cell = '{}/{}/{}'.format(name, op, n)
+            results[cell] = result
+            print('{:<40} {:>14,.0f} {:>10} {:>10} {:>12}'.format(
+                cell, result['ops_per_sec'] or 0,
+                *('-' if v is None else '{:,}'.format(v)
+                  for v in (result['p50_ns'], result['p99_ns'], result['peak_bytes']))))
+
+    document = {
+        'meta': {'seed': args.seed, 'sizes': args.sizes, 'workloads': args.workloads,
+                 'probes': args.probes, 'repeats': args.repeats, 'warmup': args.warmup,
+                 'python': platform.python_version(),
+                 'implementation': platform.python_implementation(),
+                 'machine': platform.machine(), 'platform': platform.platform()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        print('results written to', args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        problems = compare(results, baseline, args.tolerance)
+        if problems:
+            print('\nREGRESSIONS against {} (tolerance {:.0%}):'.format(args.baseline, args.tolerance))
+            for line in problems:
+                print('  ' + line)
+            return 1
+        print('no regressions against {} (tolerance {:.0%})'.format(args.baseline, args.tolerance))
+    return 0
+
+
+def bench_cache(args):
+    """
+    Times contains() over Zipfian lookups (half of the keys looked up are not in the
+    tree) without a lookup cache and with each policy at every capacity
+    """
+    rng = random.Random(args.seed)
+    keys = list(range(0, args.n * 2, 2))
+    probes = workload_keys('zipfian', args.n * 2, rng)[:args.probes]
+    print('{:<30} {:>14} {:>10} {:>10} {:>10}'.format('', 'ops/sec', 'p50 ns', 'p99 ns', 'hit ratio'))
+    configs = [('no cache', None, None)]
+    configs += [('{} {:,}'.format(policy, capacity), policy, capacity)
+                for capacity in args.capacities for policy in LookupCache.POLICIES]
+    for name, policy, capacity in configs:
+        tree = AVL(keys, bulk=True)
+        cache = tree.enable_lookup_cache(capacity, policy) if policy else None
+        result = summarize(len(probes), *latencies(tree.contains, probes))
+        print('{:<30} {:>14,.0f} {:>10,} {:>10,} {:>10}'.format(
+            name, result['ops_per_sec'], result['p50_ns'], result['p99_ns'],
+            '{:.1%}'.format(cache.stats()['hit_ratio']) if cache else '-'))
+
+
+def bench_frozen(args):
+    """
+    Answers the same array of queries with a per-key loop over an AVL and with one
+    vectorized call per query type on a FrozenAVL in each layout
+    """
+    if numpy is None:
+        print('the frozen benchmark requires NumPy')
+        return 1
+    rng = numpy.random.default_rng(args.seed)
+    tree = AVL(range(0, args.n * 2, 2), bulk=True)
+    queries = rng.integers(0, args.n * 2, size=args.queries)
+    as_list = queries.tolist()
+    seconds, _ = timed(lambda: [tree.contains(q) for q in as_list])
+    report('AVL contains() loop', len(as_list), seconds)
+    seconds, _ = timed(lambda: [tree.rank(q) for q in as_list])
+    report('AVL rank() loop', len(as_list), seconds)
+    seconds, _ = timed(lambda: [tree.floor(q) for q in as_list])
+    report('AVL floor() loop', len(as_list), seconds)
+    seconds, _ = timed(tree.contains_many, queries)
+    report('AVL contains_many()', len(as_list), seconds)
+    for layout in FrozenAVL.LAYOUTS:
+        seconds, frozen = timed(tree.freeze, layout)
+        report('freeze({!r})'.format(layout), args.n, seconds)
+        for name in ('contains', 'rank', 'floor'):
+            seconds, _ = timed(getattr(frozen, name), queries)
+            report('  {} {}()'.format(layout, name), len(as_list), seconds)
+        seconds, _ = timed(frozen.count_range, queries, queries + 100)
+        report('  {} count_range()'.format(layout), len(as_list), seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for avl.py')
+    parser.add_argument('--seed', type=int, default=261, help='random seed')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('iterative', help='iterative vs recursive find/traversal/make_empty')
+    cmd.add_argument('-n', type=int, default=10 ** 6, help='number of keys')
+    cmd.set_defaults(func=bench_iterative)
+
+    cmd = commands.add_parser('drain', help='inorder_traversal() plus draining the Queue')
+    cmd.add_argument('sizes', type=int, nargs='*', default=[10 ** 4, 10 ** 5, 10 ** 6],
+                     help='tree sizes')
+    cmd.add_argument('--list-max', type=int, default=10 ** 5,
+                     help='largest size to run the list backed Queue at')
+    cmd.set_defaults(func=bench_drain)
+
+    cmd = commands.add_parser('tombstone', help='delete bursts with lazy deletion')
+    cmd.add_argument('-n', type=int, default=10 ** 6, help='number of keys in the tree')
+    cmd.add_argument('--fraction', type=float, default=0.5, help='fraction of the keys removed')
+    cmd.add_argument('thresholds', type=float, nargs='*', default=[0.1, 0.25, 0.5],
+                     help='dead fractions that trigger compaction')
+    cmd.set_defaults(func=bench_tombstone)
+
+    cmd = commands.add_parser('memory', help='bytes per key of AVL vs CompactAVL')
+    cmd.add_argument('sizes', type=int, nargs='*', default=[10 ** 5, 10 ** 6, 10 ** 7],
+                     help='tree sizes to measure')
+    cmd.set_defaults(func=bench_memory)
+
+    cmd = commands.add_parser('batch', help='batch APIs vs per-key loops')
+    cmd.add_argument('-n', type=int, default=10 ** 5, help='number of keys in the tree')
+    cmd.add_argument('sizes', type=int, nargs='*', default=[10 ** e for e in range(1, 7)],
+                     help='batch sizes')
+    cmd.set_defaults(func=bench_batch)
+
+    cmd = commands.add_parser('concurrent', help='multi-threaded read/write mixes')
+    cmd.add_argument('-n', type=int, default=10 ** 5, help='number of keys in the tree')
+    cmd.add_argument('--threads', type=int, default=8, help='number of threads')
+    cmd.add_argument('--ops', type=int, default=20000, help='operations per thread')
+    cmd.add_argument('mixes', type=float, nargs='*', default=[0.5, 0.9, 0.99],
+                     help='fractions of reads')
+    cmd.set_defaults(func=bench_concurrent)
+
+    cmd = commands.add_parser('async', help='AsyncAVL request coalescing vs per-call access')
+    cmd.add_argument('-n', type=int, default=10 ** 5, help='number of keys in the tree')
+    cmd.add_argument('--ops', type=int, default=2000, help='calls per client')
+    cmd.add_argument('--clients', type=int, nargs='+', default=[1, 100, 1000],
+                     help='numbers of concurrent clients')
+    cmd.add_argument('--max-pending', type=int, default=65536, help='AsyncAVL max_pending')
+    cmd.add_argument('--max-batch', type=int, default=4096, help='AsyncAVL max_batch')
+    cmd.add_argument('mixes', type=float, nargs='*', default=[0.9, 0.5],
+                     help='fractions of reads')
+    cmd.set_defaults(func=bench_async)
+
+    cmd = commands.add_parser('sharded', help='ShardedAVL scaling over worker processes')
+    cmd.add_argument('-n', type=int, default=10 ** 6, help='number of keys')
+    cmd.add_argument('--shards', type=int, default=multiprocessing.cpu_count(),
+                     help='largest number of shards to try')
+    cmd.set_defaults(func=bench_sharded)
+
+    cmd = commands.add_parser('wal', help='DurableAVL mutation throughput per fsync policy')
+    cmd.add_argument('-n', type=int, default=10 ** 4, help='number of add() calls')
+    cmd.add_argument('--dir', default=None, help='directory for the logs (default: temp dir)')
+    cmd.set_defaults(func=bench_wal)
+
+    cmd = commands.add_parser('engines', help='AVL vs BPlusTree head to head')
+    cmd.add_argument('sizes', type=int, nargs='*', default=[10 ** 4, 10 ** 5, 10 ** 6],
+                     help='tree sizes')
+    cmd.add_argument('--order', type=int, default=64, help='keys per BPlusTree node')
+    cmd.set_defaults(func=bench_engines)
+
+    cmd = commands.add_parser('cache', help='contains() with and without the lookup cache')
+    cmd.add_argument('-n', type=int, default=10 ** 6, help='number of keys in the tree')
+    cmd.add_argument('--probes', type=int, default=10 ** 6, help='number of Zipfian lookups')
+    cmd.add_argument('capacities', type=int, nargs='*', default=[10 ** 3, 10 ** 4, 10 ** 5],
+                     help='cache capacities')
+    cmd.set_defaults(func=bench_cache)
+
+    cmd = commands.add_parser('frozen', help='vectorized FrozenAVL queries vs per-key loops')
+    cmd.add_argument('-n', type=int, default=10 ** 6, help='number of keys in the tree')
+    cmd.add_argument('--queries', type=int, default=10 ** 6, help='number of queries')
+    cmd.set_defaults(func=bench_frozen)
+
+    cmd = commands.add_parser('suite', help='workload suite with JSON output and baseline comparison')
+    cmd.add_argument('sizes', type=int, nargs='*', default=[10 ** 3, 10 ** 4, 10 ** 5],
+                     help='tree sizes, 10^3 up to 10^7')
+    cmd.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS),
+                     help='workloads to run')
+    cmd.add_argument('--probes', type=int, default=10 ** 5,
+                     help='number of calls per cell (smaller trees repeat the per-key cells)')
+    cmd.add_argument('--repeats', type=int, default=5,
+                     help='timed runs per cell, the median one is reported and compared')
+    cmd.add_argument('--warmup', type=int, default=1, help='untimed runs before the timed ones')
+    cmd.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    cmd.add_argument('-o', '--output', help='write the results to this JSON file')
+    cmd.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    cmd.add_argument('--tolerance', type=float, default=0.2,
+                     help='allowed slowdown / memory growth against the baseline')
+    cmd.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    sys.exit(main())
@@ -0,0 +1,515 @@
+# Description: Wide-node alternative to the AVL tree in avl.py. A B+-tree keeps up to
+#               `order` keys per node in plain sorted lists and searches inside a node
+#               with bisect, so a lookup touches about log_order(n) nodes instead of
+#               log_2(n). Same add/remove/contains/find_min/find_max/inorder_traversal
+#               API as AVL, so either engine can be used for a workload.
+
+
+import random
+from bisect import bisect_left, bisect_right
+
+from avl import Queue, _PackedValues, _read_header, _write_dump
+
+
+class _Leaf:
+    """
+    Leaf of a BPlusTree: the sorted keys plus links to the neighboring leaves
+    """
+    __slots__ = ('keys', 'prev', 'next')
+
+    def __init__(self, keys) -> None:
+        self.keys = keys
+        self.prev = None
+        self.next = None
+
+
+class _Internal:
+    """
+    Internal node of a BPlusTree. keys[i] separates children[i] (all keys smaller) from
+    children[i + 1] (all keys larger or equal), so there is one key less than children.
+    """
+    __slots__ = ('keys', 'children')
+
+    def __init__(self, keys, children) -> None:
+        self.keys = keys
+        self.children = children
+
+
+class BPlusTree:
+    """
+    Ordered set stored in a B+-tree.
+
+    Every leaf holds between order // 2 and order keys (the root leaf may hold fewer)
+    and every internal node between order // 2 and order children (the root at least
+    2). All values live in the leaves, which are linked in sorted order, so iteration
+    and range scans walk the leaves without going back up the tree. find_min() and
+    find_max() read the first and last leaf in O(1).
+
+    Drop-in for AVL where only the ordered set API is needed (add, remove, contains,
+    find_min, find_max, inorder_traversal, irange, the batch methods, dump/load). It
+    has no rank/select, set algebra or node handles.
+    """
+    def __init__(self, start_tree=None, bulk=False, order=64) -> None:
+        """
+        Initialize a new tree with at most order keys per node. If bulk is True the
+        initial values are sorted once and packed into full leaves in O(n).
+        """
+        if order < 4:
+            raise ValueError('order must be at least 4')
+        self.order = order
+        self._min_keys = order // 2
+        self.make_empty()
+        if start_tree is not None:
+            if bulk:
+                self._bulk_load(start_tree)
+            else:
+                for value in start_tree:
+                    self.add(value)
+
+    @classmethod
+    def from_sorted(cls, iterable, order=64):
+        """
+        Builds a tree from the values in iterable in O(n) (O(n log n) if unsorted)
+        """
+        return cls(iterable, bulk=True, order=order)
+
+    def __str__(self) -> str:
+        return 'BPlusTree { ' + ', '.join(str(value) for value in self) + ' }'
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        """
+        Iterates over the values in sorted order along the leaf links
+        """
+        leaf = self._first
+        while leaf is not None:
+            yield from leaf.keys
+            leaf = leaf.next
+
+    def __reversed__(self):
+        """
+        Iterates over the values in descending order along the leaf links
+        """
+        leaf = self._last
+        while leaf is not None:
+            yield from reversed(leaf.keys)
+            leaf = leaf.prev
+
+    def __contains__(self, value: object) -> bool:
+        return self.contains(value)
+
+    # ------------------- SEARCH --------------------------------------------
+
+    def _leaf_of(self, value):
+        """
+        Returns the leaf whose key range covers value
+        """
+        node = self.root
+        for _ in range(self._height):
+            node = node.children[bisect_right(node.keys, value)]
+        return node
+
+    def _path_to(self, value):
+        """
+        Returns (leaf, path) where path lists the (internal node, child index) pairs
+        passed on the way from the root down to the leaf covering value
+        """
+        node = self.root
+        path = []
+        for _ in range(self._height):
+            i = bisect_right(node.keys, value)
+            path.append((node, i))
+            node = node.children[i]
+        return node, path
+
+    def contains(self, value: object) -> bool:
+        """
+        Returns True if value is in the tree, False otherwise
+        """
+        node = self.root
+        for _ in range(self._height):
+            node = node.children[bisect_right(node.keys, value)]
+        keys = node.keys
+        i = bisect_left(keys, value)
+        return i < len(keys) and keys[i] == value
+
+    def find_min(self) -> object:
+        """
+        Returns the smallest value in the tree, None if it is empty. O(1)
+        """
+        return self._first.keys[0] if self._len else None
+
+    def find_max(self) -> object:
+        """
+        Returns the largest value in the tree, None if it is empty. O(1)
+        """
+        return self._last.keys[-1] if self._len else None
+
+    def is_empty(self) -> bool:
+        return self._len == 0
+
+    def inorder_traversal(self) -> Queue:
+        """
+        Returns a Queue with the values in sorted order, like AVL.inorder_traversal()
+        """
+        q = Queue()
+        q.extend(self)
+        return q
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        """
+        Generator over the values between lo and hi in sorted order (descending if
+        reverse is True), with the same bounds semantics as AVL.irange()
+        """
+        lo_inclusive, hi_inclusive = inclusive
+        if not reverse:
+            leaf = self._leaf_of(lo) if lo is not None else self._first
+            if lo is None:
+                i = 0
+            else:
+                i = bisect_left(leaf.keys, lo) if lo_inclusive else bisect_right(leaf.keys, lo)
+            while leaf is not None:
+                keys = leaf.keys
+                for j in range(i, len(keys)):
+                    value = keys[j]
+                    if hi is not None and (value > hi or (not hi_inclusive and value == hi)):
+                        return
+                    yield value
+                leaf, i = leaf.next, 0
+        else:
+            leaf = self._leaf_of(hi) if hi is not None else self._last
+            if hi is None:
+                i = len(leaf.keys)
+            else:
+                i = bisect_right(leaf.keys, hi) if hi_inclusive else bisect_left(leaf.keys, hi)
+            while leaf is not None:
+                keys = leaf.keys
+                for j in range(i - 1, -1, -1):
+                    value = keys[j]
+                    if lo is not None and (value < lo or (not lo_inclusive and value == lo)):
+                        return
+                    yield value
+                leaf = leaf.prev
+                i = len(leaf.keys) if leaf is not None else 0
+
+    # ------------------- INSERT --------------------------------------------
+
+    def add(self, value: object) -> None:
+        """
+        Adds value to the tree, if it doesn't already exist
+        """
+        leaf, path = self._path_to(value)
+        keys = leaf.keys
+        i = bisect_left(keys, value)
+        if i < len(keys) and keys[i] == value:
+            return
+        keys.insert(i, value)
+        self._len += 1
+        if len(keys) > self.order:
+            self._split(leaf, path)
+
+    def _link_after(self, leaf, new) -> None:
+        """
+        Helper that links the leaf new into the leaf list right after leaf
+        """
+        new.prev, new.next = leaf, leaf.next
+        if leaf.next is not None:
+            leaf.next.prev = new
+        else:
+            self._last = new
+        leaf.next = new
+
+    def _split_node(self, node):
+        """
+        Helper that moves the upper half of an overfull node into a new node. Returns
+        (separator key, new node).
+        """
+        if type(node) is _Leaf:
+            mid = len(node.keys) // 2
+            new = _Leaf(node.keys[mid:])
+            del node.keys[mid:]
+            self._link_after(node, new)
+            return new.keys[0], new
+        mid = len(node.children) // 2
+        separator = node.keys[mid - 1]
+        new = _Internal(node.keys[mid:], node.children[mid:])
+        del node.keys[mid - 1:]
+        del node.children[mid:]
+        return separator, new
+
+    def _split(self, node, path) -> None:
+        """
+        Helper for add(). Splits the overfull node and every ancestor that overflows in
+        turn, growing a new root if the old one splits.
+        """
+        while True:
+            separator, new = self._split_node(node)
+            if not path:
+                self.root = _Internal([separator], [node, new])
+                self._height += 1
+                return
+            parent, i = path.pop()
+            parent.keys.insert(i, separator)
+            parent.children.insert(i + 1, new)
+            if len(parent.children) <= self.order:
+                return
+            node = parent
+
+    # ------------------- REMOVE --------------------------------------------
+
+    def remove(self, value: object) -> bool:
+        """
+        Removes value from the tree. Returns True if it was there, False otherwise.
+        """
+        leaf, path = self._path_to(value)
+        keys = leaf.keys
+        i = bisect_left(keys, value)
+        if i == len(keys) or keys[i] != value:
+            return False
+        del keys[i]
+        self._len -= 1
+        #separators equal to value may stay behind, they still route correctly
+        if len(keys) < self._min_keys and path:
+            self._fix_underflow(path)
+        return True
+
+    def _fix_underflow(self, path) -> None:
+        """
+        Helper for remove(). The child at the end of path has too few keys (children):
+        it is merged with a sibling and, if the result is overfull, split evenly again,
+        which amounts to borrowing from the sibling. Repeats upwards while the parent
+        underflows and shrinks the tree when the root is left with one child.
+        """
+        while path:
+            parent, i = path.pop()
+            #merge the child with its right sibling, or with its left one if it is last
+            i = i if i + 1 < len(parent.children) else i - 1
+            left, right = parent.children[i], parent.children[i + 1]
+            if type(left) is _Leaf:
+                left.keys.extend(right.keys)
+                left.next = right.next
+                if right.next is not None:
+                    right.next.prev = left
+                else:
+                    self._last = left
+                size = len(left.keys)
+            else:
+                left.keys.append(parent.keys[i])
+                left.keys.extend(right.keys)
+                left.children.extend(right.children)
+                size = len(left.children)
+            del parent.keys[i]
+            del parent.children[i + 1]
+            if size > self.order:
+                separator, new = self._split_node(left)
+                parent.keys.insert(i, separator)
+                parent.children.insert(i + 1, new)
+            if parent is self.root:
+                if len(parent.children) == 1:
+                    self.root = parent.children[0]
+                    self._height -= 1
+                return
+            if len(parent.children) >= self._min_keys:
+                return
+
+    def make_empty(self) -> None:
+        """
+        Removes all of the values from the tree
+        """
+        self.root = self._first = self._last = _Leaf([])
+        self._height = 0
+        self._len = 0
+
+    # ------------------- BATCHES -------------------------------------------
+
+    def add_many(self, values) -> None:
+        """
+        Adds every value of an iterable. A batch about as large as the tree is merged
+        with the current values and the tree is rebuilt in O(n + k).
+        """
+        values = _sorted_unique(values)
+        if len(values) >= self._len // 4:
+            self._bulk_load(_merge(list(self), values))
+        else:
+            for value in values:
+                self.add(value)
+
+    def remove_many(self, values) -> int:
+        """
+        Removes every value of an iterable and returns how many were found
+        """
+        return sum(1 for value in _sorted_unique(values) if self.remove(value))
+
+    def contains_many(self, values):
+        """
+        Returns a list of booleans saying whether each value is in the tree
+        """
+        return [self.contains(value) for value in values]
+
+    def _bulk_load(self, values) -> None:
+        """
+        Replaces the content with values, packing them level by level into nodes of
+        between order // 2 and order entries
+        """
+        values = _sorted_unique(values)
+        self.make_empty()
+        n = len(values)
+        if not n:
+            return
+        count = -(-n // self.order)
+        level = [_Leaf(values[n * k // count:n * (k + 1) // count]) for k in range(count)]
+        for prev, leaf in zip(level, level[1:]):
+            prev.next, leaf.prev = leaf, prev
+        self._first, self._last = level[0], level[-1]
+        firsts = [leaf.keys[0] for leaf in level]
+        while len(level) > 1:
+            #firsts[k] is the smallest key below level[k], the separator left of it
+            n = len(level)
+            count = -(-n // self.order)
+            bounds = [n * k // count for k in range(count + 1)]
+            level, firsts = [_Internal(firsts[a + 1:b], level[a:b]) for a, b in zip(bounds, bounds[1:])], \
+                [firsts[a] for a in bounds[:-1]]
+            self._height += 1
+        self.root = level[0]
+        self._len = len(values)
+
+    # ------------------- PERSISTENCE ---------------------------------------
+
+    def dump(self, path, checksum=True) -> None:
+        """
+        Writes the values to path in the AVL.dump() format, so either engine can read it
+        """
+        _write_dump(path, list(self), checksum)
+
+    @classmethod
+    def load(cls, path, verify=True, order=64):
+        """
+        Reads a file written by AVL.dump() or BPlusTree.dump() in O(n)
+        """
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        key_type, count = _read_header(buffer, verify)
+        return cls(_PackedValues(buffer, key_type, count).tolist(), bulk=True, order=order)
+
+    # ------------------- VALIDATION ----------------------------------------
+
+    def is_valid(self) -> bool:
+        """
+        Checks the B+-tree invariants: node fill, uniform leaf depth, separators
+        bounding their subtrees, the leaf links and the stored length. Troubleshooting
+        helper, O(n).
+        """
+        leaves = []
+        stack = [(self.root, 0, None, None)]
+        while stack:
+            node, depth, lo, hi = stack.pop()
+            keys = node.keys
+            if any(not keys[i] < keys[i + 1] for i in range(len(keys) - 1)):
+                return False
+            if keys and ((lo is not None and keys[0] < lo) or (hi is not None and not keys[-1] < hi)):
+                return False
+            if type(node) is _Leaf:
+                if depth != self._height or (node is not self.root and len(keys) < self._min_keys) or \
+                        len(keys) > self.order:
+                    return False
+                leaves.append(node)
+                continue
+            children = node.children
+            if len(children) != len(keys) + 1 or len(children) > self.order or \
+                    len(children) < (2 if node is self.root else self._min_keys):
+                return False
+            bounds = [lo] + keys + [hi]
+            for i in reversed(range(len(children))):
+                stack.append((children[i], depth + 1, bounds[i], bounds[i + 1]))
+        #the depth first walk met the leaves in order, the links must agree
+        for prev, leaf in zip([None] + leaves, leaves + [None]):
+            if (prev is not None and prev.next is not leaf) or (leaf is not None and leaf.prev is not prev):
+                return False
+        return leaves[0] is self._first and leaves[-1] is self._last and \
+            sum(len(leaf.keys) for leaf in leaves) == self._len
+
+
+def _sorted_unique(values):
+    """
+    Returns values as a sorted list without duplicates (NumPy arrays become lists)
+    """
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    values.sort()
+    unique = []
+    for value in values:
+        if not unique or unique[-1] != value:
+            unique.append(value)
+    return unique
+
+
+def _merge(a, b):
+    """
+    Returns the sorted union of the sorted, duplicate free lists a and b
+    """
+    merged = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            merged.append(a[i])
+            i += 1
+        elif b[j] < a[i]:
+            merged.append(b[j])
+            j += 1
+        else:
+            merged.append(a[i])
+            i += 1
+            j += 1
+    merged.extend(a[i:])
+    merged.extend(b[j:])
+    return merged
+
+
+# ------------------- BASIC TESTING -----------------------------------------
+
+
+if __name__ == '__main__':
+
+    print("\nBPlusTree example 1")
+    print("-------------------")
+    tree = BPlusTree([10, 20, 5, 15, 17, 7, 12], order=4)
+    print(tree, len(tree), tree.find_min(), tree.find_max(), tree.contains(15), tree.contains(16))
+    tree.remove(15)
+    print(tree.inorder_traversal(), list(tree.irange(7, 17, (False, True))), list(reversed(tree)))
+
+    print("\nBPlusTree example 2")
+    print("-------------------")
+    for _ in range(100):
+        order = random.choice((4, 5, 8, 64))
+        tree = BPlusTree(random.sample(range(5000), random.randrange(0, 600)), bulk=True, order=order)
+        expected = set(tree)
+        for step in range(600):
+            value = random.randrange(5000)
+            choice = random.randrange(5)
+            if choice < 2:
+                tree.add(value)
+                expected.add(value)
+            elif choice < 4:
+                if tree.remove(value) != (value in expected):
+                    raise Exception("PROBLEM WITH BPLUSTREE REMOVE")
+                expected.discard(value)
+            else:
+                batch = random.sample(range(5000), random.choice((3, 300)))
+                if step % 2:
+                    tree.add_many(batch)
+                    expected.update(batch)
+                else:
+                    tree.remove_many(batch)
+                    expected.difference_update(batch)
+            if step % 50 == 49 and not tree.is_valid():
+                raise Exception("PROBLEM WITH BPLUSTREE")
+        lo, hi = sorted(random.sample(range(5000), 2))
+        if list(tree) != sorted(expected) or list(reversed(tree)) != sorted(expected, reverse=True) or \
+                list(tree.irange(lo, hi)) != [v for v in sorted(expected) if lo <= v <= hi] or \
+                list(tree.irange(lo, hi, (False, False), True)) != [v for v in sorted(expected, reverse=True)
+                                                                    if lo < v < hi] or \
+                tree.find_min() != (min(expected) if expected else None) or \
+                tree.find_max() != (max(expected) if expected else None):
+            raise Exception("PROBLEM WITH BPLUSTREE")
+    print('BPlusTree stress test finished')
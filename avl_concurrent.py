@@ -0,0 +1,211 @@
+# Description: Thread-safe AVL tree for many readers and a few writers. Built on the
+#               PersistentAVL in avl.py, so readers never have to take a lock.
+
+
+import random
+import threading
+from contextlib import contextmanager
+
+from avl import PersistentAVL
+
+
+class ConcurrentAVL:
+    """
+    Thread-safe AVL tree.
+
+    The current content is an immutable PersistentAVL version. Writers serialize on a
+    single lock, build the next version by path copying and then publish it with one
+    attribute assignment. Readers (contains, find_min, find_max, iteration, ...) just
+    read the current version, so they never block and are never blocked by a writer.
+
+    Consistency contract:
+    - every read sees one complete, published version, never a half-done write
+    - a single add()/remove() is visible to every read that starts after it returns
+    - iterating (or any read through snapshot()) sees the version from when it started,
+      writes made meanwhile are not seen
+    - the writes of a batch() or add_many()/remove_many() call take one lock
+      acquisition and become visible together when it ends, or not at all if the
+      batch raises
+    """
+    def __init__(self, start_tree=None) -> None:
+        """
+        Initialize a new tree, bulk loading the values in start_tree (if provided)
+        """
+        self._lock = threading.Lock()
+        self._version = PersistentAVL(start_tree, bulk=True)
+
+    def __str__(self) -> str:
+        return str(self._version)
+
+    def __len__(self) -> int:
+        return len(self._version)
+
+    def __iter__(self):
+        return iter(self._version)
+
+    def __reversed__(self):
+        return reversed(self._version)
+
+    def __contains__(self, value: object) -> bool:
+        return self._version.contains(value)
+
+    def snapshot(self) -> PersistentAVL:
+        """
+        Returns the current version. It never changes, so any number of reads against
+        it see the same consistent content. O(1)
+        """
+        return self._version
+
+    def is_valid_avl(self) -> bool:
+        return self._version.is_valid_avl()
+
+    # ------------------- READS (no lock) -----------------------------------
+
+    def contains(self, value: object) -> bool:
+        return self._version.contains(value)
+
+    def find_min(self) -> object:
+        return self._version.find_min()
+
+    def find_max(self) -> object:
+        return self._version.find_max()
+
+    def is_empty(self) -> bool:
+        return self._version.is_empty()
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        return self._version.irange(lo, hi, inclusive, reverse)
+
+    def inorder_traversal(self):
+        return self._version.inorder_traversal()
+
+    # ------------------- WRITES --------------------------------------------
+
+    def add(self, value: object) -> None:
+        """
+        Adds value to the tree, if it doesn't already exist
+        """
+        with self._lock:
+            self._version = self._version.add(value)
+
+    def remove(self, value: object) -> bool:
+        """
+        Removes value from the tree. Returns True if it was there, False otherwise.
+        """
+        with self._lock:
+            version = self._version
+            self._version = version.remove(value)
+            return self._version is not version
+
+    def add_many(self, values) -> None:
+        """
+        Adds every value of values under one lock acquisition and one publication
+        """
+        with self._lock:
+            self._version = self._version.add_many(values)
+
+    def remove_many(self, values) -> None:
+        """
+        Removes every value of values under one lock acquisition and one publication
+        """
+        with self._lock:
+            self._version = self._version.remove_many(values)
+
+    def make_empty(self) -> None:
+        """
+        This method removes all of the values from the tree
+        """
+        with self._lock:
+            self._version = PersistentAVL()
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that groups writes. Holds the writer lock for the whole block
+        and yields a WriteBatch; its writes are published together when the block ends,
+        or dropped if the block raises. Readers keep seeing the previous version until
+        then.
+
+            with tree.batch() as batch:
+                batch.add(1)
+                batch.remove(2)
+        """
+        with self._lock:
+            batch = WriteBatch(self._version)
+            yield batch
+            self._version = batch.version
+
+
+class WriteBatch:
+    """
+    Pending writes of a ConcurrentAVL.batch() block. Reads through the batch see its own
+    writes, readers of the tree do not see them until the block ends.
+    """
+    def __init__(self, version: PersistentAVL) -> None:
+        self.version = version
+
+    def add(self, value: object) -> None:
+        self.version = self.version.add(value)
+
+    def remove(self, value: object) -> bool:
+        version = self.version
+        self.version = version.remove(value)
+        return self.version is not version
+
+    def contains(self, value: object) -> bool:
+        return self.version.contains(value)
+
+
+# ------------------- BASIC TESTING -----------------------------------------
+
+
+if __name__ == '__main__':
+
+    print("\nConcurrentAVL example 1")
+    print("-----------------------")
+    tree = ConcurrentAVL([10, 20, 5])
+    snapshot = tree.snapshot()
+    tree.add(15)
+    with tree.batch() as batch:
+        batch.add(1)
+        batch.remove(20)
+        print('inside batch:', list(tree), batch.contains(1))
+    print('after batch :', list(tree), 'snapshot:', list(snapshot))
+    try:
+        with tree.batch() as batch:
+            batch.add(99)
+            raise ValueError
+    except ValueError:
+        pass
+    print('failed batch:', list(tree), tree.find_min(), tree.find_max())
+
+    print("\nConcurrentAVL example 2")
+    print("-----------------------")
+    tree = ConcurrentAVL()
+    problems = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            value = rng.randrange(5000)
+            if rng.random() < 0.6:
+                tree.add(value)
+            else:
+                tree.remove(value)
+
+    def reader():
+        for _ in range(200):
+            snapshot = tree.snapshot()
+            values = list(snapshot)
+            if values != sorted(set(values)) or len(values) != len(snapshot):
+                problems.append(values)
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if problems or not tree.is_valid_avl():
+        raise Exception("PROBLEM WITH CONCURRENTAVL")
+    print('ConcurrentAVL stress test finished')
@@ -0,0 +1,357 @@
+# Description: Range-partitioned AVL index. Keys are split by range over several AVL
+#               shards, each owned by its own worker process, so batched operations
+#               and range scans run on several cores in parallel.
+
+
+import heapq
+import multiprocessing
+import random
+from bisect import bisect_right
+
+from avl import AVL
+
+
+def _shard_worker(conn):
+    """
+    Main loop of a shard process. Owns one AVL and answers (command, args) requests
+    sent over conn until it receives 'close'. Every reply is ('ok', result) or
+    ('error', exception).
+    """
+    tree = AVL()
+    while True:
+        command, args = conn.recv()
+        if command == 'close':
+            conn.close()
+            return
+        try:
+            if command == 'range':
+                result = list(tree.irange(*args))
+            elif command == 'extract':
+                #remove and return the values outside [lo, hi)
+                lo, hi = args
+                result = []
+                if lo is not None:
+                    result.extend(tree.irange(hi=lo, inclusive=(True, False)))
+                if hi is not None:
+                    result.extend(tree.irange(lo=hi))
+                tree.remove_many(result)
+            elif command == 'len':
+                result = len(tree)
+            else:
+                result = getattr(tree, command)(*args)
+            conn.send(('ok', result))
+        except Exception as exc:
+            conn.send(('error', exc))
+
+
+class ShardedAVL:
+    """
+    Range-partitioned index over shards AVL trees living in worker processes.
+
+    Shard i holds the keys k with bounds[i - 1] <= k < bounds[i]. Single key operations
+    go to the one shard that owns the key. Batched operations are grouped by shard and
+    all shards are sent their part before any answer is collected, so they run in
+    parallel. Ordered iteration and range scans k-way merge the shard outputs.
+
+    When one shard grows to more than imbalance times the average shard size, the
+    boundaries are moved to equal-size quantiles (found with select() on the shards) and
+    the keys that changed owner are moved between the processes.
+
+    Keys must be picklable and totally ordered. Call close() (or use a with block) to
+    stop the worker processes.
+    """
+    def __init__(self, shards=None, start_tree=None, bounds=None, imbalance=2.0,
+                 min_rebalance_size=1024) -> None:
+        """
+        Start the worker processes (one per CPU core by default). bounds gives the
+        shards - 1 initial split keys; without it they are taken from the quantiles of
+        start_tree, or found by the first rebalance.
+        """
+        self.shards = shards or multiprocessing.cpu_count()
+        self.imbalance = imbalance
+        self.min_rebalance_size = min_rebalance_size
+        #check the arguments before any process is started
+        start_tree = sorted(set(start_tree)) if start_tree is not None else []
+        if bounds is None:
+            bounds = [start_tree[len(start_tree) * i // self.shards] for i in range(1, self.shards)] \
+                if len(start_tree) >= self.shards else []
+        if len(bounds) != self.shards - 1 and bounds:
+            raise ValueError('need {} bounds for {} shards'.format(self.shards - 1, self.shards))
+        self._bounds = list(bounds)
+        self._sizes = [0] * self.shards
+        self._conns = []
+        self._processes = []
+        try:
+            for _ in range(self.shards):
+                parent_conn, child_conn = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_shard_worker, args=(child_conn,), daemon=True)
+                process.start()
+                child_conn.close()
+                self._conns.append(parent_conn)
+                self._processes.append(process)
+            if start_tree:
+                self.add_many(start_tree)
+        except BaseException:
+            #don't leave the workers started so far running
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop the worker processes. The index can't be used afterwards.
+        """
+        for conn in self._conns:
+            try:
+                conn.send(('close', ()))
+                conn.close()
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        self._conns = []
+
+    # ------------------- MESSAGING -----------------------------------------
+
+    def _shard_of(self, value) -> int:
+        """
+        Returns the index of the shard that owns value
+        """
+        return bisect_right(self._bounds, value) if self._bounds else 0
+
+    def _call(self, requests):
+        """
+        Sends every (shard, command, args) request before collecting any reply, so the
+        shards work in parallel. Returns the results in request order. Every reply is
+        read before the first error is raised, so no answer is left in a pipe for a
+        later call to pick up.
+        """
+        for shard, command, args in requests:
+            self._conns[shard].send((command, args))
+        replies = [self._conns[shard].recv() for shard, command, args in requests]
+        for status, result in replies:
+            if status == 'error':
+                raise result
+        return [result for status, result in replies]
+
+    def _group(self, values):
+        """
+        Returns a dict of shard index to the list of (position, value) pairs it owns
+        """
+        groups = {}
+        for i, value in enumerate(values):
+            groups.setdefault(self._shard_of(value), []).append((i, value))
+        return groups
+
+    def _refresh_sizes(self) -> None:
+        self._sizes = self._call([(shard, 'len', ()) for shard in range(self.shards)])
+
+    # ------------------- SINGLE KEY OPERATIONS -----------------------------
+
+    def add(self, value: object) -> None:
+        self.add_many([value])
+
+    def remove(self, value: object) -> bool:
+        return self.remove_many([value]) == 1
+
+    def contains(self, value: object) -> bool:
+        return self._call([(self._shard_of(value), 'contains', (value,))])[0]
+
+    def __contains__(self, value: object) -> bool:
+        return self.contains(value)
+
+    def __len__(self) -> int:
+        return sum(self._sizes)
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+    def find_min(self) -> object:
+        for shard in range(self.shards):
+            if self._sizes[shard]:
+                return self._call([(shard, 'find_min', ())])[0]
+
+    def find_max(self) -> object:
+        for shard in reversed(range(self.shards)):
+            if self._sizes[shard]:
+                return self._call([(shard, 'find_max', ())])[0]
+
+    # ------------------- BATCHED OPERATIONS --------------------------------
+
+    def add_many(self, values) -> None:
+        """
+        Adds the values, every shard inserting its part in parallel. Rebalances the
+        shard boundaries afterwards if one shard grew too large.
+        """
+        groups = self._group(values)
+        self._call([(shard, 'add_many', ([v for i, v in pairs],)) for shard, pairs in groups.items()])
+        self._refresh_sizes()
+        self._maybe_rebalance()
+
+    def remove_many(self, values) -> int:
+        """
+        Removes the values, every shard in parallel. Returns how many were found.
+        """
+        groups = self._group(values)
+        removed = self._call([(shard, 'remove_many', ([v for i, v in pairs],))
+                              for shard, pairs in groups.items()])
+        self._refresh_sizes()
+        return sum(removed)
+
+    def contains_many(self, values):
+        """
+        Returns a list of booleans saying whether each value is in the index
+        """
+        values = list(values)
+        groups = self._group(values)
+        found = [False] * len(values)
+        results = self._call([(shard, 'contains_many', ([v for i, v in pairs],))
+                              for shard, pairs in groups.items()])
+        for pairs, answers in zip(groups.values(), results):
+            for (i, value), answer in zip(pairs, answers):
+                found[i] = answer
+        return found
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True)):
+        """
+        Generator over the values between lo and hi in sorted order. Only the shards
+        overlapping the range are asked, in parallel, and their outputs are merged.
+        """
+        first = self._shard_of(lo) if lo is not None else 0
+        last = self._shard_of(hi) if hi is not None else self.shards - 1
+        parts = self._call([(shard, 'range', (lo, hi, inclusive))
+                            for shard in range(first, last + 1) if self._sizes[shard]])
+        return heapq.merge(*parts)
+
+    def __iter__(self):
+        return self.irange()
+
+    def select(self, k: int) -> object:
+        """
+        Returns the k-th smallest value over all shards (negative k counts from the
+        largest like a list index)
+        """
+        n = len(self)
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError('select index out of range')
+        for shard, size in enumerate(self._sizes):
+            if k < size:
+                return self._call([(shard, 'select', (k,))])[0]
+            k -= size
+        raise IndexError('select index out of range')
+
+    def is_valid_avl(self) -> bool:
+        """
+        True if every shard is a valid AVL and holds only the keys of its range
+        """
+        checks = self._call([(shard, 'is_valid_avl', ()) for shard in range(self.shards)])
+        if not all(checks):
+            return False
+        for shard in range(self.shards):
+            if self._sizes[shard]:
+                lo, hi = self._call([(shard, 'find_min', ()), (shard, 'find_max', ())])
+                if self._shard_of(lo) != shard or self._shard_of(hi) != shard:
+                    return False
+        return True
+
+    # ------------------- SHARD BALANCING -----------------------------------
+
+    def _maybe_rebalance(self) -> None:
+        """
+        Rebalances if the largest shard holds more than imbalance times the average
+        """
+        total = len(self)
+        if self.shards > 1 and total >= self.min_rebalance_size and \
+                max(self._sizes) > self.imbalance * total / self.shards:
+            self.rebalance()
+
+    def rebalance(self) -> None:
+        """
+        Moves the shard boundaries to the quantiles of the current keys so every shard
+        holds about the same number of keys, then moves the keys that changed shard
+        """
+        total = len(self)
+        if self.shards == 1 or total < self.shards:
+            return
+        bounds = [self.select(total * i // self.shards) for i in range(1, self.shards)]
+        #every shard hands back the keys that are now outside its range ...
+        edges = [None] + bounds + [None]
+        ranges = [(edges[shard], edges[shard + 1]) for shard in range(self.shards)]
+        moved = self._call([(shard, 'extract', ranges[shard]) for shard in range(self.shards)])
+        self._bounds = bounds
+        #... and they are added to the shards that own them now
+        values = [value for part in moved for value in part]
+        groups = self._group(values)
+        self._call([(shard, 'add_many', ([v for i, v in pairs],)) for shard, pairs in groups.items()])
+        self._refresh_sizes()
+
+    def shard_sizes(self):
+        """
+        Returns the number of keys in each shard
+        """
+        return list(self._sizes)
+
+
+# ------------------- BASIC TESTING -----------------------------------------
+
+
+if __name__ == '__main__':
+
+    print("\nShardedAVL example 1")
+    print("--------------------")
+    with ShardedAVL(shards=3, start_tree=range(0, 30, 3)) as index:
+        index.add_many([1, 29, 14])
+        print(list(index), len(index), index.shard_sizes())
+        print(list(index.irange(5, 20)), index.contains_many([1, 2, 3]))
+        print(index.remove_many([1, 2, 3]), index.find_min(), index.find_max(), index.select(4))
+        try:
+            list(index.irange(1, 25, inclusive=True))
+        except TypeError:
+            pass
+        print(index.contains(100), index.contains(12))
+
+    print("\nShardedAVL example 2")
+    print("--------------------")
+    with ShardedAVL(shards=4, bounds=[100, 200, 300], min_rebalance_size=100) as index:
+        expected = set()
+        for _ in range(20):
+            batch = [random.randrange(0, 120) for _ in range(200)]
+            index.add_many(batch)
+            expected.update(batch)
+            batch = random.sample(sorted(expected), 50)
+            index.remove_many(batch)
+            expected.difference_update(batch)
+        if list(index) != sorted(expected) or not index.is_valid_avl():
+            raise Exception("PROBLEM WITH SHARDEDAVL")
+        index.rebalance()
+        if list(index) != sorted(expected) or not index.is_valid_avl() or \
+                max(index.shard_sizes()) > len(index) // 4 + 1:
+            raise Exception("PROBLEM WITH SHARDEDAVL")
+        ordered = sorted(expected)
+        for k in range(-len(ordered) - 5, len(ordered) + 5):
+            try:
+                if index.select(k) != ordered[k]:
+                    raise Exception("PROBLEM WITH SHARDEDAVL")
+            except IndexError:
+                if -len(ordered) <= k < len(ordered):
+                    raise Exception("PROBLEM WITH SHARDEDAVL")
+            else:
+                if not -len(ordered) <= k < len(ordered):
+                    raise Exception("PROBLEM WITH SHARDEDAVL")
+    #bad arguments fail without leaving worker processes behind
+    for kwargs in ({'shards': 3, 'bounds': [1]}, {'shards': 2, 'start_tree': [1, 'x']}):
+        try:
+            ShardedAVL(**kwargs)
+            raise Exception("PROBLEM WITH SHARDEDAVL")
+        except (ValueError, TypeError):
+            pass
+    if multiprocessing.active_children():
+        raise Exception("PROBLEM WITH SHARDEDAVL")
+    print('ShardedAVL stress test finished')
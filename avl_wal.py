@@ -0,0 +1,494 @@
+# Description: Durable AVL tree. Every add()/remove() the tree accepts is appended to a
+#               write-ahead log, so the tree can be rebuilt after a crash from the last
+#               snapshot (an AVL.dump() file) plus the log written since.
+
+
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+from avl import AVL, _KEY_CODES, _KEY_TYPES, _write_dump
+
+
+# Log record: crc32 of everything after it, payload length, operation, key type code,
+# followed by the payload (the encoded key)
+_RECORD = struct.Struct('<IIBB')
+_ADD, _REMOVE, _CLEAR = 1, 2, 3
+
+_SNAPSHOT = 'snapshot.avl'
+_SEGMENT = 'wal-{:08d}.log'
+
+
+def _encode_key(value):
+    """
+    Returns (key type code, payload) for one key
+    """
+    key_type = type(value)
+    if key_type is int:
+        return _KEY_TYPES[int], struct.pack('<q', value)
+    if key_type is float:
+        return _KEY_TYPES[float], struct.pack('<d', value)
+    if key_type is bytes:
+        return _KEY_TYPES[bytes], value
+    if key_type is str:
+        return _KEY_TYPES[str], value.encode('utf-8')
+    raise TypeError('DurableAVL keys must be int, float, bytes or str')
+
+
+def _decode_key(code, payload):
+    """
+    Inverse of _encode_key()
+    """
+    key_type = _KEY_CODES[code]
+    if key_type is int:
+        return struct.unpack('<q', payload)[0]
+    if key_type is float:
+        return struct.unpack('<d', payload)[0]
+    if key_type is str:
+        return payload.decode('utf-8')
+    return bytes(payload)
+
+
+def _pack_record(op, value=None):
+    """
+    Returns the bytes of one log record
+    """
+    code, payload = _encode_key(value) if op != _CLEAR else (0, b'')
+    body = struct.pack('<IBB', len(payload), op, code) + payload
+    return struct.pack('<I', zlib.crc32(body)) + body
+
+
+def _read_records(path):
+    """
+    Reads the log segment at path. Returns (records, good) with the list of (op, value)
+    records and the length of the intact prefix of the file. Reading stops at the first
+    torn or corrupt record.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records = []
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        crc, length, op, code = _RECORD.unpack_from(data, offset)
+        end = offset + _RECORD.size + length
+        if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+            break
+        value = _decode_key(code, data[offset + _RECORD.size:end]) if op != _CLEAR else None
+        records.append((op, value))
+        offset = end
+    return records, offset
+
+
+class DurableAVL:
+    """
+    AVL tree whose mutations survive a crash.
+
+    The state lives in a directory: a snapshot (AVL.dump() format) and log segments
+    with every add/remove/make_empty since. A mutation is applied to the in-memory tree
+    first and appended to the current segment only once the tree has accepted it, with
+    the lock held across both, so a call that raises (say a key that can't be compared
+    with the others) leaves nothing in the log. If the log write itself fails, the
+    change is rolled back in memory and the log cut back to where it was, so memory and
+    log agree and the error is raised to the caller. make_empty(), which the tree
+    can't reject, is logged first and applied after.
+
+    Opening the directory loads the snapshot and replays the segments; a torn record at
+    the end of the newest segment (from a crash in the middle of a write) is cut off. A
+    record the tree rejects on replay is skipped and kept in the skipped list instead
+    of failing the recovery.
+
+    Group commit decides when the log is fsynced:
+    - fsync_every=N syncs after every N mutations (1 = every mutation is durable once
+      the call returns, 0 = never sync on a count)
+    - fsync_interval=T syncs at most T milliseconds after a mutation, from a
+      background thread, so a quiet tail is never left unsynced for long
+    Mutations since the last sync may be lost in a crash.
+
+    compact() folds the log into a fresh snapshot, optionally in a background thread
+    while writes continue into a new segment. Replaying a segment over a snapshot that
+    already contains it gives the same result, so a crash during compaction is safe.
+
+    Keys must be int (64 bit), float, bytes or str, and all of the same type like the
+    values of a dump: a key of another type than the ones already in the tree raises
+    TypeError before anything is changed or logged.
+    """
+    def __init__(self, directory, fsync_every=1, fsync_interval=None, tree_class=AVL) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._compactor = None
+        self._closed = threading.Event()
+        self.skipped = []
+
+        snapshot = os.path.join(directory, _SNAPSHOT)
+        self.tree = tree_class.load(snapshot) if os.path.exists(snapshot) else tree_class()
+        segments = self._segments()
+        for i, seq in enumerate(segments):
+            path = self._segment_path(seq)
+            records, good = _read_records(path)
+            if good != os.path.getsize(path):
+                if i != len(segments) - 1:
+                    raise ValueError('corrupt log segment {}'.format(path))
+                #torn tail from a crash, drop it
+                with open(path, 'r+b') as f:
+                    f.truncate(good)
+            self._apply(records)
+        self._seq = segments[-1] if segments else 1
+        self._log = open(self._segment_path(self._seq), 'ab')
+
+        self._flusher = None
+        if fsync_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Waits for a running compaction, syncs the log and closes it
+        """
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if not self._log.closed:
+                self.sync()
+                self._log.close()
+
+    # ------------------- LOG -----------------------------------------------
+
+    def _segments(self):
+        """
+        Returns the sequence numbers of the log segments on disk, oldest first
+        """
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.startswith('wal-') and name.endswith('.log'):
+                seqs.append(int(name[4:-4]))
+        return sorted(seqs)
+
+    def _segment_path(self, seq):
+        return os.path.join(self.directory, _SEGMENT.format(seq))
+
+    def _apply(self, records) -> None:
+        """
+        Replays (op, value) records against the in-memory tree. Records the tree rejects
+        are added to self.skipped.
+        """
+        for op, value in records:
+            try:
+                if op == _ADD:
+                    self._check_type((value,))
+                    self.tree.add(value)
+                elif op == _REMOVE:
+                    self.tree.remove(value)
+                else:
+                    self.tree.make_empty()
+            except (TypeError, ValueError):
+                self.skipped.append((op, value))
+
+    def _check_type(self, values) -> None:
+        """
+        Raises TypeError unless values all have the type of the keys already in the tree
+        (of the first value if the tree is empty), which dump() needs for the snapshot.
+        Must be called with the lock held.
+        """
+        key_type = type(self.tree.find_min()) if not self.tree.is_empty() else None
+        for value in values:
+            if key_type is None:
+                key_type = type(value)
+            elif type(value) is not key_type:
+                raise TypeError('DurableAVL keys must all have one type, got {} and {}'.format(
+                    key_type.__name__, type(value).__name__))
+
+    def _append(self, records, count, undo) -> None:
+        """
+        Appends records (count of them) to the log and syncs if the group commit count
+        is reached. If the write fails, undo() rolls the tree back, the log is cut back
+        to where it was and the error is raised. Must be called with the lock held.
+        """
+        start = self._log.tell()
+        try:
+            self._log.write(records)
+        except BaseException:
+            undo()
+            try:
+                self._log.truncate(start)
+            except OSError:
+                pass
+            raise
+        self._pending += count
+        if self.fsync_every and self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Flushes the log and fsyncs it, making every mutation so far durable
+        """
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._pending = 0
+
+    def _flush_loop(self) -> None:
+        """
+        Background thread for fsync_interval, syncs pending mutations every interval
+        """
+        while not self._closed.wait(self.fsync_interval / 1000):
+            with self._lock:
+                if self._pending and not self._log.closed:
+                    self.sync()
+
+    # ------------------- MUTATIONS -----------------------------------------
+
+    def add(self, value: object) -> None:
+        with self._lock:
+            self._check_type((value,))
+            record = _pack_record(_ADD, value)
+            size = len(self.tree)
+            self.tree.add(value)
+            added = len(self.tree) != size
+            self._append(record, 1, lambda: added and self.tree.remove(value))
+
+    def remove(self, value: object) -> bool:
+        with self._lock:
+            self._check_type((value,))
+            record = _pack_record(_REMOVE, value)
+            removed = self.tree.remove(value)
+            self._append(record, 1, lambda: removed and self.tree.add(value))
+            return removed
+
+    def add_many(self, values) -> None:
+        """
+        Adds every value and logs them, with a single sync at the end if any is due
+        """
+        with self._lock:
+            values = list(values)
+            self._check_type(values)
+            records = b''.join(_pack_record(_ADD, value) for value in values)
+            #remember which values are new so a failed log write can take them out again
+            new = [value for value, present in zip(values, self.tree.contains_many(values))
+                   if not present]
+            self.tree.add_many(values)
+            self._append(records, len(values), lambda: self.tree.remove_many(new))
+
+    def remove_many(self, values) -> int:
+        """
+        Removes every value and logs them, with a single sync at the end if any is due
+        """
+        with self._lock:
+            values = list(values)
+            self._check_type(values)
+            records = b''.join(_pack_record(_REMOVE, value) for value in values)
+            gone = [value for value, present in zip(values, self.tree.contains_many(values))
+                    if present]
+            removed = self.tree.remove_many(values)
+            self._append(records, len(values), lambda: self.tree.add_many(gone))
+            return removed
+
+    def make_empty(self) -> None:
+        with self._lock:
+            self._append(_pack_record(_CLEAR), 1, lambda: None)
+            self.tree.make_empty()
+
+    # ------------------- READS ---------------------------------------------
+
+    def contains(self, value: object) -> bool:
+        return self.tree.contains(value)
+
+    def __contains__(self, value: object) -> bool:
+        return self.tree.contains(value)
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def __iter__(self):
+        return iter(self.tree)
+
+    def find_min(self) -> object:
+        return self.tree.find_min()
+
+    def find_max(self) -> object:
+        return self.tree.find_max()
+
+    def is_empty(self) -> bool:
+        return self.tree.is_empty()
+
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        return self.tree.irange(lo, hi, inclusive, reverse)
+
+    def inorder_traversal(self):
+        return self.tree.inorder_traversal()
+
+    # ------------------- COMPACTION ----------------------------------------
+
+    def compact(self, background=False) -> None:
+        """
+        Writes a new snapshot of the current values and deletes the log segments it
+        replaces. Writes go to a new segment from this point on. With background=True
+        the snapshot is written by a thread and this returns right away (a compaction
+        still running is waited for first).
+        """
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            values = list(self.tree)
+            #fail before switching segments if the values can't be dumped
+            self._check_type(values)
+            self.sync()
+            self._log.close()
+            old_seq, self._seq = self._seq, self._seq + 1
+            self._log = open(self._segment_path(self._seq), 'ab')
+        if background:
+            self._compactor = threading.Thread(target=self._write_snapshot, args=(values, old_seq))
+            self._compactor.start()
+        else:
+            self._write_snapshot(values, old_seq)
+
+    def _write_snapshot(self, values, old_seq) -> None:
+        """
+        Atomically replaces the snapshot with values, then deletes the segments up to
+        old_seq since the snapshot now contains them
+        """
+        final = os.path.join(self.directory, _SNAPSHOT)
+        temp = final + '.tmp'
+        _write_dump(temp, values, sync=True)
+        os.replace(temp, final)
+        self._sync_directory()
+        for seq in self._segments():
+            if seq <= old_seq:
+                os.remove(self._segment_path(seq))
+
+    def _sync_directory(self) -> None:
+        """
+        fsyncs the directory so a rename in it is durable (where the OS allows it)
+        """
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+# ------------------- BASIC TESTING -----------------------------------------
+
+
+if __name__ == '__main__':
+
+    print("\nDurableAVL example 1")
+    print("--------------------")
+    directory = tempfile.mkdtemp()
+    with DurableAVL(directory) as tree:
+        for value in (10, 20, 5, 15):
+            tree.add(value)
+        tree.remove(20)
+    with DurableAVL(directory) as tree:
+        print('recovered   :', list(tree), sorted(os.listdir(directory)))
+        tree.compact()
+        tree.add(1)
+        print('compacted   :', list(tree), sorted(os.listdir(directory)))
+    with open(os.path.join(directory, _SEGMENT.format(2)), 'ab') as f:
+        f.write(_pack_record(_ADD, 99)[:-3])
+    with DurableAVL(directory) as tree:
+        print('torn record :', list(tree))
+        try:
+            tree.add('x')
+        except TypeError:
+            pass
+    with open(os.path.join(directory, _SEGMENT.format(2)), 'ab') as f:
+        f.write(_pack_record(_ADD, 'y'))
+    with DurableAVL(directory) as tree:
+        print('bad key     :', list(tree), tree.skipped)
+        #an int tree takes no floats, the snapshot format holds one key type
+        try:
+            tree.add(2.5)
+        except TypeError:
+            pass
+        tree.compact()
+        print('mixed keys  :', list(tree), sorted(os.listdir(directory)))
+    shutil.rmtree(directory)
+
+    print("\nDurableAVL example 2")
+    print("--------------------")
+    for policy in ({'fsync_every': 1}, {'fsync_every': 64}, {'fsync_every': 0, 'fsync_interval': 5}):
+        directory = tempfile.mkdtemp()
+        expected = set()
+        tree = DurableAVL(directory, **policy)
+        for step in range(2000):
+            value = random.randrange(500)
+            if random.random() < 0.3:
+                tree.add(value)
+                expected.add(value)
+            elif random.random() < 0.5:
+                tree.add_many([value, value + 1])
+                expected.update([value, value + 1])
+            else:
+                tree.remove(value)
+                expected.discard(value)
+            if step % 500 == 499:
+                tree.compact(background=step % 1000 == 499)
+        tree.close()
+        tree = DurableAVL(directory)
+        if list(tree) != sorted(expected) or not tree.tree.is_valid_avl():
+            raise Exception("PROBLEM WITH DURABLEAVL")
+        tree.close()
+        shutil.rmtree(directory)
+
+    #keys of another type are rejected before anything is logged, so a tree that was
+    #offered mixed keys can still be compacted; a failed log write is rolled back
+    directory = tempfile.mkdtemp()
+    with DurableAVL(directory) as tree:
+        for value in (1, 2.5, 'x', 3, b'y', 4.0):
+            try:
+                tree.add(value) if random.random() < 0.5 else tree.add_many([value, 7])
+            except TypeError:
+                pass
+        expected = list(tree)
+        if len(set(map(type, expected))) != 1:
+            raise Exception("PROBLEM WITH DURABLEAVL")
+        tree.compact()
+
+        class BrokenLog:
+            def __init__(self, log):
+                self.log = log
+            def tell(self):
+                return self.log.tell()
+            def write(self, data):
+                raise OSError('disk full')
+            def truncate(self, size):
+                self.log.truncate(size)
+        log, tree._log = tree._log, BrokenLog(tree._log)
+        for mutation in (lambda: tree.add(100), lambda: tree.remove(expected[0]),
+                         lambda: tree.add_many([100, 101, expected[0]]),
+                         lambda: tree.remove_many([expected[0], 102])):
+            try:
+                mutation()
+                raise Exception("PROBLEM WITH DURABLEAVL")
+            except OSError:
+                pass
+            if list(tree) != expected:
+                raise Exception("PROBLEM WITH DURABLEAVL")
+        tree._log = log
+    with DurableAVL(directory) as tree:
+        if list(tree) != expected or tree.skipped:
+            raise Exception("PROBLEM WITH DURABLEAVL")
+    shutil.rmtree(directory)
+    print('DurableAVL stress test finished')